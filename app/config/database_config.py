@@ -0,0 +1,40 @@
+import os
+
+# 数据库地址，默认使用项目根目录运行时的本地SQLite文件
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///./calendar_app.db')
+
+# SQLite 连接参数，每个新连接建立时通过 PRAGMA 设置
+# WAL 模式下读操作不会被写操作阻塞；synchronous=NORMAL 在 WAL 模式下仍能保证崩溃后数据库一致
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+# 遇到写锁时最多等待的毫秒数，避免多worker部署时立即报 "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+# 内存映射读取的字节数，0 表示关闭
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))
+# 页缓存大小，负数表示以KB为单位（-16000 约16MB）
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', '-16000'))
+# 临时表和索引存放位置: DEFAULT / FILE / MEMORY
+SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+
+# 连接池大小：同步接口在线程池中执行（默认最多40个线程），
+# pool_size + max_overflow 与线程数一致，避免请求在连接池上排队
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '30'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+
+
+def sqlite_pragmas():
+    """返回新连接需要执行的 PRAGMA 列表，busy_timeout 需最先设置，以便切换 WAL 时也能等待锁"""
+    return [
+        ('busy_timeout', SQLITE_BUSY_TIMEOUT_MS),
+        ('journal_mode', SQLITE_JOURNAL_MODE),
+        ('synchronous', SQLITE_SYNCHRONOUS),
+        ('mmap_size', SQLITE_MMAP_SIZE),
+        ('cache_size', SQLITE_CACHE_SIZE),
+        ('temp_store', SQLITE_TEMP_STORE),
+    ]
+
+# 慢查询阈值（毫秒），执行时间超过该值的语句会连同 EXPLAIN QUERY PLAN 一起记录到日志，0 表示关闭
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+# 是否在响应头 Server-Timing 中返回每个请求的数据库语句数量和耗时
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '1') == '1'
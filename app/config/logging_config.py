@@ -1,7 +1,11 @@
+import atexit
+import json
 import logging
 import logging.handlers
 import os
-from datetime import datetime
+import queue
+import sys
+from datetime import date, datetime, timedelta
 
 # 获取日志目录，优先使用环境变量，其次使用默认路径
 default_log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
@@ -11,68 +15,147 @@ LOG_DIR = os.environ.get('LOG_DIR', default_log_dir)
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
-# 日期格式
-date_str = datetime.now().strftime("%Y-%m-%d")
+# 日志格式: text 或 json
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+# 按日期命名的日志文件保留天数
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '14'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 当前使用的后台日志线程
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，便于日志采集系统解析"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _formatter():
+    if LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+class DailyFileHandler(logging.FileHandler):
+    """写入 <名称>_YYYY-MM-DD.log 的文件处理程序，按日志记录的日期选择文件
+
+    日期变化时打开新日期的文件，不重命名已有文件，因此多个进程（uvicorn worker、运维命令）
+    以追加模式同时写同一天的文件是安全的；TimedRotatingFileHandler 在多进程下轮转会互相覆盖。
+    切换日期时删除超过保留天数的旧文件，文件已被其他进程删除时忽略。
+    """
+
+    def __init__(self, name, backup_count=LOG_BACKUP_COUNT):
+        self.name_prefix = name
+        self.backup_count = backup_count
+        self.current_date = date.today()
+        super().__init__(self._path(self.current_date), encoding='utf-8', delay=True)
+
+    def _path(self, day):
+        return os.path.join(LOG_DIR, f'{self.name_prefix}_{day.isoformat()}.log')
+
+    def _remove_expired(self, today):
+        oldest = today - timedelta(days=self.backup_count)
+        for filename in os.listdir(LOG_DIR):
+            stem, _, extension = filename.rpartition('.')
+            prefix, _, day = stem.rpartition('_')
+            if extension != 'log' or prefix != self.name_prefix:
+                continue
+            try:
+                if date.fromisoformat(day) < oldest:
+                    os.remove(os.path.join(LOG_DIR, filename))
+            except (ValueError, OSError):
+                continue
+
+    def emit(self, record):
+        day = datetime.fromtimestamp(record.created).date()
+        if day != self.current_date:
+            # handle() 已持有处理程序的锁
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            self.current_date = day
+            self.baseFilename = self._path(day)
+            self._remove_expired(day)
+        super().emit(record)
+
+
+def _daily_file_handler(filename, level):
+    """按日期命名的文件处理程序，例如 app_2024-01-01.log"""
+    handler = DailyFileHandler(filename)
+    handler.setLevel(level)
+    handler.setFormatter(_formatter())
+    return handler
+
 
 # 配置根日志记录器
 def setup_logging():
-    # 配置根日志记录器
+    """配置队列化的日志管道
+
+    所有日志记录器只向内存队列写入记录，由后台线程中的 QueueListener 负责格式化
+    并写入控制台和文件，请求线程不会因为磁盘I/O而阻塞。重复调用时会替换之前的配置。
+    """
+    global _listener
+
     root_logger = logging.getLogger()
-    
+
     # 获取日志级别，默认为INFO
     log_level_name = os.environ.get('LOG_LEVEL', 'INFO').upper()
     log_level = getattr(logging, log_level_name, logging.INFO)
     root_logger.setLevel(log_level)
-    
+
     # 清除可能存在的处理程序
+    stop_logging()
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
-    
+
     # 控制台处理程序
-    console_handler = logging.StreamHandler()
+    console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(log_level)
-    console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(console_formatter)
-    root_logger.addHandler(console_handler)
-    
-    # 文件处理程序
-    file_handler = logging.handlers.RotatingFileHandler(
-        filename=os.path.join(LOG_DIR, f'app_{date_str}.log'),
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=5,
-        encoding='utf-8'
-    )
-    file_handler.setLevel(log_level)
-    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-    root_logger.addHandler(file_handler)
-    
-    # API访问日志
-    api_logger = logging.getLogger('api')
-    api_handler = logging.handlers.RotatingFileHandler(
-        filename=os.path.join(LOG_DIR, f'api_{date_str}.log'),
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=5,
-        encoding='utf-8'
-    )
-    api_handler.setLevel(log_level)
-    api_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    api_handler.setFormatter(api_formatter)
-    api_logger.addHandler(api_handler)
-    
+    console_handler.setFormatter(_formatter())
+
+    # 应用日志
+    file_handler = _daily_file_handler('app', log_level)
+
+    # API访问日志，只记录 api.* 日志记录器的输出
+    api_handler = _daily_file_handler('api', log_level)
+    api_handler.addFilter(logging.Filter('api'))
+
     # 错误日志
-    error_logger = logging.getLogger('error')
-    error_handler = logging.handlers.RotatingFileHandler(
-        filename=os.path.join(LOG_DIR, f'error_{date_str}.log'),
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=5,
-        encoding='utf-8'
+    error_handler = _daily_file_handler('error', logging.ERROR)
+
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, api_handler, error_handler,
+        respect_handler_level=True
     )
-    error_handler.setLevel(logging.ERROR)
-    error_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    error_handler.setFormatter(error_formatter)
-    error_logger.addHandler(error_handler)
-    
-    logging.info(f"日志记录器配置完成。日志保存在 {LOG_DIR} 目录中，日志级别: {log_level_name}")
-    
-    return root_logger 
\ No newline at end of file
+    _listener.start()
+
+    logging.info(f"日志记录器配置完成。日志保存在 {LOG_DIR} 目录中，日志级别: {log_level_name}, 格式: {LOG_FORMAT}")
+
+    return root_logger
+
+
+def stop_logging():
+    """停止后台日志线程，写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,14 +1,54 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# 使用SQLite
-SQLALCHEMY_DATABASE_URL = "sqlite:///./calendar_app.db"
+from app.config import database_config
+from app.database.instrumentation import instrument_engine
+
+# 数据库地址（默认使用SQLite）
+SQLALCHEMY_DATABASE_URL = database_config.DATABASE_URL
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """创建数据库引擎，应用连接池配置并注册语句监控；SQLite 数据库会在每个新连接上设置 PRAGMA"""
+    kwargs = {}
+    if ":memory:" not in url:
+        kwargs = dict(pool_size=database_config.DB_POOL_SIZE,
+                      max_overflow=database_config.DB_MAX_OVERFLOW,
+                      pool_timeout=database_config.DB_POOL_TIMEOUT)
+    if not url.startswith("sqlite"):
+        db_engine = create_engine(url, **kwargs)
+        instrument_engine(db_engine)
+        return db_engine
+    
+    db_engine = create_engine(
+        url,
+        connect_args={
+            "check_same_thread": False,
+            # sqlite3 模块自身的锁等待时间（秒），与 busy_timeout 保持一致
+            "timeout": database_config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        },
+        **kwargs
+    )
+    
+    @event.listens_for(db_engine, "connect")
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in database_config.sqlite_pragmas():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+        # 供 skip_sql 在SQL中解析HH:MM时间，与Python计算引擎的解析规则一致
+        from app.services.skip_engine import hhmm_minutes
+        dbapi_connection.create_function("hhmm_minutes", 1, hhmm_minutes, deterministic=True)
+    
+    instrument_engine(db_engine)
+    return db_engine
+
 
 # 创建SQLAlchemy引擎
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_db_engine()
 
 # 创建会话类
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -22,4 +62,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
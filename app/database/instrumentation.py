@@ -0,0 +1,118 @@
+"""数据库语句监控
+
+在引擎上注册 SQLAlchemy 游标事件：
+- 统计每条语句的执行次数和耗时并写入进程内指标
+- 统计当前请求执行的语句数量和总耗时，由中间件写入 Server-Timing 响应头
+- 执行时间超过 SLOW_QUERY_MS 的语句连同 EXPLAIN QUERY PLAN 一起记录到慢查询日志
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import database_config
+from app.services import metrics
+
+# 获取慢查询日志记录器
+logger = logging.getLogger("api.sql")
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "CREATE", "DROP", "ALTER", "WITH", "EXPLAIN"}
+# 可以执行 EXPLAIN QUERY PLAN 的语句类型
+_EXPLAINABLE = {"SELECT", "UPDATE", "DELETE", "WITH"}
+
+
+class RequestQueryStats:
+    """一个请求执行的数据库语句统计"""
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        """生成 Server-Timing 响应头的值"""
+        return (
+            f'db;desc="{self.count} queries";dur={self.duration * 1000:.2f}, '
+            f'total;dur={total_seconds * 1000:.2f}'
+        )
+
+
+_request_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def begin_request():
+    """开始统计当前请求的数据库语句，返回用于结束统计的令牌"""
+    return _request_stats.set(RequestQueryStats())
+
+
+def end_request(token) -> Optional[RequestQueryStats]:
+    """结束统计并返回当前请求的统计结果"""
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+    return stats
+
+
+def statement_operation(statement: str) -> str:
+    """返回语句类型（SELECT/INSERT/...），用作指标标签"""
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in _OPERATIONS else "OTHER"
+
+
+def _explain(cursor, statement, parameters) -> str:
+    """在同一连接上获取语句的查询计划（只支持 SQLite）"""
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return " | ".join(str(row[-1]) for row in explain_cursor.fetchall())
+    except Exception as e:
+        return f"无法获取查询计划: {e}"
+    finally:
+        explain_cursor.close()
+
+
+def _log_slow_query(conn, cursor, statement, parameters, executemany, operation, elapsed):
+    plan = ""
+    if conn.dialect.name == "sqlite" and not executemany and operation in _EXPLAINABLE:
+        plan = _explain(cursor, statement, parameters)
+    logger.warning(
+        f"慢查询 {elapsed * 1000:.1f} ms: {' '.join(statement.split())} | 参数: {parameters}"
+        + (f" | 查询计划: {plan}" if plan else "")
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    operation = statement_operation(statement)
+    metrics.DB_QUERIES.inc(operation)
+    metrics.DB_QUERY_DURATION.observe(elapsed, operation)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+
+    if database_config.SLOW_QUERY_MS > 0 and elapsed * 1000 >= database_config.SLOW_QUERY_MS:
+        _log_slow_query(conn, cursor, statement, parameters, executemany, operation, elapsed)
+
+
+def _handle_error(exception_context):
+    # 语句执行失败时不会触发 after_cursor_execute，需要弹出开始时间
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """为引擎注册语句监控事件"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -1,63 +1,352 @@
-from sqlalchemy import create_engine, Column, Float, text
+"""数据库版本化迁移
+
+schema_migrations 表记录已执行的迁移版本。启动时只需读取一次最新版本号，
+数据库已是最新版本时不做任何其他操作，启动耗时与历史数据量无关。
+
+- 新数据库：create_all 直接建出最新结构，然后将所有迁移标记为已执行
+- 旧数据库：按版本顺序执行尚未执行的迁移，每个迁移都是幂等的，
+  可以安全地在迁移框架引入之前已部分升级过的数据库上执行
+
+新增迁移时在 MIGRATIONS 末尾追加，版本号递增，已发布的迁移不要修改。
+"""
 import logging
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
 from app.database.database import engine
 
 # 获取日志记录器
 logger = logging.getLogger("api.migrations")
 
-def run_migrations():
-    """运行数据库迁移脚本"""
-    try:
-        logger.info("开始数据库迁移...")
-        
-        # 添加有效小时数字段
-        add_valid_hours_count()
-        
-        logger.info("数据库迁移完成")
-    except Exception as e:
-        logger.error(f"数据库迁移失败: {e}", exc_info=True)
-        raise
+SCHEMA_MIGRATIONS_TABLE = "schema_migrations"
 
-def add_valid_hours_count():
+# 最低SQLite版本：生成列需要 3.31，ALTER TABLE DROP COLUMN 和 skip_sql 的 MATERIALIZED 公用表表达式需要 3.35
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+def _column_names(bind: Engine, table_name: str) -> List[str]:
+    # table_info 不包含生成列，使用 table_xinfo
+    with bind.connect() as connection:
+        result = connection.execute(text(f"PRAGMA table_xinfo({table_name})"))
+        return [row[1] for row in result.fetchall()]
+
+
+def add_valid_hours_count(bind: Engine):
     """添加有效小时数字段到cycle_records表"""
+    if "valid_hours_count" in _column_names(bind, "cycle_records"):
+        logger.info("valid_hours_count字段已存在，跳过迁移")
+        return
+    with bind.begin() as connection:
+        connection.execute(text("ALTER TABLE cycle_records ADD COLUMN valid_hours_count FLOAT DEFAULT 0.0"))
+    logger.info("成功添加valid_hours_count字段")
+
+
+def create_data_version_table(bind: Engine):
+    """创建数据版本表，用于生成ETag和使缓存失效"""
+    from app.models import models
+    models.DataVersion.__table__.create(bind=bind, checkfirst=True)
+
+
+def add_skip_accounting_columns(bind: Engine):
+    """添加跳过时间增量记账字段到cycle_records表，并为已有周期回填数据"""
+    columns = _column_names(bind, "cycle_records")
+    if "skipped_minutes" in columns and "skip_horizon" in columns:
+        logger.info("跳过记账字段已存在，跳过迁移")
+        return
+
+    with bind.begin() as connection:
+        if "skipped_minutes" not in columns:
+            connection.execute(text("ALTER TABLE cycle_records ADD COLUMN skipped_minutes FLOAT"))
+        if "skip_horizon" not in columns:
+            connection.execute(text("ALTER TABLE cycle_records ADD COLUMN skip_horizon DATETIME"))
+    logger.info("成功添加跳过记账字段")
+
+    # 根据现有跳过时间段回填记账数据
+    from app.services.skip_accounting import verify_skip_accounting
+    db = Session(bind=bind, autoflush=False)
     try:
-        # 检查字段是否已存在
-        connection = engine.connect()
-        result = connection.execute(text("PRAGMA table_info(cycle_records)"))
-        columns_info = result.fetchall()
-        
-        # 输出完整的表结构信息
-        logger.info("当前数据库表结构:")
-        for col in columns_info:
-            logger.info(f"列名: {col[1]}, 类型: {col[2]}, 是否可空: {col[3]}, 默认值: {col[4]}, 是否主键: {col[5]}")
-            
-        # 获取表中的数据
-        data_result = connection.execute(text("SELECT * FROM cycle_records"))
-        records = data_result.fetchall()
-        logger.info("当前表数据:")
-        for record in records:
-            # 将 Row 对象转换为字典
-            record_dict = {}
-            for key in record._mapping.keys():
-                record_dict[key] = record._mapping[key]
-            logger.info(f"记录: {record_dict}")
-            
-        columns = [row[1] for row in columns_info]
-        
-        if "valid_hours_count" not in columns:
-            logger.info("添加valid_hours_count字段到cycle_records表")
-            connection.execute(text("ALTER TABLE cycle_records ADD COLUMN valid_hours_count FLOAT DEFAULT 0.0"))
-            connection.commit()
-            logger.info("成功添加valid_hours_count字段")
-            
-            # 读取更新后的表结构
-            result = connection.execute(text("PRAGMA table_info(cycle_records)"))
-            updated_columns = [row[1] for row in result.fetchall()]
-            logger.info(f"更新后的数据库表结构: {updated_columns}")
+        verify_skip_accounting(db, fix=True)
+    finally:
+        db.close()
+    logger.info("已回填跳过记账数据")
+
+
+# 唯一索引因重复数据无法创建时，提示用于查看和删除重复记录的运维命令
+DEDUPE_COMMANDS = {
+    "skip_periods": "请执行 python -m app.maintenance dedupe-skip-periods 查看并删除重复记录后重新启动",
+}
+
+
+def _duplicate_keys(bind: Engine, table_name: str, column_names: List[str], limit: int = 10) -> str:
+    """列出违反唯一约束的键及其重复次数（最多 limit 个）"""
+    columns = ", ".join(column_names)
+    duplicates = f"SELECT {columns}, COUNT(*) FROM {table_name} GROUP BY {columns} HAVING COUNT(*) > 1"
+    with bind.connect() as connection:
+        rows = connection.execute(text(f"{duplicates} LIMIT {limit}")).fetchall()
+        total = connection.execute(text(f"SELECT COUNT(*) FROM ({duplicates})")).scalar()
+    keys = "; ".join(
+        f"({', '.join(f'{name}={value}' for name, value in zip(column_names, row[:-1]))}) 共 {row[-1]} 条"
+        for row in rows
+    )
+    return f"{keys} 等 {total} 组" if total > len(rows) else keys
+
+
+def sync_indexes(bind: Engine = None):
+    """使数据库中的索引与模型中声明的索引一致
+
+    创建缺少的索引，删除模型中已不再声明的 ix_/uq_ 索引。索引发生变化时执行 ANALYZE，
+    让查询优化器根据统计信息选择索引（例如用部分索引查询当前周期）。
+    唯一索引因已有重复数据无法创建时抛出异常并列出重复的记录，迁移失败、服务不会启动；
+    删除重复记录后重新启动即可继续迁移。
+    """
+    from sqlalchemy.exc import IntegrityError
+    from app.models import models
+
+    bind = bind or engine
+    changed = False
+    for table in models.Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspect(bind).get_indexes(table.name)}
+        declared = {index.name for index in table.indexes}
+
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=bind)
+                changed = True
+                logger.info(f"已创建索引 {index.name}")
+            except IntegrityError as e:
+                hint = DEDUPE_COMMANDS.get(table.name, "请删除重复记录后重新启动")
+                raise RuntimeError(
+                    f"无法创建唯一索引 {index.name}，表 {table.name} 中存在重复数据: "
+                    f"{_duplicate_keys(bind, table.name, [column.name for column in index.columns])}，{hint}"
+                ) from e
+
+        for name in existing - declared:
+            if name.startswith(("ix_", "uq_")):
+                with bind.begin() as connection:
+                    connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                changed = True
+                logger.info(f"已删除不再使用的索引 {name}")
+
+    with bind.begin() as connection:
+        if changed:
+            connection.execute(text("ANALYZE"))
+            logger.info("索引已更新，已重新收集统计信息")
         else:
-            logger.info("valid_hours_count字段已存在，跳过迁移")
-        
-        connection.close()
+            # 由SQLite自行判断统计信息是否需要更新，代价很小
+            connection.execute(text("PRAGMA analysis_limit=1000"))
+            connection.execute(text("PRAGMA optimize"))
+
+
+def create_cycle_day_ledger(bind: Engine):
+    """创建周期逐日台账表，并根据现有跳过时间段为所有周期建立台账"""
+    from app.models import models
+    from app.services import day_ledger
+
+    models.CycleDayLedger.__table__.create(bind=bind, checkfirst=True)
+    db = Session(bind=bind, autoflush=False)
+    try:
+        periods_by_cycle = {}
+        for period in db.query(models.SkipPeriod).all():
+            periods_by_cycle.setdefault(period.cycle_id, []).append(period)
+        rows = 0
+        for cycle in db.query(models.CycleRecords).all():
+            rows += day_ledger.rebuild(db, cycle, periods_by_cycle.get(cycle.id, []))
+        db.commit()
+    finally:
+        db.close()
+    logger.info(f"已建立周期逐日台账，共 {rows} 行")
+
+
+def create_minute_columns(bind: Engine):
+    """添加整数分钟字段（只建空字段，不回填数据），可以重复执行"""
+    period_columns = _column_names(bind, "skip_periods")
+    cycle_columns = _column_names(bind, "cycle_records")
+    with bind.begin() as connection:
+        for name, column_type in (("day", "DATE"), ("start_minute_of_day", "INTEGER"), ("duration_minutes", "INTEGER")):
+            if name not in period_columns:
+                connection.execute(text(f"ALTER TABLE skip_periods ADD COLUMN {name} {column_type}"))
+        if "valid_minutes" not in cycle_columns:
+            connection.execute(text("ALTER TABLE cycle_records ADD COLUMN valid_minutes INTEGER"))
+
+
+def add_minute_columns(bind: Engine):
+    """添加整数分钟字段并回填
+
+    - skip_periods: day、start_minute_of_day、duration_minutes，由 date/start_time/end_time 换算
+    - cycle_records: valid_minutes，由 valid_hours_count 取整到分钟
+
+    只使用SQL读写这两张表，不依赖当前模型。只回填为空的记录，可以重复执行。
+    """
+    from app.services.skip_engine import period_minutes
+
+    create_minute_columns(bind)
+    with bind.begin() as connection:
+        rows = connection.execute(text(
+            "SELECT id, date(date), start_time, end_time FROM skip_periods WHERE day IS NULL"
+        )).fetchall()
+        if rows:
+            connection.execute(
+                text("UPDATE skip_periods SET day = :day, start_minute_of_day = :start, duration_minutes = :duration WHERE id = :id"),
+                [
+                    dict(zip(("day", "start", "duration"), period_minutes(day, start_time, end_time)), id=period_id)
+                    for period_id, day, start_time, end_time in rows
+                ]
+            )
+        updated = connection.execute(text(
+            "UPDATE cycle_records SET valid_minutes = CAST(ROUND(COALESCE(valid_hours_count, 0) * 60) AS INTEGER) "
+            "WHERE valid_minutes IS NULL"
+        )).rowcount
+    if rows or updated:
+        logger.info(f"已回填整数分钟字段: 跳过时间段 {len(rows)} 条, 周期 {updated} 个")
+
+
+def create_recompute_runs_table(bind: Engine):
+    """创建批量重算任务进度表"""
+    from app.models import models
+    models.RecomputeRun.__table__.create(bind=bind, checkfirst=True)
+
+
+def derive_minute_columns(bind: Engine):
+    """将跳过时间段的整数分钟字段改为由数据库根据 date/start_time/end_time 生成的虚拟列
+
+    字段值只有一个来源，批量 UPDATE 和Core INSERT 不会再写出与字符串字段不一致的值。
+    SQLite 不能修改已有字段，先删除普通字段再添加生成列（需要 SQLite 3.35 及以上版本），可以重复执行。
+    包含被删除字段的索引会先删除，由迁移9（sync_indexes）按模型重新创建。
+    """
+    from app.models import models
+
+    with bind.connect() as connection:
+        # table_xinfo 的 hidden 列: 0 普通字段，2 虚拟生成列，3 存储生成列
+        hidden = {row[1]: row[6] for row in connection.execute(text("PRAGMA table_xinfo(skip_periods)"))}
+    indexes = inspect(bind).get_indexes("skip_periods")
+    with bind.begin() as connection:
+        for name in ("day", "start_minute_of_day", "duration_minutes"):
+            if hidden.get(name) in (2, 3):
+                continue
+            if name in hidden:
+                for index in indexes:
+                    if name in index["column_names"]:
+                        connection.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+                connection.execute(text(f"ALTER TABLE skip_periods DROP COLUMN {name}"))
+            column = models.SkipPeriod.__table__.c[name]
+            column_type = column.type.compile(dialect=bind.dialect)
+            connection.execute(text(
+                f"ALTER TABLE skip_periods ADD COLUMN {name} {column_type} "
+                f"GENERATED ALWAYS AS ({column.computed.sqltext}) VIRTUAL"
+            ))
+    logger.info("跳过时间段的整数分钟字段已改为生成列")
+
+
+# 按版本号排序的迁移列表: (版本号, 名称, 迁移函数)
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "add_valid_hours_count", add_valid_hours_count),
+    (2, "create_data_version_table", create_data_version_table),
+    (3, "add_skip_accounting_columns", add_skip_accounting_columns),
+    (4, "sync_indexes", sync_indexes),
+    (5, "create_cycle_day_ledger", create_cycle_day_ledger),
+    (6, "add_minute_columns", add_minute_columns),
+    (7, "create_recompute_runs_table", create_recompute_runs_table),
+    (8, "derive_minute_columns", derive_minute_columns),
+    (9, "sync_skip_period_day_index", sync_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# 在执行任何待执行迁移之前先建出的字段: (版本号, 建字段函数)，按顺序执行
+# 较早的迁移（3、4、5）通过当前模型查询数据或创建索引，模型中由后续迁移新增的字段必须已经存在。
+# 跳过时间段的整数分钟字段直接建为生成列（迁移4会在 day 上建唯一索引，之后不能再删除该字段），
+# 迁移6的回填只处理 day 为空的记录，对生成列不做任何修改；valid_minutes 只建空字段，由迁移6回填
+SCHEMA_PREREQUISITES: List[Tuple[int, Callable[[Engine], None]]] = [
+    (8, derive_minute_columns),
+    (6, create_minute_columns),
+]
+
+
+def check_sqlite_version(bind: Engine):
+    """SQLite 版本低于 MIN_SQLITE_VERSION 时抛出异常，在修改数据库之前终止启动"""
+    if bind.dialect.name != "sqlite":
+        return
+    version_info = sqlite3.sqlite_version_info
+    if tuple(version_info) < MIN_SQLITE_VERSION:
+        required = ".".join(map(str, MIN_SQLITE_VERSION))
+        current = ".".join(map(str, version_info))
+        raise RuntimeError(
+            f"需要 SQLite {required} 及以上版本（当前 Python 使用的 SQLite 为 {current}），"
+            "请升级系统的 libsqlite3 或使用链接了较新 SQLite 的 Python"
+        )
+
+
+def _ensure_version_table(bind: Engine):
+    with bind.begin() as connection:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_MIGRATIONS_TABLE} ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at DATETIME NOT NULL)"
+        ))
+
+
+def current_version(bind: Engine = None) -> int:
+    """返回数据库已执行的最新迁移版本，尚未使用迁移框架的数据库为 0"""
+    bind = bind or engine
+    with bind.connect() as connection:
+        version = connection.execute(text(f"SELECT MAX(version) FROM {SCHEMA_MIGRATIONS_TABLE}")).scalar()
+    return version or 0
+
+
+def _record(bind: Engine, version: int, name: str):
+    with bind.begin() as connection:
+        connection.execute(
+            text(f"INSERT OR IGNORE INTO {SCHEMA_MIGRATIONS_TABLE} (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+            {"version": version, "name": name, "applied_at": datetime.now()}
+        )
+
+
+def run_migrations(bind: Engine = None) -> List[int]:
+    """将数据库升级到最新版本
+
+    Returns:
+        List[int]: 本次执行的迁移版本号
+    """
+    from app.models import models
+
+    bind = bind or engine
+    try:
+        check_sqlite_version(bind)
+        _ensure_version_table(bind)
+        version = current_version(bind)
+        if version >= LATEST_VERSION:
+            logger.info(f"数据库结构已是最新版本 {version}")
+            return []
+
+        if version == 0 and not inspect(bind).has_table("cycle_records"):
+            # 新数据库直接建出最新结构
+            models.Base.metadata.create_all(bind=bind)
+            for migration_version, name, _ in MIGRATIONS:
+                _record(bind, migration_version, name)
+            logger.info(f"已创建数据库结构，版本 {LATEST_VERSION}")
+            return []
+
+        # 先创建缺少的表（只创建不存在的表，不修改已有表）和后续迁移新增的字段，再按顺序执行未执行的迁移
+        models.Base.metadata.create_all(bind=bind)
+        for migration_version, create_columns in SCHEMA_PREREQUISITES:
+            if migration_version > version:
+                create_columns(bind)
+        applied = []
+        for migration_version, name, migrate in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            logger.info(f"执行数据库迁移 {migration_version}: {name}")
+            migrate(bind)
+            _record(bind, migration_version, name)
+            applied.append(migration_version)
+        logger.info(f"数据库迁移完成，当前版本 {LATEST_VERSION}")
+        return applied
     except Exception as e:
-        logger.error(f"添加valid_hours_count字段失败: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        logger.error(f"数据库迁移失败: {e}", exc_info=True)
+        raise
@@ -945,18 +945,24 @@ const MobileCycleSkipPeriods: React.FC<{ cycle: CycleRecord }> = ({ cycle }) =>
   );
 };
 
+// 周期历史每页加载的记录数
+const CYCLE_PAGE_SIZE = 20;
+
 const CycleHistory: React.FC = () => {
   const [cycles, setCycles] = useState<CycleRecord[]>([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [refreshFlag, setRefreshFlag] = useState(false);
   
-  // 获取所有周期记录
+  // 获取第一页周期记录（服务端已按周期号倒序）
   const fetchCycles = useCallback(async () => {
     try {
       setLoading(true);
-      const data = await cyclesApi.getAllCycles();
-      setCycles(data.sort((a, b) => b.cycle_number - a.cycle_number));
+      const page = await cyclesApi.getCyclesPage({ limit: CYCLE_PAGE_SIZE });
+      setCycles(page.items);
+      setNextCursor(page.nextCursor);
     } catch (err) {
       console.error('获取周期历史记录失败:', err);
       setError('加载周期历史记录失败，请刷新重试');
@@ -965,6 +971,22 @@ const CycleHistory: React.FC = () => {
     }
   }, []);
   
+  // 加载下一页周期记录
+  const fetchMoreCycles = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const page = await cyclesApi.getCyclesPage({ limit: CYCLE_PAGE_SIZE, cursor: nextCursor });
+      setCycles(prevCycles => [...prevCycles, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.error('加载更多周期记录失败:', err);
+      setError('加载更多周期记录失败，请重试');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+  
   useEffect(() => {
     fetchCycles();
   }, [fetchCycles]);
@@ -1122,6 +1144,19 @@ const CycleHistory: React.FC = () => {
               </TableBody>
             </Table>
           </TableContainer>
+          
+          {nextCursor && (
+            <Box display="flex" justifyContent="center" mt={2}>
+              <Button
+                variant="outlined"
+                onClick={fetchMoreCycles}
+                disabled={loadingMore}
+                sx={{ borderRadius: '20px' }}
+              >
+                {loadingMore ? <CircularProgress size={20} /> : '加载更多'}
+              </Button>
+            </Box>
+          )}
         </>
       )}
     </Paper>
@@ -46,6 +46,21 @@ export interface CycleRecord {
   remark?: string;
 }
 
+// 周期列表分页参数（GET /api/cycles）
+export interface CyclePageParams {
+  limit?: number;
+  cursor?: string | null;
+  isCompleted?: boolean;
+  startFrom?: string;  // ISO 字符串，按开始时间过滤
+  startTo?: string;
+}
+
+// 一页周期记录，nextCursor 为 null 表示没有更多数据
+export interface CyclePage {
+  items: CycleRecord[];
+  nextCursor: string | null;
+}
+
 export interface CycleRecordUpdate {
   start_date?: string;
   cycle_number?: number;
@@ -75,4 +90,18 @@ export interface CalendarResponse {
   historical_cycles: CycleRecord[];  // 添加历史周期信息
   valid_days_count: number;
   valid_hours_count: number;
-}
\ No newline at end of file
+}
+
+// 紧凑格式的日历数据（format=compact）
+export interface CompactCalendarResponse {
+  format: 'compact';
+  range_start: string;
+  day_count: number;
+  valid_bitmap: string;  // base64位图，第i天对应第i/8字节的第i%8位（低位在前）
+  skipped_bitmap: string;
+  skip_periods: [number, string, string, number][];  // [天偏移, 开始时间, 结束时间, 跳过时间段ID]
+  current_cycle: CycleRecord | null;
+  historical_cycles: CycleRecord[];
+  valid_days_count: number;
+  valid_hours_count: number;
+}
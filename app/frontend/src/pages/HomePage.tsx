@@ -1,9 +1,9 @@
 import React, { useState, useEffect } from 'react';
-import { Container, Box, Typography, Tab, Tabs, Alert, Dialog, DialogContent, DialogActions, Button, Snackbar, Paper } from '@mui/material';
+import { Container, Box, Typography, Tab, Tabs, Alert, Snackbar, Paper } from '@mui/material';
 import Calendar from '../components/Calendar';
 import SettingsForm from '../components/SettingsForm';
 import CycleHistory from '../components/CycleHistory';
-import { calendarSettingsApi, cyclesApi, calendarDataApi } from '../services/api';
+import { calendarSettingsApi, cyclesApi } from '../services/api';
 import { CycleRecord } from '../models/types';
 
 // 选项卡接口
@@ -35,8 +35,6 @@ const HomePage: React.FC = () => {
   const [currentCycle, setCurrentCycle] = useState<CycleRecord | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [showSettingsError, setShowSettingsError] = useState<boolean>(false);
-  const [confirmDialogOpen, setConfirmDialogOpen] = useState<boolean>(false);
-  const [selectedDate, setSelectedDate] = useState<Date | null>(null);
   const [cycleComplete, setCycleComplete] = useState<boolean>(false);
   
   // 获取设置和当前周期
@@ -87,41 +85,6 @@ const HomePage: React.FC = () => {
     setTabValue(0);
   };
   
-  // 处理日期点击
-  const handleDayClick = (day: Date) => {
-    // 保存选择的日期
-    setSelectedDate(day);
-    
-    // 打开确认对话框
-    setConfirmDialogOpen(true);
-  };
-  
-  // 处理确认有效天数
-  const handleConfirmValidDay = async () => {
-    try {
-      const response = await calendarDataApi.incrementValidDay();
-      
-      // 刷新当前周期
-      try {
-        const cycleData = await cyclesApi.getCurrentCycle();
-        setCurrentCycle(cycleData);
-        
-        // 检查是否周期完成
-        if (response.valid_days_count >= 26) {
-          setCycleComplete(true);
-        }
-      } catch (err) {
-        // 如果获取当前周期失败，可能是因为刚刚完成了一个周期并创建了新周期
-        fetchInitialData();
-      }
-      
-      setConfirmDialogOpen(false);
-    } catch (err) {
-      console.error('增加有效天数失败:', err);
-      setError('增加有效天数失败，请重试');
-    }
-  };
-  
   // 处理周期完成回调
   const handleCycleCompleted = () => {
     // 刷新数据获取新周期
@@ -170,7 +133,6 @@ const HomePage: React.FC = () => {
         <TabPanel value={tabValue} index={0}>
           {currentCycle ? (
             <Calendar 
-              onDayClick={handleDayClick}
               currentCycle={currentCycle}
               onCycleCompleted={handleCycleCompleted}
               onCycleUpdated={handleCycleUpdated}
@@ -193,24 +155,6 @@ const HomePage: React.FC = () => {
         </TabPanel>
       </Box>
       
-      {/* 确认对话框 */}
-      <Dialog open={confirmDialogOpen} onClose={() => setConfirmDialogOpen(false)}>
-        <DialogContent>
-          <Typography>
-            确认标记 {selectedDate?.toLocaleDateString()} 为有效天数？
-          </Typography>
-          <Typography variant="body2" color="textSecondary" sx={{ mt: 1 }}>
-            当前周期已累计: {currentCycle?.valid_days_count || 0} 天
-          </Typography>
-        </DialogContent>
-        <DialogActions>
-          <Button onClick={() => setConfirmDialogOpen(false)}>取消</Button>
-          <Button onClick={handleConfirmValidDay} variant="contained" color="primary">
-            确认
-          </Button>
-        </DialogActions>
-      </Dialog>
-      
       {/* 周期完成提醒 */}
       <Snackbar
         open={cycleComplete}
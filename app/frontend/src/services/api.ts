@@ -1,9 +1,13 @@
 import axios from 'axios';
 import { 
+  CalendarDay,
   CalendarResponse, 
+  CompactCalendarResponse,
   CalendarSettings, 
   CalendarSettingsCreate,
   CycleRecord,
+  CyclePage,
+  CyclePageParams,
   CycleRecordUpdate,
   SkipPeriod,
   SkipPeriodCreate
@@ -60,6 +64,45 @@ const api = axios.create({
   timeout: 10000
 });
 
+// 读取base64位图中的第index位
+const readBit = (bitmap: Uint8Array, index: number): boolean =>
+  ((bitmap[index >> 3] >> (index & 7)) & 1) === 1;
+
+const decodeBitmap = (encoded: string): Uint8Array =>
+  Uint8Array.from(atob(encoded), (char) => char.charCodeAt(0));
+
+// 将紧凑格式的日历数据还原为逐日格式
+export const decodeCompactCalendar = (data: CompactCalendarResponse): CalendarResponse => {
+  const validBitmap = decodeBitmap(data.valid_bitmap);
+  const skippedBitmap = decodeBitmap(data.skipped_bitmap);
+  const skipPeriods = new Map(data.skip_periods.map((row) => [row[0], row]));
+  const rangeStart = new Date(data.range_start);
+  
+  const days: CalendarDay[] = [];
+  for (let offset = 0; offset < data.day_count; offset++) {
+    const date = new Date(rangeStart.getFullYear(), rangeStart.getMonth(), rangeStart.getDate() + offset);
+    const dateString = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+    const isValid = readBit(validBitmap, offset);
+    const skipPeriod = readBit(skippedBitmap, offset) ? skipPeriods.get(offset) : undefined;
+    days.push({
+      date: `${dateString}T00:00:00`,
+      is_skipped: skipPeriod !== undefined,
+      skip_period: skipPeriod && { date: dateString, start_time: skipPeriod[1], end_time: skipPeriod[2] },
+      skip_period_id: skipPeriod && skipPeriod[3],
+      is_valid_day: isValid,
+      is_valid: isValid,
+    });
+  }
+  
+  return {
+    days,
+    current_cycle: data.current_cycle,
+    historical_cycles: data.historical_cycles,
+    valid_days_count: data.valid_days_count,
+    valid_hours_count: data.valid_hours_count,
+  };
+};
+
 // 日历设置相关API
 export const calendarSettingsApi = {
   // 获取设置
@@ -90,6 +133,14 @@ export const calendarDataApi = {
     return response.data;
   },
   
+  // 获取紧凑格式的日历数据，并还原为逐日的日历数据
+  getCompactCalendarData: async (startDate: string, endDate: string): Promise<CalendarResponse> => {
+    const response = await api.get<CompactCalendarResponse>('/calendar/data', {
+      params: { start_date: startDate, end_date: endDate, format: 'compact' }
+    });
+    return decodeCompactCalendar(response.data);
+  },
+  
   // 获取跳过时间段列表
   getSkipPeriods: async (cycleId: number): Promise<SkipPeriod[]> => {
     const response = await api.get<SkipPeriod[]>(`/calendar/skip-periods/${cycleId}`);
@@ -140,12 +191,6 @@ export const calendarDataApi = {
       }
       throw error;
     }
-  },
-  
-  // 增加有效天数
-  incrementValidDay: async (): Promise<{ message: string; valid_days_count: number }> => {
-    const response = await api.post<{ message: string; valid_days_count: number }>('/calendar/increment-day');
-    return response.data;
   }
 };
 
@@ -164,6 +209,23 @@ export const cyclesApi = {
     }
   },
   
+  // 按游标分页获取周期记录，cursor为空时获取第一页
+  getCyclesPage: async (params: CyclePageParams = {}): Promise<CyclePage> => {
+    const response = await api.get<CycleRecord[]>('/cycles', {
+      params: {
+        limit: params.limit ?? 20,
+        cursor: params.cursor || undefined,
+        is_completed: params.isCompleted,
+        start_from: params.startFrom,
+        start_to: params.startTo,
+      }
+    });
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    };
+  },
+  
   // 获取当前周期
   getCurrentCycle: async (): Promise<CycleRecord> => {
     const response = await api.get<CycleRecord>('/cycles/current');
@@ -1,50 +1,25 @@
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
+from anyio import to_thread
+import asyncio
 import logging
 import os
+import time
 from datetime import datetime
-import sys
 
-from app.routers import calendar, cycles
-from app.database import database
+from app.routers import admin, calendar, cycles
+from app.config import database_config
+from app.config.logging_config import setup_logging
+from app.database import database, instrumentation
 from app.models import models
-from app.services import calendar_service
+from app.services import calc_trace, calendar_service, cycle_scheduler, metrics, skip_accounting
 from app.database.migrations import run_migrations
 
-# 配置日志
-log_dir = "logs"
-os.makedirs(log_dir, exist_ok=True)
-
-# 创建日志记录器
+# 配置日志：日志记录写入内存队列，由后台线程写入控制台和按天轮转的文件
+setup_logging()
 logger = logging.getLogger("root")
-logger.setLevel(logging.INFO)
-
-# 创建文件处理器，使用当前日期命名日志文件
-log_file = os.path.join(log_dir, f"app_{datetime.now().strftime('%Y-%m-%d')}.log")
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.INFO)
-
-# 创建控制台处理器
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-
-# 创建格式化器
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
-
-# 添加处理器到记录器
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-logger.info("日志记录器配置完成。日志保存在 %s 目录中，日志级别: %s", log_dir, "INFO")
-
-# 创建数据库表
-models.Base.metadata.create_all(bind=database.engine)
-
-# 运行数据库迁移
-run_migrations()
 
 app = FastAPI(title="26天周期日历API")
 
@@ -55,11 +30,65 @@ app.add_middleware(
     allow_credentials=False,  # 禁用凭据，避免与通配符一起使用时的安全问题
     allow_methods=["*"],  # 允许所有HTTP方法
     allow_headers=["*"],  # 允许所有头部
+    expose_headers=["ETag", "X-Next-Cursor", "X-Calc-Trace-Id", "Server-Timing"],  # 允许前端读取缓存校验、分页游标、追踪ID和服务端耗时
 )
 
 # 包含路由
 app.include_router(calendar.router, prefix="/api/calendar", tags=["calendar"])
 app.include_router(cycles.router, prefix="/api/cycles", tags=["cycles"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+
+def _route_template(request: Request) -> str:
+    """返回请求匹配的路由模板（如 /api/cycles/{cycle_id}），避免指标标签数量随路径参数增长"""
+    route = request.scope.get("route")
+    if route is None:
+        for candidate in app.router.routes:
+            match, _ = candidate.matches(request.scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
+# 记录每个路由的请求数和处理耗时
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = _route_template(request)
+        metrics.HTTP_REQUESTS.inc(request.method, route, str(status_code))
+        metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, request.method, route)
+
+# 统计每个请求执行的数据库语句数量和耗时，通过 Server-Timing 响应头返回
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    if not database_config.SERVER_TIMING_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    token = instrumentation.begin_request()
+    try:
+        response = await call_next(request)
+    finally:
+        stats = instrumentation.end_request(token)
+    response.headers["Server-Timing"] = stats.server_timing(time.perf_counter() - started)
+    return response
+
+# 按请求开启计算追踪（请求头 X-Calc-Trace: 1），未开启时不做任何额外工作
+@app.middleware("http")
+async def calc_trace_middleware(request: Request, call_next):
+    if not calc_trace.should_trace(request.headers):
+        return await call_next(request)
+    token = calc_trace.start(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        trace = calc_trace.finish(token)
+    response.headers[calc_trace.TRACE_ID_HEADER] = str(trace.id)
+    return response
 
 # 全局异常处理
 @app.exception_handler(Exception)
@@ -70,6 +99,11 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": f"服务器内部错误：{str(exc)}"}
     )
 
+# 指标端点（Prometheus 文本格式）
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # 健康检查端点
 @app.get("/api/health-check")
 def health_check():
@@ -79,23 +113,42 @@ def health_check():
 @app.on_event("startup")
 async def startup_db_client():
     logger.info("应用程序启动中...")
-    # 确保所有数据库表已经创建
-    database.Base.metadata.create_all(bind=database.engine)
+    # 同步接口和数据库依赖都在线程池中执行，线程数与连接池容量一致，
+    # 避免线程在连接池上排队，也避免任何数据库操作在事件循环上执行
+    to_thread.current_default_thread_limiter().total_tokens = (
+        database_config.DB_POOL_SIZE + database_config.DB_MAX_OVERFLOW
+    )
+    
+    # 创建数据库表或将数据库升级到最新版本（已是最新版本时只读取一次版本号）
+    await asyncio.to_thread(run_migrations)
     
     # 初始化周期数据
-    db = database.SessionLocal()
     try:
-        calendar_service.check_and_create_cycle(db)
+        await asyncio.to_thread(skip_accounting.run_with_session, calendar_service.check_and_create_cycle)
     except Exception as e:
         logger.error(f"初始化周期数据时出错: {e}", exc_info=True)
-    finally:
-        db.close()
+    
+    # 后台任务：定期刷新未完成周期的计数，并将跳过时间增量记账与完整重算对账
+    app.state.background_tasks = []
+    periodic_jobs = [
+        (skip_accounting.refresh_open_cycles, float(os.environ.get("COUNTER_REFRESH_INTERVAL", "300"))),
+        (skip_accounting.verify_skip_accounting, float(os.environ.get("SKIP_ACCOUNTING_VERIFY_INTERVAL", "3600"))),
+    ]
+    for job, interval in periodic_jobs:
+        if interval > 0:
+            app.state.background_tasks.append(
+                asyncio.create_task(skip_accounting.run_periodic(interval, job))
+            )
+    
+    # 周期切换调度器：在当前周期累计满26天有效时间的时刻完成周期并开启下一个周期
+    if cycle_scheduler.ENABLED:
+        app.state.background_tasks.append(asyncio.create_task(cycle_scheduler.run_scheduler()))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     logger.info("应用程序关闭中...")
-    # 这里可以添加关闭前的数据同步操作
-    pass
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,130 @@
+"""运维命令
+
+    python -m app.maintenance recompute [--workers N] [--chunk-size N] [--restart]
+    python -m app.maintenance cleanup-skip-periods [--dry-run | --yes]
+    python -m app.maintenance dedupe-skip-periods [--yes]
+
+命令使用与服务相同的数据库配置（DATABASE_URL），执行前会先将数据库升级到最新版本。
+dedupe-skip-periods 用于重复数据导致迁移失败的情况，先删除重复记录再升级数据库。
+"""
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+from app.config.logging_config import setup_logging
+from app.database.database import SessionLocal, engine
+from app.database.migrations import run_migrations
+from app.services import bulk_recompute, skip_period_cleanup
+
+# 获取日志记录器
+logger = logging.getLogger("api.maintenance")
+
+
+def recompute(args: argparse.Namespace) -> int:
+    """批量重算所有周期的有效天数和有效小时数"""
+    db = SessionLocal()
+    try:
+        run = bulk_recompute.start_run(db, restart=args.restart)
+        run = bulk_recompute.recompute_all(db, run, workers=args.workers, chunk_size=args.chunk_size)
+        print(f"批量重算完成: 处理 {run.processed} 个周期，更新 {run.updated} 个")
+        return 0
+    except KeyboardInterrupt:
+        print("已中断，再次执行该命令将从检查点继续", file=sys.stderr)
+        return 130
+    finally:
+        db.close()
+
+
+def _confirm(question: str, assume_yes: bool) -> bool:
+    """删除数据前确认：--yes 直接确认，交互终端中询问，非交互执行时不删除"""
+    if assume_yes:
+        return True
+    if not sys.stdin.isatty():
+        print("非交互执行时需加 --yes 确认删除", file=sys.stderr)
+        return False
+    return input(f"{question}(y/N): ").strip().lower() == "y"
+
+
+def cleanup_skip_periods(args: argparse.Namespace) -> int:
+    """清理超出周期日期范围的跳过时间段"""
+    db = SessionLocal()
+    try:
+        invalid = skip_period_cleanup.find_out_of_range(db)
+        print(f"发现超出周期日期范围的跳过时间段: {len(invalid)}")
+        for period in invalid:
+            print(f"  - ID: {period['period_id']}, 日期: {period['period_date']}, "
+                  f"周期: #{period['cycle_number']}, 原因: {period['reason']}")
+        if args.dry_run or not invalid:
+            return 0
+        if not _confirm(f"是否删除这 {len(invalid)} 个超出周期日期范围的跳过时间段？", args.yes):
+            print("取消删除操作")
+            return 1
+
+        result = skip_period_cleanup.delete_out_of_range(db)
+        print(f"已删除 {len(result['deleted_period_ids'])} 个跳过时间段，重算了 {len(result['cycle_ids'])} 个周期")
+        return 0
+    finally:
+        db.close()
+
+
+def dedupe_skip_periods(args: argparse.Namespace) -> int:
+    """删除同一周期同一天的重复跳过时间段，然后升级数据库并重算受影响的周期"""
+    groups = skip_period_cleanup.find_duplicates(engine)
+    print(f"发现同一周期同一天的重复跳过时间段: {len(groups)} 组")
+    for group in groups:
+        print(f"  - 周期ID: {group['cycle_id']}, 日期: {group['period_date']}, "
+              f"保留 ID: {group['kept_period_id']} ({group['kept_time']}), "
+              f"删除 ID: {', '.join(str(period_id) for period_id in group['duplicate_period_ids'])}")
+    if groups and not args.yes:
+        print("确认无误后加 --yes 删除重复记录（每组保留最近修改的一条）", file=sys.stderr)
+        return 1
+
+    result = skip_period_cleanup.delete_duplicates(engine)
+    run_migrations()
+    db = SessionLocal()
+    try:
+        skip_period_cleanup.rebuild_cycles(db, result["cycle_ids"])
+    finally:
+        db.close()
+    if groups:
+        print(f"已删除 {len(result['deleted_period_ids'])} 个跳过时间段，重算了 {len(result['cycle_ids'])} 个周期")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance", description="日历应用运维命令")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    recompute_parser = commands.add_parser("recompute", help="批量重算所有周期的有效天数和有效小时数")
+    recompute_parser.add_argument("--workers", type=int, default=None,
+                                  help="进程数，为1时在当前进程中计算（默认 BULK_RECOMPUTE_WORKERS 或CPU核数）")
+    recompute_parser.add_argument("--chunk-size", type=int, default=None,
+                                  help="每块的周期数（默认 BULK_RECOMPUTE_CHUNK_SIZE 或500）")
+    recompute_parser.add_argument("--restart", action="store_true", help="放弃未完成的任务，重新开始")
+    recompute_parser.set_defaults(handler=recompute)
+
+    cleanup_parser = commands.add_parser("cleanup-skip-periods", help="删除超出周期日期范围的跳过时间段")
+    cleanup_mode = cleanup_parser.add_mutually_exclusive_group()
+    cleanup_mode.add_argument("--dry-run", action="store_true", help="只列出将被删除的跳过时间段，不修改数据")
+    cleanup_mode.add_argument("--yes", action="store_true", help="不询问，直接删除（非交互执行时必须提供）")
+    cleanup_parser.set_defaults(handler=cleanup_skip_periods)
+
+    dedupe_parser = commands.add_parser("dedupe-skip-periods",
+                                        help="删除同一周期同一天的重复跳过时间段（唯一索引无法创建时使用）")
+    dedupe_parser.add_argument("--yes", action="store_true", help="确认删除，不加时只列出重复记录")
+    # 重复数据会使迁移失败，先删除重复记录，再由命令自己升级数据库
+    dedupe_parser.set_defaults(handler=dedupe_skip_periods, migrate_first=False)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    if getattr(args, "migrate_first", True):
+        run_migrations()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
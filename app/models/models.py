@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Boolean, ForeignKey, Time, Float
+from sqlalchemy import Column, Computed, Integer, String, Date, DateTime, JSON, Boolean, ForeignKey, Time, Float, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime, time
 
@@ -19,12 +19,15 @@ class CycleRecords(Base):
     __tablename__ = "cycle_records"
 
     id = Column(Integer, primary_key=True, index=True)
-    cycle_number = Column(Integer, nullable=False)
+    cycle_number = Column(Integer, nullable=False, index=True)
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=True)
     skip_periods = Column(JSON, nullable=True)  # 存储跳过时段的JSON数据
     valid_days_count = Column(Integer, default=0)
-    valid_hours_count = Column(Float, default=0.0)  # 添加有效小时数字段
+    valid_hours_count = Column(Float, default=0.0)  # 添加有效小时数字段（由 valid_minutes 换算，保持接口兼容）
+    valid_minutes = Column(Integer, default=0)  # 有效分钟数（整数，取整到分钟）
+    skipped_minutes = Column(Float, default=0.0)  # 周期窗口内已跳过的分钟数（增量维护）
+    skip_horizon = Column(DateTime, nullable=True)  # 最晚的跳过结束时间，用于判断增量结果是否可直接使用
     is_completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -32,6 +35,34 @@ class CycleRecords(Base):
     
     # 与跳过时间段的关系
     skip_period_records = relationship("SkipPeriod", back_populates="cycle")
+    
+    __table_args__ = (
+        # 按完成状态过滤并按周期号分页
+        Index("ix_cycle_records_completed_number", "is_completed", "cycle_number"),
+        # 查询与日期范围重叠的周期，以及按开始时间过滤
+        Index("ix_cycle_records_start_end", "start_date", "end_date"),
+        # 当前周期查询（is_completed = 0 ORDER BY id DESC），部分索引只包含未完成周期
+        Index("ix_cycle_records_open", "id", sqlite_where=text("is_completed = 0")),
+    )
+
+def hhmm_minutes_sql(column: str) -> str:
+    """把HH:MM格式（时为1到2位数字）的字段换算为当天分钟数的SQL表达式，其他格式为空"""
+    return (
+        f"CASE WHEN {column} GLOB '[0-9]:[0-9][0-9]' OR {column} GLOB '[0-9][0-9]:[0-9][0-9]' "
+        f"THEN CAST(substr({column}, 1, instr({column}, ':') - 1) AS INTEGER) * 60 "
+        f"+ CAST(substr({column}, instr({column}, ':') + 1) AS INTEGER) END"
+    )
+
+
+# 跳过时间段整数分钟字段的生成表达式，结束时间早于开始时间时顺延到次日
+SKIP_DAY_SQL = "date(date)"
+SKIP_START_MINUTE_SQL = hhmm_minutes_sql("start_time")
+SKIP_DURATION_SQL = (
+    f"CASE WHEN ({hhmm_minutes_sql('end_time')}) < ({SKIP_START_MINUTE_SQL}) "
+    f"THEN ({hhmm_minutes_sql('end_time')}) - ({SKIP_START_MINUTE_SQL}) + 1440 "
+    f"ELSE ({hhmm_minutes_sql('end_time')}) - ({SKIP_START_MINUTE_SQL}) END"
+)
+
 
 class SkipPeriod(Base):
     """跳过时间段模型"""
@@ -42,8 +73,63 @@ class SkipPeriod(Base):
     date = Column(DateTime, nullable=False)
     start_time = Column(String, nullable=False)  # 存储为HH:MM格式
     end_time = Column(String, nullable=False)    # 存储为HH:MM格式
+    # 整数分钟字段，由数据库根据上面三个字段生成（虚拟列，不能写入），计算时不必再解析字符串。
+    # 新建或修改的记录在 flush 之后才能读到新值
+    day = Column(Date, Computed(SKIP_DAY_SQL))  # 跳过日期
+    start_minute_of_day = Column(Integer, Computed(SKIP_START_MINUTE_SQL))  # 当天开始分钟数，不是HH:MM格式时为空
+    duration_minutes = Column(Integer, Computed(SKIP_DURATION_SQL))  # 持续分钟数（跨午夜时顺延到次日），不是HH:MM格式时为空
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
     # 关系
-    cycle = relationship("CycleRecords", back_populates="skip_period_records") 
\ No newline at end of file
+    cycle = relationship("CycleRecords", back_populates="skip_period_records")
+    
+    __table_args__ = (
+        # 按周期和日期范围查询跳过时间段
+        Index("ix_skip_periods_cycle_date", "cycle_id", "date"),
+        # 同一周期同一天只能有一条记录（day 为生成列，与 date 的时间部分无关）
+        Index("uq_skip_periods_cycle_day", "cycle_id", "day", unique=True),
+    )
+
+
+class CycleDayLedger(Base):
+    """周期逐日台账，每个周期的每一天一行，记录该天在周期窗口内跳过和有效的分钟数
+
+    由跳过时间段的写入操作增量维护，按日期范围的统计只需对索引范围求和。
+    """
+    __tablename__ = "cycle_day_ledger"
+
+    cycle_id = Column(Integer, ForeignKey("cycle_records.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    skipped_minutes = Column(Float, nullable=False, default=0.0)
+    valid_minutes = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # 跨周期按日期范围统计
+        Index("ix_cycle_day_ledger_day", "day"),
+    )
+
+
+class DataVersion(Base):
+    """数据版本模型，任何数据修改都会使版本号递增，用于生成ETag"""
+    __tablename__ = "data_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class RecomputeRun(Base):
+    """批量重算任务的进度记录，中断后可以从最后处理的周期继续"""
+    __tablename__ = "recompute_runs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String(20), nullable=False, default="running")  # running / completed / failed
+    as_of = Column(DateTime, nullable=False)  # 未完成周期按此时间计算，续跑时保持不变
+    total = Column(Integer, nullable=False, default=0)  # 开始时的周期总数
+    processed = Column(Integer, nullable=False, default=0)  # 已处理的周期数
+    updated = Column(Integer, nullable=False, default=0)  # 计数发生变化并已写回的周期数
+    last_cycle_id = Column(Integer, nullable=False, default=0)  # 已写回的最大周期ID（检查点）
+    error = Column(String(500), nullable=True)
+    started_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
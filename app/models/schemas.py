@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, Dict, List, Any, Union
 
 # 日历设置模型
@@ -83,4 +83,30 @@ class CalendarResponse(BaseModel):
     current_cycle: Optional[CycleRecords] = None
     historical_cycles: List[CycleRecords] = []  # 添加历史周期信息
     valid_days_count: int
-    valid_hours_count: float = 0.0
\ No newline at end of file
+    valid_hours_count: float = 0.0
+
+# 紧凑格式的日历数据响应模型（?format=compact）
+class CompactCalendarResponse(BaseModel):
+    format: str = "compact"
+    range_start: datetime
+    day_count: int
+    valid_bitmap: str  # base64位图，第i天对应第i//8字节的第i%8位（低位在前）
+    skipped_bitmap: str
+    skip_periods: List[List[Any]] = []  # 稀疏跳过表，每项为 [天偏移, 开始时间, 结束时间, 跳过时间段ID]
+    current_cycle: Optional[CycleRecords] = None
+    historical_cycles: List[CycleRecords] = []
+    valid_days_count: int
+    valid_hours_count: float = 0.0
+
+# 周期逐日台账响应模型
+class CycleDay(BaseModel):
+    day: date
+    skipped_minutes: float
+    valid_minutes: float
+
+class CycleDayLedger(BaseModel):
+    cycle_id: int
+    days: List[CycleDay]
+    skipped_minutes: float
+    valid_minutes: float
+    valid_hours: float
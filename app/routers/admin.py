@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+import hmac
+import logging
+import os
+
+from app.database.database import get_db
+from app.services import bulk_recompute, calc_trace
+
+router = APIRouter()
+
+# 获取路由专用日志记录器
+logger = logging.getLogger("api.admin")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """管理接口需要在 X-Admin-Token 请求头中提供 ADMIN_TOKEN 环境变量设置的令牌
+
+    未设置 ADMIN_TOKEN 时管理接口不启用。令牌使用常量时间比较，避免通过响应时间逐字节猜测。
+    """
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="管理接口未启用"
+        )
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理令牌无效"
+        )
+
+
+@router.get("/traces", dependencies=[Depends(require_admin)])
+def get_traces(limit: int = Query(50, ge=1, le=1000)):
+    """获取最近的计算追踪记录，最新的在前
+    
+    请求头带有 X-Calc-Trace: 1 的请求会被追踪，响应头 X-Calc-Trace-Id 为对应的追踪ID。
+    """
+    return {
+        "trace_all": calc_trace.TRACE_ALL,
+        "buffer_size": calc_trace.TRACE_BUFFER_SIZE,
+        "traces": calc_trace.recent(limit),
+    }
+
+
+@router.delete("/traces", dependencies=[Depends(require_admin)])
+def clear_traces():
+    """清空计算追踪记录"""
+    calc_trace.clear()
+    logger.info("已清空计算追踪记录")
+    return {"success": True}
+
+
+@router.post("/recompute", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+def start_recompute(
+    restart: bool = Query(False, description="放弃未完成的任务，重新开始"),
+    workers: Optional[int] = Query(None, ge=1, le=64, description="进程数，默认为 BULK_RECOMPUTE_WORKERS"),
+    chunk_size: Optional[int] = Query(None, ge=1, le=10000, description="每块的周期数，默认为 BULK_RECOMPUTE_CHUNK_SIZE")
+):
+    """在后台批量重算所有周期的有效天数和有效小时数
+
+    存在未完成的任务时默认从其检查点续跑，进度通过 GET /api/admin/recompute 查看。
+    """
+    state = bulk_recompute.start_in_background(restart, workers, chunk_size)
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="已有批量重算任务正在运行"
+        )
+    logger.info(f"已启动批量重算任务 {state['id']}")
+    return state
+
+
+@router.get("/recompute", dependencies=[Depends(require_admin)])
+def get_recompute(db: Session = Depends(get_db)):
+    """获取最近一次批量重算任务的进度"""
+    run = bulk_recompute.latest_run(db)
+    if run is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="没有批量重算任务"
+        )
+    return {**bulk_recompute.describe(run), "running": bulk_recompute.is_running()}
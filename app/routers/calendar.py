@@ -1,13 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Union
 from datetime import datetime, timedelta, date
 import logging
 
 from app.database.database import get_db
 from app.models import models, schemas
-from app.services import calendar_service
-from app.services.calendar_service import calculate_valid_days_and_hours
+from app.services import calendar_service, cycle_scheduler, data_version, grid_cache, skip_accounting
 
 router = APIRouter()
 
@@ -37,6 +36,7 @@ def create_settings(
         db_settings = models.CalendarSettings(**settings.dict())
         db.add(db_settings)
     
+    data_version.bump(db)
     db.commit()
     db.refresh(db_settings)
     logger.info(f"日历设置已保存，开始时间: {db_settings.start_date}")
@@ -54,15 +54,12 @@ def create_settings(
         current_cycle.start_date = settings.start_date
         logger.info(f"更新周期ID {current_cycle.id} 的开始时间: {before_date} -> {settings.start_date}")
         
-        # 重新计算有效天数和小时数
-        skip_periods = db.query(models.SkipPeriod)\
-            .filter(models.SkipPeriod.cycle_id == current_cycle.id)\
-            .all()
-        valid_days, valid_hours = calculate_valid_days_and_hours(current_cycle, skip_periods)
-        current_cycle.valid_days_count = valid_days
-        current_cycle.valid_hours_count = valid_hours
+        # 开始时间变化后重建跳过记账，再更新有效天数和小时数
+        skip_accounting.rebuild_cycle(db, current_cycle)
+        valid_days, valid_hours = skip_accounting.refresh_cycle_counters(db, current_cycle)
         logger.info(f"更新周期ID {current_cycle.id} 的有效天数为: {valid_days}, 有效小时数为: {valid_hours:.2f}")
         
+        data_version.bump(db)
         db.commit()
     elif is_new_settings and settings.start_date:
         # 如果是首次创建设置，但没有周期记录，主动创建一个新周期
@@ -85,6 +82,7 @@ def create_settings(
             is_completed=False
         )
         db.add(new_cycle)
+        data_version.bump(db)
         db.commit()
         logger.info(f"创建了新周期，ID: {new_cycle.id}, 周期号: {cycle_number}, 开始时间: {settings.start_date}")
         return db_settings  # 提前返回，跳过check_and_create_cycle
@@ -105,16 +103,29 @@ def get_settings(db: Session = Depends(get_db)):
         )
     return settings
 
-@router.get("/data", response_model=schemas.CalendarResponse)
+@router.get("/data", response_model=Union[schemas.CalendarResponse, schemas.CompactCalendarResponse])
 def get_calendar_data(
+    request: Request,
+    response: Response,
     start_date: str = None,
     end_date: str = None,
+    response_format: str = Query("full", alias="format"),
+    include_skip_periods: bool = True,
     db: Session = Depends(get_db)
 ):
     """获取日历数据
     
-    如果未指定开始和结束日期，则默认返回当前月份的数据
+    如果未指定开始和结束日期，则默认返回当前月份的数据。
+    format=compact 时返回紧凑格式：范围起始日期、有效位图、跳过位图和稀疏的跳过时间段表。
+    include_skip_periods=false 时周期数据中不包含跳过时间段明细。
     """
+    if response_format not in ("full", "compact"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的数据格式: {response_format}，可选值为 full 或 compact"
+        )
+    compact = response_format == "compact"
+    
     # 获取日历设置
     settings = db.query(models.CalendarSettings).first()
     
@@ -141,6 +152,14 @@ def get_calendar_data(
     
     # 如果没有设置，返回空日历数据
     if not settings:
+        if compact:
+            return schemas.CompactCalendarResponse(
+                range_start=datetime(start_date.year, start_date.month, start_date.day),
+                day_count=0,
+                valid_bitmap="",
+                skipped_bitmap="",
+                valid_days_count=0
+            )
         return {
             "days": [],
             "current_cycle": None,
@@ -154,70 +173,58 @@ def get_calendar_data(
         .order_by(models.CycleRecords.id.desc())\
         .first()
     
+    # 根据数据版本、请求参数、当天日期和实时计数（精确到分钟）生成ETag，未变化时直接返回304
+    valid_days, valid_hours = skip_accounting.current_counters(db, current_cycle) if current_cycle else (0, 0.0)
+    etag = data_version.make_etag(
+        db, "calendar", start_date.isoformat(), end_date.isoformat(), response_format, include_skip_periods,
+        datetime.now().date().isoformat(), current_cycle.id if current_cycle else None,
+        valid_days, round(valid_hours * 60)
+    )
+    if data_version.is_not_modified(request, etag):
+        return data_version.not_modified_response(etag)
+    response.headers.update(data_version.cache_headers(etag))
+    
     # 计算日历数据
     calendar_data = calendar_service.calculate_calendar_data(
-        db, settings, start_date, end_date, current_cycle
+        db, settings, start_date, end_date, current_cycle,
+        compact=compact, include_skip_periods=include_skip_periods
     )
     
     return calendar_data
 
 @router.post("/increment-day")
 def increment_valid_day(db: Session = Depends(get_db)):
-    """增加有效天数计数，如果达到26天则完成当前周期并开始新周期"""
-    # 获取当前进行中的周期
+    """完成所有已到完成时刻的周期，供未启用周期切换调度器（ENABLE_CYCLE_SCHEDULER）的部署由 cron 定时调用
+
+    不再手动累加有效天数：有效计数由跳过记账维护，周期在累计满26天有效时间的精确时刻完成，
+    与调度器使用同一逻辑（cycle_scheduler.roll_over_due_cycles），重复调用不会重复切换。
+    """
     current_cycle = db.query(models.CycleRecords)\
         .filter(models.CycleRecords.is_completed == False)\
         .order_by(models.CycleRecords.id.desc())\
         .first()
-    
     if not current_cycle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="未找到进行中的周期"
         )
-    
-    # 增加有效小时数 (增加24小时，相当于一天)
-    current_cycle.valid_hours_count += 24
-    
-    # 从有效小时数重新计算有效天数
-    current_cycle.valid_days_count = int(current_cycle.valid_hours_count / 24)
-    
-    # 检查是否达到26天
-    if current_cycle.valid_days_count >= 26:
-        # 完成当前周期
-        current_cycle.is_completed = True
-        current_cycle.end_date = datetime.now()
-        
-        # 获取用户设置的起始时间
-        settings = db.query(models.CalendarSettings).first()
-        start_date = datetime.now()
-        
-        # 如果有设置，使用设置的开始时间
-        if settings:
-            # 使用当前日期，但使用设置中的时间部分
-            now = datetime.now()
-            start_date = datetime(
-                now.year,
-                now.month,
-                now.day,
-                settings.start_date.hour,
-                settings.start_date.minute,
-                0
-            )
-        
-        # 创建新周期
-        new_cycle = models.CycleRecords(
-            cycle_number=current_cycle.cycle_number + 1,
-            start_date=start_date,
-            valid_days_count=0,
-            valid_hours_count=0,
-            is_completed=False
-        )
-        db.add(new_cycle)
-    
-    db.commit()
-    
-    return {"message": "有效天数已更新", "valid_days_count": current_cycle.valid_days_count}
+    previous_number = current_cycle.cycle_number
+
+    next_completion = cycle_scheduler.roll_over_due_cycles(db)
+    current_cycle = db.query(models.CycleRecords)\
+        .filter(models.CycleRecords.is_completed == False)\
+        .order_by(models.CycleRecords.id.desc())\
+        .first()
+    valid_days, _ = skip_accounting.current_counters(db, current_cycle)
+    completed = current_cycle.cycle_number - previous_number
+    if completed:
+        logger.info(f"increment-day 完成了 {completed} 个周期，当前周期 #{current_cycle.cycle_number}")
+    return {
+        "message": f"已完成 {completed} 个周期" if completed else "当前周期尚未累计满26天",
+        "valid_days_count": valid_days,
+        "completed_cycles": completed,
+        "next_completion_time": next_completion,
+    }
 
 @router.post("/skip-period-validated", response_model=schemas.SkipPeriod)
 def set_skip_period(
@@ -363,30 +370,24 @@ def set_skip_period(
         
         logger.info(f"跳过日期验证通过: {skip_date} 在周期范围内")
         
-        # 检查是否已存在该日期的跳过时间段
-        existing_skip_periods = db.query(models.SkipPeriod)\
+        # 检查是否已存在该日期的跳过时间段（按日期范围查询，不再加载整个周期的记录）
+        day_start = datetime(date_only.year, date_only.month, date_only.day)
+        found_record = db.query(models.SkipPeriod)\
             .filter(models.SkipPeriod.cycle_id == skip_period_data.cycle_id)\
-            .all()
-        
-        # 手动筛选匹配的日期记录
-        found_record = None
-        for record in existing_skip_periods:
-            record_date = record.date.date()
-            input_date_only = date_only.date()
-            
-            logger.debug(f"比较日期 - 记录: {record_date}, 输入: {input_date_only}")
-            
-            if record_date == input_date_only:
-                found_record = record
-                logger.info(f"找到匹配记录 ID: {record.id}")
-                break
+            .filter(models.SkipPeriod.date >= day_start)\
+            .filter(models.SkipPeriod.date < day_start + timedelta(days=1))\
+            .first()
+        if found_record:
+            logger.info(f"找到匹配记录 ID: {found_record.id}")
         
         if found_record:
             # 更新现有记录
+            before = skip_accounting.snapshot(found_record)
             found_record.start_time = skip_period_data.start_time
             found_record.end_time = skip_period_data.end_time
-            db.commit()
-            db.refresh(found_record)
+            skip_accounting.apply_period_change(
+                db, cycle, found_record.id, before, skip_accounting.snapshot(found_record)
+            )
             result = found_record
             logger.info(f"更新现有记录 ID: {found_record.id}")
         else:
@@ -398,20 +399,18 @@ def set_skip_period(
                 end_time=skip_period_data.end_time
             )
             db.add(new_skip_period)
-            db.commit()
-            db.refresh(new_skip_period)
+            db.flush()
+            skip_accounting.apply_period_change(
+                db, cycle, new_skip_period.id, None, skip_accounting.snapshot(new_skip_period)
+            )
             result = new_skip_period
             logger.info(f"创建新记录 ID: {new_skip_period.id}")
         
-        # 获取所有跳过时间段
-        skip_periods = db.query(models.SkipPeriod)\
-            .filter(models.SkipPeriod.cycle_id == cycle.id)\
-            .all()
-        
-        # 重新计算有效天数和小时数
-        valid_days, valid_hours = calculate_valid_days_and_hours(cycle, skip_periods)
-        cycle.valid_days_count = valid_days
-        cycle.valid_hours_count = valid_hours
+        # 只根据本次变化的增量更新有效天数和小时数
+        valid_days, valid_hours = skip_accounting.refresh_cycle_counters(db, cycle)
+        data_version.bump(db, invalidate=grid_cache.cycle_scope(cycle, skip_date))
+        db.commit()
+        db.refresh(result)
         logger.info(f"更新周期ID {cycle.id} 的有效天数为: {valid_days}, 有效小时数为: {valid_hours:.2f}")
         
         return result
@@ -438,12 +437,14 @@ def get_skip_periods(
     return skip_periods
 
 @router.delete("/skip-periods/{period_id}", response_model=dict)
-async def delete_skip_period(
+def delete_skip_period(
     period_id: int,
     db: Session = Depends(get_db)
 ):
     """
     删除指定的跳过周期
+    
+    与其他接口一样声明为同步函数，数据库操作在线程池中执行，不阻塞事件循环
     """
     try:
         logger.info(f"正在尝试删除跳过周期, ID: {period_id}")
@@ -472,21 +473,15 @@ async def delete_skip_period(
         }
         
         # 删除跳过周期
+        before = skip_accounting.snapshot(period)
         db.delete(period)
-        db.commit()
+        db.flush()
         logger.info(f"成功删除跳过周期, ID: {period_id}")
         
-        # 获取更新后的跳过周期列表
-        remaining_skip_periods = db.query(models.SkipPeriod).filter(models.SkipPeriod.cycle_id == current_cycle.id).all()
-        logger.info(f"剩余跳过周期数量: {len(remaining_skip_periods)}")
-        
-        # 重新计算有效天数和小时数
-        valid_days, valid_hours = calculate_valid_days_and_hours(current_cycle, remaining_skip_periods)
-        logger.info(f"重新计算的有效天数: {valid_days}, 有效小时数: {valid_hours:.2f}")
-        
-        # 更新周期记录的有效天数
-        current_cycle.valid_days_count = valid_days
-        current_cycle.valid_hours_count = valid_hours
+        # 只根据删除的时间段增量更新有效天数和小时数
+        skip_accounting.apply_period_change(db, current_cycle, period_id, before, None)
+        valid_days, valid_hours = skip_accounting.refresh_cycle_counters(db, current_cycle)
+        data_version.bump(db, invalidate=grid_cache.cycle_scope(current_cycle, before[0]))
         db.commit()
         logger.info(f"已更新周期ID {current_cycle.id} 的有效天数为 {valid_days}, 有效小时数为 {valid_hours:.2f}")
         
@@ -510,8 +505,9 @@ async def delete_skip_period(
 def reset_calendar(db: Session = Depends(get_db)):
     """重置日历，删除所有设置和周期记录"""
     try:
-        # 删除所有跳过时间段
+        # 删除所有跳过时间段和逐日台账
         db.query(models.SkipPeriod).delete()
+        db.query(models.CycleDayLedger).delete()
         
         # 删除所有周期记录
         db.query(models.CycleRecords).delete()
@@ -519,6 +515,7 @@ def reset_calendar(db: Session = Depends(get_db)):
         # 删除日历设置
         db.query(models.CalendarSettings).delete()
         
+        data_version.bump(db)
         db.commit()
         return {"message": "日历已重置，所有数据已清除"}
     except Exception as e:
@@ -1,25 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, noload, selectinload
+from typing import List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import logging
 
 from app.database.database import get_db
 from app.models import models, schemas
-from app.services.calendar_service import calculate_valid_days_and_hours
+from app.services import calendar_service, data_version, day_ledger, skip_accounting
 
 router = APIRouter()
 
+# 获取路由专用日志记录器
+logger = logging.getLogger("api.cycles")
+
+# 只提供游标、未指定 limit 时的每页数量
+DEFAULT_PAGE_SIZE = 100
+
+def _parse_cursor(cursor: str) -> Tuple[int, int]:
+    """解析分页游标，格式为 周期号:ID"""
+    try:
+        cycle_number, cycle_id = cursor.split(':')
+        return int(cycle_number), int(cycle_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无效的分页游标: {cursor}"
+        )
+
 @router.get("/", response_model=List[schemas.CycleRecords])
 def get_all_cycles(
+    request: Request,
+    response: Response,
     skip: int = 0, 
-    limit: int = 100,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+    is_completed: Optional[bool] = None,
+    include_skip_periods: bool = True,
     db: Session = Depends(get_db)
 ):
-    """获取所有周期记录"""
-    cycles = db.query(models.CycleRecords)\
-        .order_by(models.CycleRecords.cycle_number.desc())\
-        .offset(skip).limit(limit).all()
-    return cycles
+    """获取周期记录，按周期号倒序
+    
+    limit 和 cursor 都未提供时返回全部周期（与分页之前的行为一致）。
+    使用游标分页：响应头 X-Next-Cursor 为下一页的游标，没有更多数据时不返回该响应头。
+    游标按 (周期号, ID) 定位，任意深度的分页代价与第一页相同；skip 仅为兼容保留。
+    start_from/start_to 按开始时间过滤，is_completed 按完成状态过滤。
+    跳过时间段明细通过一次批量查询加载；include_skip_periods=false 时不加载。
+    """
+    # 数据未变化时直接返回304
+    etag = data_version.make_etag(
+        db, "cycles", skip, limit, cursor, start_from, start_to, is_completed, include_skip_periods
+    )
+    if data_version.is_not_modified(request, etag):
+        return data_version.not_modified_response(etag)
+    response.headers.update(data_version.cache_headers(etag))
+    
+    loader = selectinload if include_skip_periods else noload
+    query = db.query(models.CycleRecords)\
+        .options(loader(models.CycleRecords.skip_period_records))
+    if is_completed is not None:
+        query = query.filter(models.CycleRecords.is_completed == is_completed)
+    if start_from is not None:
+        query = query.filter(models.CycleRecords.start_date >= start_from)
+    if start_to is not None:
+        query = query.filter(models.CycleRecords.start_date <= start_to)
+    if cursor:
+        # 周期号可能重复，以ID作为第二排序键保证游标位置唯一
+        query = query.filter(
+            tuple_(models.CycleRecords.cycle_number, models.CycleRecords.id) < _parse_cursor(cursor)
+        )
+    elif skip:
+        query = query.offset(skip)
+    
+    query = query.order_by(models.CycleRecords.cycle_number.desc(), models.CycleRecords.id.desc())
+    if limit is None and cursor:
+        limit = DEFAULT_PAGE_SIZE
+    if limit is not None:
+        query = query.limit(limit)
+    cycles = query.all()
+    
+    if limit is not None and len(cycles) == limit:
+        response.headers["X-Next-Cursor"] = f"{cycles[-1].cycle_number}:{cycles[-1].id}"
+    return [calendar_service.cycle_schema(cycle, include_skip_periods) for cycle in cycles]
 
 @router.get("/current", response_model=schemas.CycleRecords)
 def get_current_cycle(db: Session = Depends(get_db)):
@@ -35,25 +99,18 @@ def get_current_cycle(db: Session = Depends(get_db)):
             detail="未找到进行中的周期"
         )
     
-    # 获取跳过时间段
-    skip_periods = db.query(models.SkipPeriod)\
-        .filter(models.SkipPeriod.cycle_id == cycle.id)\
-        .all()
-    
-    # 计算有效小时数
-    # 使用新的统一计算函数
-    valid_days, valid_hours = calculate_valid_days_and_hours(cycle, skip_periods)
-    
-    # 更新周期记录
-    cycle.valid_days_count = valid_days
-    cycle.valid_hours_count = valid_hours
-    db.commit()
-    
-    return cycle
+    # 读取接口不写数据库，返回根据跳过记账计算的实时计数
+    return calendar_service.cycle_with_live_counters(db, cycle)
 
 @router.get("/{cycle_id}", response_model=schemas.CycleRecords)
-def get_cycle_by_id(cycle_id: int, db: Session = Depends(get_db)):
+def get_cycle_by_id(cycle_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """根据ID获取特定周期记录"""
+    # 数据未变化时直接返回304
+    etag = data_version.make_etag(db, "cycle", cycle_id)
+    if data_version.is_not_modified(request, etag):
+        return data_version.not_modified_response(etag)
+    response.headers.update(data_version.cache_headers(etag))
+    
     cycle = db.query(models.CycleRecords).filter(models.CycleRecords.id == cycle_id).first()
     if not cycle:
         raise HTTPException(
@@ -62,6 +119,43 @@ def get_cycle_by_id(cycle_id: int, db: Session = Depends(get_db)):
         )
     return cycle
 
+@router.get("/{cycle_id}/days", response_model=schemas.CycleDayLedger)
+def get_cycle_days(
+    cycle_id: int,
+    request: Request,
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """获取周期的逐日跳过/有效分钟数明细及合计，直接读取逐日台账"""
+    # 未完成周期的最后几天按当天日期推算，ETag中包含当天日期
+    etag = data_version.make_etag(db, "cycle_days", cycle_id, start_date, end_date, date.today())
+    if data_version.is_not_modified(request, etag):
+        return data_version.not_modified_response(etag)
+    response.headers.update(data_version.cache_headers(etag))
+
+    cycle = db.query(models.CycleRecords).filter(models.CycleRecords.id == cycle_id).first()
+    if not cycle:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"未找到ID为{cycle_id}的周期记录"
+        )
+
+    rows = day_ledger.cycle_days(db, cycle, start_date, end_date)
+    skipped_minutes = sum(row[1] for row in rows)
+    valid_minutes = sum(row[2] for row in rows)
+    return schemas.CycleDayLedger(
+        cycle_id=cycle.id,
+        days=[
+            schemas.CycleDay(day=day, skipped_minutes=skipped, valid_minutes=valid)
+            for day, skipped, valid in rows
+        ],
+        skipped_minutes=skipped_minutes,
+        valid_minutes=valid_minutes,
+        valid_hours=valid_minutes / 60
+    )
+
 @router.put("/{cycle_id}", response_model=schemas.CycleRecords)
 def update_cycle(
     cycle_id: int, 
@@ -80,8 +174,9 @@ def update_cycle(
     date_changed = False
     
     # 更新字段
-    print('收到更新字段:', cycle_update.dict(exclude_unset=True))
-    for key, value in cycle_update.dict(exclude_unset=True).items():
+    update_data = cycle_update.dict(exclude_unset=True)
+    logger.debug(f"收到更新字段: {update_data}")
+    for key, value in update_data.items():
         # 强制类型转换，确保日期时间字段为 datetime
         if key in ['start_date', 'end_date'] and isinstance(value, str):
             try:
@@ -90,28 +185,24 @@ def update_cycle(
                     # 如果以Z结尾，替换为+00:00
                     value = value[:-1] + '+00:00'
                 value = datetime.fromisoformat(value)
-                print(f'{key} 字段转换成功: {value}')
                 date_changed = True  # 标记日期已修改
             except Exception as e:
-                print(f'{key} 字段转换失败: {value}, 错误: {e}')
+                logger.warning(f"{key} 字段转换失败: {value}, 错误: {e}")
                 # 如果转换失败，跳过这个字段
                 continue
         setattr(db_cycle, key, value)
     
-    # 每次更新周期时都重新计算有效天数和有效小时数，以确保数据准确
-    # 获取跳过时间段
-    skip_periods = db.query(models.SkipPeriod)\
-        .filter(models.SkipPeriod.cycle_id == cycle_id)\
-        .all()
+    # 开始/结束时间或完成状态变化时，周期的记账窗口随之变化，需要重建跳过记账
+    if date_changed or update_data.keys() & {'start_date', 'end_date', 'is_completed'}:
+        skip_accounting.rebuild_cycle(db, db_cycle)
     
     # 重新计算有效天数，如果用户提供了结束日期，使用结束日期而不是当前时间
     end_time = db_cycle.end_date if db_cycle.end_date else None
-    valid_days, valid_hours = calculate_valid_days_and_hours(db_cycle, skip_periods, end_time)
-    db_cycle.valid_days_count = valid_days
-    db_cycle.valid_hours_count = valid_hours
+    valid_days, valid_hours = skip_accounting.refresh_cycle_counters(db, db_cycle, end_time)
     
-    print(f"重新计算结果 - 总小时: {valid_hours:.2f}, 有效天数: {valid_days}")
+    logger.debug(f"周期ID {cycle_id} 重新计算结果 - 有效小时: {valid_hours:.2f}, 有效天数: {valid_days}")
     
+    data_version.bump(db)
     db.commit()
     db.refresh(db_cycle)
     
@@ -132,6 +223,7 @@ def update_cycle(
                 is_completed=False
             )
             db.add(new_cycle)
+            data_version.bump(db)
             db.commit()
     
     return db_cycle
@@ -146,7 +238,9 @@ def delete_cycle(cycle_id: int, db: Session = Depends(get_db)):
             detail=f"未找到ID为{cycle_id}的周期记录"
         )
     
+    day_ledger.delete_cycle(db, db_cycle.id)
     db.delete(db_cycle)
+    data_version.bump(db)
     db.commit()
     
     return None
@@ -171,6 +265,8 @@ def complete_cycle(cycle_id: int, db: Session = Depends(get_db), remark: str = N
     if not remark or not remark.strip():
         raise HTTPException(status_code=400, detail="结束理由（备注）不能为空")
     db_cycle.remark = remark
+    skip_accounting.rebuild_cycle(db, db_cycle)
+    data_version.bump(db)
     db.commit()
     db.refresh(db_cycle)
     
@@ -200,6 +296,7 @@ def complete_cycle(cycle_id: int, db: Session = Depends(get_db), remark: str = N
         is_completed=False
     )
     db.add(new_cycle)
+    data_version.bump(db)
     db.commit()
     db.refresh(new_cycle)
     
@@ -237,6 +334,7 @@ def create_cycle(
         remark=cycle_data.remark or ""
     )
     db.add(new_cycle)
+    data_version.bump(db)
     db.commit()
     db.refresh(new_cycle)
     return new_cycle 
\ No newline at end of file
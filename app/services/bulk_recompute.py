@@ -0,0 +1,318 @@
+"""批量重算所有周期的有效天数和有效小时数
+
+修改设置或修复数据之后使用，代替逐个周期通过ORM或HTTP接口重算的脚本：
+1. 按周期ID分块读取周期及其跳过时间段，只读取计算需要的列，不构建ORM对象
+2. 各块分发到进程池，在子进程中调用 calculate_valid_days_and_hours
+3. 按读取顺序收集结果，只把计数发生变化的周期用一条批量 UPDATE 写回，每块提交一次
+4. 每块提交时在 recompute_runs 表记录检查点（已写回的最大周期ID），任务中断后从检查点继续
+5. 全部块完成后用 verify_skip_accounting 对账，修正与跳过时间段不一致的跳过记账和逐日台账
+
+未完成周期按任务开始时间（as_of）计算。续跑时 as_of 更新为续跑的时间，避免按中断前的时间写回过期的计数；
+任务结束时再按当前时间刷新所有未完成周期，中断前已写回的未完成周期也会更新。
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models import models
+from app.services import data_version, grid_cache, skip_accounting
+from app.services.calendar_service import calculate_valid_days_and_hours
+from app.services.skip_engine import minute_counters
+
+# 获取日志记录器
+logger = logging.getLogger("api.bulk_recompute")
+
+# 进程池大小，默认与CPU核数相同；为1时在当前进程中计算
+DEFAULT_WORKERS = int(os.environ.get("BULK_RECOMPUTE_WORKERS", "0")) or (os.cpu_count() or 1)
+# 每块的周期数
+DEFAULT_CHUNK_SIZE = int(os.environ.get("BULK_RECOMPUTE_CHUNK_SIZE", "500"))
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_CYCLE_COLUMNS = (
+    models.CycleRecords.id,
+    models.CycleRecords.cycle_number,
+    models.CycleRecords.start_date,
+    models.CycleRecords.end_date,
+    models.CycleRecords.is_completed,
+)
+_PERIOD_COLUMNS = (
+    models.SkipPeriod.date,
+    models.SkipPeriod.start_time,
+    models.SkipPeriod.end_time,
+    models.SkipPeriod.day,
+    models.SkipPeriod.start_minute_of_day,
+    models.SkipPeriod.duration_minutes,
+)
+_CYCLE_KEYS = tuple(column.key for column in _CYCLE_COLUMNS)
+_PERIOD_KEYS = tuple(column.key for column in _PERIOD_COLUMNS)
+
+# 发送到子进程的一块数据: [(周期列, [跳过时间段列, ...]), ...]
+Chunk = List[Tuple[tuple, List[tuple]]]
+# 计算结果: (周期ID, 有效分钟数, 有效天数, 有效小时数)
+CounterRow = Tuple[int, int, int, float]
+
+# 同一进程内同时只运行一个批量重算任务
+_active = threading.Lock()
+
+
+def compute_chunk(chunk: Chunk, as_of: datetime) -> List[CounterRow]:
+    """计算一块周期的有效计数，在进程池的子进程中执行"""
+    results = []
+    for cycle_row, period_rows in chunk:
+        cycle = SimpleNamespace(**dict(zip(_CYCLE_KEYS, cycle_row)))
+        periods = [SimpleNamespace(**dict(zip(_PERIOD_KEYS, row))) for row in period_rows]
+        # 与 calculate_valid_days_and_hours 的规则一致：有结束时间的周期算到结束时间，否则算到 as_of
+        end_time = None if cycle.end_date else as_of
+        _, valid_hours = calculate_valid_days_and_hours(cycle, periods, end_time)
+        results.append((cycle.id, *minute_counters(valid_hours)))
+    return results
+
+
+def _read_chunk(db: Session, after_id: int, chunk_size: int) -> Tuple[Chunk, Dict[int, tuple]]:
+    """读取ID大于 after_id 的下一块周期及其跳过时间段
+
+    Returns:
+        tuple: (待计算的数据, 周期ID -> 当前保存的计数)
+    """
+    cycle_rows = db.execute(
+        select(
+            *_CYCLE_COLUMNS,
+            models.CycleRecords.valid_minutes,
+            models.CycleRecords.valid_days_count,
+            models.CycleRecords.valid_hours_count,
+        )
+        .where(models.CycleRecords.id > after_id)
+        .order_by(models.CycleRecords.id)
+        .limit(chunk_size)
+    ).all()
+    if not cycle_rows:
+        return [], {}
+
+    periods_by_cycle: Dict[int, List[tuple]] = {}
+    period_rows = db.execute(
+        select(models.SkipPeriod.cycle_id, *_PERIOD_COLUMNS)
+        .where(models.SkipPeriod.cycle_id >= cycle_rows[0].id)
+        .where(models.SkipPeriod.cycle_id <= cycle_rows[-1].id)
+    )
+    for row in period_rows:
+        periods_by_cycle.setdefault(row[0], []).append(tuple(row[1:]))
+
+    width = len(_CYCLE_COLUMNS)
+    chunk = [(tuple(row[:width]), periods_by_cycle.get(row.id, [])) for row in cycle_rows]
+    stored = {row.id: tuple(row[width:]) for row in cycle_rows}
+    return chunk, stored
+
+
+def _write_results(db: Session, results: List[CounterRow], stored: Dict[int, tuple]) -> int:
+    """用一条批量 UPDATE 写回发生变化的计数，返回写回的周期数"""
+    rows = [
+        {"id": cycle_id, "valid_minutes": valid_minutes, "valid_days_count": valid_days, "valid_hours_count": valid_hours}
+        for cycle_id, valid_minutes, valid_days, valid_hours in results
+        if stored.get(cycle_id) != (valid_minutes, valid_days, valid_hours)
+    ]
+    if rows:
+        db.execute(update(models.CycleRecords), rows)
+    return len(rows)
+
+
+def _submit(executor: Optional[ProcessPoolExecutor], chunk: Chunk, as_of: datetime) -> Future:
+    if executor is None:
+        future = Future()
+        future.set_result(compute_chunk(chunk, as_of))
+        return future
+    return executor.submit(compute_chunk, chunk, as_of)
+
+
+def latest_run(db: Session) -> Optional[models.RecomputeRun]:
+    """最近一次批量重算任务"""
+    return db.query(models.RecomputeRun)\
+        .order_by(models.RecomputeRun.id.desc())\
+        .first()
+
+
+def start_run(db: Session, restart: bool = False) -> models.RecomputeRun:
+    """创建批量重算任务
+
+    存在未完成（运行中断或失败）的任务时默认从其检查点续跑；restart 为 True 时放弃该任务重新开始。
+    """
+    run = latest_run(db)
+    if run is not None and run.status != COMPLETED and not restart:
+        run.status = RUNNING
+        run.error = None
+        # 已完成周期的计数与时间无关，未完成周期按续跑的时间计算
+        run.as_of = datetime.now()
+        logger.info(f"续跑批量重算任务 {run.id}，从周期ID {run.last_cycle_id} 之后开始，已处理 {run.processed}/{run.total}")
+    else:
+        if run is not None and run.status != COMPLETED:
+            run.status = FAILED
+            run.error = "已被新的任务取代"
+        run = models.RecomputeRun(
+            status=RUNNING,
+            as_of=datetime.now(),
+            total=db.query(func.count(models.CycleRecords.id)).scalar(),
+        )
+        db.add(run)
+    db.commit()
+    return run
+
+
+def describe(run: models.RecomputeRun) -> Dict:
+    """任务进度，用于管理接口的响应"""
+    return {
+        "id": run.id,
+        "status": run.status,
+        "as_of": run.as_of,
+        "total": run.total,
+        "processed": run.processed,
+        "updated": run.updated,
+        "last_cycle_id": run.last_cycle_id,
+        "progress": round(min(run.processed / run.total, 1.0), 4) if run.total else 1.0,
+        "error": run.error,
+        "started_at": run.started_at,
+        "updated_at": run.updated_at,
+        "finished_at": run.finished_at,
+    }
+
+
+def recompute_all(
+    db: Session,
+    run: Optional[models.RecomputeRun] = None,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    progress: Optional[Callable[[models.RecomputeRun], None]] = None
+) -> models.RecomputeRun:
+    """执行（或续跑）批量重算任务
+
+    Args:
+        db: 数据库会话
+        run: 要执行的任务，为 None 时由 start_run 创建或续跑
+        workers: 进程数，为1时在当前进程中计算
+        chunk_size: 每块的周期数
+        progress: 每块提交后调用，参数为任务记录
+
+    Returns:
+        RecomputeRun: 完成的任务记录；出错时任务标记为失败并重新抛出异常
+    """
+    run = run or start_run(db)
+    workers = workers or DEFAULT_WORKERS
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    # 子进程使用 spawn 启动，避免在多线程的服务进程中 fork
+    executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if workers > 1 else None
+    # 每个进程保持两块待算，主进程读取和写回的同时子进程不会空闲
+    max_pending = workers * 2 if executor else 1
+
+    started = time.perf_counter()
+    processed_at_start = run.processed
+    pending = deque()
+    after_id = run.last_cycle_id
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                chunk, stored = _read_chunk(db, after_id, chunk_size)
+                if not chunk:
+                    exhausted = True
+                    break
+                after_id = chunk[-1][0][0]
+                pending.append((_submit(executor, chunk, run.as_of), stored, after_id))
+            if not pending:
+                break
+
+            future, stored, last_cycle_id = pending.popleft()
+            results = future.result()
+            updated = _write_results(db, results, stored)
+            run.processed += len(results)
+            run.updated += updated
+            run.last_cycle_id = last_cycle_id
+            if updated:
+                data_version.bump(db, invalidate=grid_cache.ALL)
+            db.commit()
+
+            elapsed = time.perf_counter() - started
+            rate = (run.processed - processed_at_start) / elapsed if elapsed > 0 else 0.0
+            remaining = max(run.total - run.processed, 0)
+            logger.info(
+                f"批量重算进度: {run.processed}/{run.total}，已更新 {run.updated} 个周期，"
+                f"{rate:.0f} 个/秒，预计剩余 {remaining / rate if rate else 0:.0f} 秒"
+            )
+            if progress is not None:
+                progress(run)
+
+        # 批量 UPDATE 只写有效计数，跳过记账（skipped_minutes、skip_horizon）和逐日台账由对账修正
+        drifts = skip_accounting.verify_skip_accounting(db, fix=True)
+        if drifts:
+            logger.info(f"批量重算任务 {run.id} 修正了 {len(drifts)} 个周期的跳过记账")
+        skip_accounting.refresh_open_cycles(db)
+
+        run.status = COMPLETED
+        run.finished_at = datetime.now()
+        db.commit()
+        logger.info(f"批量重算任务 {run.id} 完成: 处理 {run.processed} 个周期，更新 {run.updated} 个")
+        return run
+    except BaseException as e:
+        # 包括 KeyboardInterrupt：已提交的块保留，下次从检查点续跑
+        db.rollback()
+        run.status = FAILED
+        run.error = str(e)[:500] or type(e).__name__
+        db.commit()
+        logger.error(f"批量重算任务 {run.id} 在周期ID {run.last_cycle_id} 之后中断: {e!r}")
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def start_in_background(
+    restart: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> Optional[Dict]:
+    """在后台线程中执行批量重算任务
+
+    Returns:
+        dict: 任务进度；本进程已有任务在运行时返回 None
+    """
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        db = SessionLocal()
+        try:
+            run = start_run(db, restart)
+            state = describe(run)
+        finally:
+            db.close()
+    except BaseException:
+        _active.release()
+        raise
+
+    def worker():
+        db = SessionLocal()
+        try:
+            recompute_all(db, db.get(models.RecomputeRun, state["id"]), workers, chunk_size)
+        except Exception:
+            logger.exception("后台批量重算任务失败")
+        finally:
+            db.close()
+            _active.release()
+
+    threading.Thread(target=worker, name=f"bulk-recompute-{state['id']}", daemon=True).start()
+    return state
+
+
+def is_running() -> bool:
+    """本进程中是否有批量重算任务正在运行"""
+    return _active.locked()
@@ -0,0 +1,128 @@
+"""计算过程追踪
+
+替代计算热点路径中的调试 print()。追踪默认关闭，关闭时调用处只需一次
+ContextVar 读取并判断是否为 None，追踪字段不会被格式化。
+
+请求头带有 X-Calc-Trace: 1 时，中间件为该请求开启追踪；也可以通过环境变量
+CALC_TRACE_ALL=1 对所有请求开启。请求结束后追踪记录进入固定大小的环形缓冲区，
+由管理接口 /api/admin/traces 读取。
+
+调用处的写法：
+
+    trace = calc_trace.current()
+    if trace is not None:
+        trace.event("skipped", skipped_hours=skipped_hours)
+"""
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# 开启追踪的请求头
+TRACE_HEADER = "X-Calc-Trace"
+# 响应中返回追踪ID的请求头
+TRACE_ID_HEADER = "X-Calc-Trace-Id"
+
+# 是否对所有请求开启追踪
+TRACE_ALL = os.environ.get("CALC_TRACE_ALL", "0") == "1"
+# 是否允许通过请求头开启追踪
+TRACE_HEADER_ENABLED = os.environ.get("CALC_TRACE_HEADER_ENABLED", "1") == "1"
+# 环形缓冲区保留的追踪数量
+TRACE_BUFFER_SIZE = int(os.environ.get("CALC_TRACE_BUFFER_SIZE", "200"))
+# 单个追踪最多记录的事件数，避免大量跳过时间段时占用过多内存
+MAX_EVENTS_PER_TRACE = 500
+
+
+class Trace:
+    """一次请求的计算追踪记录"""
+
+    __slots__ = ("id", "label", "started_at", "_started", "events", "dropped_events", "duration_ms")
+
+    def __init__(self, trace_id: int, label: str):
+        self.id = trace_id
+        self.label = label
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self.dropped_events = 0
+        self.duration_ms: Optional[float] = None
+
+    def event(self, name: str, **fields: Any) -> None:
+        """记录一个计算步骤"""
+        if len(self.events) >= MAX_EVENTS_PER_TRACE:
+            self.dropped_events += 1
+            return
+        self.events.append({
+            "at_ms": round((time.perf_counter() - self._started) * 1000, 3),
+            "event": name,
+            **{key: _jsonable(value) for key, value in fields.items()},
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "events": list(self.events),
+            "dropped_events": self.dropped_events,
+        }
+
+
+def _jsonable(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("calc_trace", default=None)
+_ids = itertools.count(1)
+_buffer: "deque[Trace]" = deque(maxlen=TRACE_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+
+
+def current() -> Optional[Trace]:
+    """返回当前上下文中的追踪记录，未开启追踪时为 None"""
+    return _current.get()
+
+
+def start(label: str):
+    """在当前上下文中开启追踪，返回用于结束追踪的令牌"""
+    return _current.set(Trace(next(_ids), label))
+
+
+def finish(token) -> Optional[Trace]:
+    """结束追踪并将记录放入环形缓冲区"""
+    trace = _current.get()
+    _current.reset(token)
+    if trace is None:
+        return None
+    trace.duration_ms = round((time.perf_counter() - trace._started) * 1000, 3)
+    with _buffer_lock:
+        _buffer.append(trace)
+    return trace
+
+
+def should_trace(headers) -> bool:
+    """判断请求是否需要开启追踪"""
+    if TRACE_ALL:
+        return True
+    return TRACE_HEADER_ENABLED and headers.get(TRACE_HEADER, "").lower() in ("1", "true", "on")
+
+
+def recent(limit: int = 50) -> List[Dict[str, Any]]:
+    """返回最近的追踪记录，最新的在前"""
+    with _buffer_lock:
+        traces = list(_buffer)[-limit:] if limit > 0 else []
+    return [trace.to_dict() for trace in reversed(traces)]
+
+
+def clear() -> None:
+    with _buffer_lock:
+        _buffer.clear()
@@ -1,11 +1,15 @@
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import func, inspect as sa_inspect
+from sqlalchemy.orm import Session, noload, selectinload
+import base64
+from datetime import date, datetime, timedelta
 import json
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 from functools import lru_cache
 
 from app.models import models, schemas
+from app.services import calc_trace, data_version, grid_cache, metrics, skip_accounting
+from app.services.skip_engine import SkipIntervalSet, valid_counters
 
 # 获取日志记录器
 logger = logging.getLogger("api.calendar_service")
@@ -64,6 +68,7 @@ def check_and_create_cycle(db: Session):
             is_completed=False
         )
         db.add(new_cycle)
+        data_version.bump(db)
         db.commit()
         logger.info(f"创建了新的周期记录，ID: {new_cycle.id}, 周期号: {cycle_number}, 开始时间: {start_date}")
         return new_cycle
@@ -106,14 +111,156 @@ def get_skip_period(date: datetime, settings: models.CalendarSettings) -> Dict[s
         "end_time": end_time
     }
 
+def cycle_schema(cycle: models.CycleRecords, include_skip_periods: bool = True) -> schemas.CycleRecords:
+    """将周期记录转换为响应模型
+
+    不需要跳过时间段明细时只读取列属性，不会触发 skip_period_records 的延迟加载。
+    """
+    if include_skip_periods:
+        return schemas.CycleRecords.model_validate(cycle)
+    data = {attr.key: getattr(cycle, attr.key) for attr in sa_inspect(cycle).mapper.column_attrs}
+    data["skip_period_records"] = None
+    return schemas.CycleRecords.model_validate(data)
+
+def cycle_with_live_counters(
+    db: Session,
+    cycle: models.CycleRecords,
+    include_skip_periods: bool = True
+) -> schemas.CycleRecords:
+    """返回带有实时有效天数和小时数的周期数据，不修改数据库中的记录"""
+    valid_days, valid_hours = skip_accounting.current_counters(db, cycle)
+    return cycle_schema(cycle, include_skip_periods).model_copy(update={
+        "valid_days_count": valid_days,
+        "valid_hours_count": valid_hours
+    })
+
+def _calendar_columns(
+    cycle: Optional[models.CycleRecords],
+    skip_periods: List[models.SkipPeriod],
+    start_date: datetime,
+    end_date: datetime
+) -> Tuple[List[bool], Dict[int, models.SkipPeriod]]:
+    """一次遍历计算日期范围内每一天的有效标记和跳过时间段
+
+    跳过时间段先按日期建立索引，每天只需一次字典查找，总代价与范围天数加时间段数量成正比。
+
+    Returns:
+        tuple: (每天的有效标记列表, 天偏移到跳过时间段的映射)
+    """
+    # 按日期索引跳过时间段，同一天有多条记录时保留第一条
+    skip_by_date: Dict[date, models.SkipPeriod] = {}
+    for skip_period in skip_periods:
+        skip_by_date.setdefault(skip_period.date.date(), skip_period)
+    
+    # 有效日期范围：周期开始日到结束日（已完成）或今天（未完成）
+    valid_from = valid_until = None
+    if cycle:
+        valid_from = cycle.start_date.date()
+        if cycle.is_completed and cycle.end_date:
+            valid_until = cycle.end_date.date()
+        else:
+            valid_until = datetime.now().date()
+    
+    first_day = start_date.date()
+    day_count = (end_date.date() - first_day).days + 1
+    valid_flags = []
+    skipped = {}
+    for offset in range(day_count):
+        current_date_only = first_day + timedelta(days=offset)
+        skip_period = skip_by_date.get(current_date_only)
+        if skip_period is not None:
+            # 该日期有自定义跳过时间段，跳过的日期不是有效日期
+            skipped[offset] = skip_period
+            valid_flags.append(False)
+        else:
+            valid_flags.append(valid_from is not None and valid_from <= current_date_only <= valid_until)
+    
+    return valid_flags, skipped
+
+def build_calendar_days(
+    cycle: Optional[models.CycleRecords],
+    skip_periods: List[models.SkipPeriod],
+    start_date: datetime,
+    end_date: datetime
+) -> List[schemas.CalendarDay]:
+    """生成日期范围内每一天的日历数据"""
+    valid_flags, skipped = _calendar_columns(cycle, skip_periods, start_date, end_date)
+    
+    days = []
+    for offset, is_valid in enumerate(valid_flags):
+        current_date = start_date + timedelta(days=offset)
+        skip_period = skipped.get(offset)
+        if skip_period is not None:
+            days.append(schemas.CalendarDay.model_construct(
+                date=current_date,
+                is_skipped=True,
+                skip_period={
+                    "date": skip_period.date.strftime("%Y-%m-%d"),
+                    "start_time": skip_period.start_time,
+                    "end_time": skip_period.end_time
+                },
+                skip_period_id=skip_period.id,
+                is_valid_day=False,
+                is_valid=False
+            ))
+        else:
+            days.append(schemas.CalendarDay.model_construct(
+                date=current_date,
+                is_skipped=False,
+                skip_period=None,
+                skip_period_id=None,
+                is_valid_day=is_valid,
+                is_valid=is_valid
+            ))
+    
+    return days
+
+def encode_bitmap(flags: List[bool]) -> str:
+    """将布尔列表编码为base64位图，第i项对应第i//8字节的第i%8位（低位在前）"""
+    bitmap = bytearray((len(flags) + 7) // 8)
+    for index, flag in enumerate(flags):
+        if flag:
+            bitmap[index >> 3] |= 1 << (index & 7)
+    return base64.b64encode(bytes(bitmap)).decode("ascii")
+
+def build_compact_calendar(
+    cycle: Optional[models.CycleRecords],
+    skip_periods: List[models.SkipPeriod],
+    start_date: datetime,
+    end_date: datetime
+) -> Dict[str, Any]:
+    """生成紧凑格式的日历数据：有效位图、跳过位图和稀疏的跳过时间段表"""
+    valid_flags, skipped = _calendar_columns(cycle, skip_periods, start_date, end_date)
+    skipped_flags = [False] * len(valid_flags)
+    for offset in skipped:
+        skipped_flags[offset] = True
+    
+    return {
+        "range_start": start_date,
+        "day_count": len(valid_flags),
+        "valid_bitmap": encode_bitmap(valid_flags),
+        "skipped_bitmap": encode_bitmap(skipped_flags),
+        "skip_periods": [
+            [offset, skip_period.start_time, skip_period.end_time, skip_period.id]
+            for offset, skip_period in sorted(skipped.items())
+        ]
+    }
+
+@metrics.CALC_DURATION.time("calculate_calendar_data")
 def calculate_calendar_data(
     db: Session,
     settings: models.CalendarSettings,
     start_date: datetime,
     end_date: datetime,
-    current_cycle: Optional[models.CycleRecords] = None
-) -> schemas.CalendarResponse:
-    """计算日期范围内的日历数据"""
+    current_cycle: Optional[models.CycleRecords] = None,
+    compact: bool = False,
+    include_skip_periods: bool = True
+) -> Union[schemas.CalendarResponse, schemas.CompactCalendarResponse]:
+    """计算日期范围内的日历数据
+
+    compact为True时返回紧凑格式（位图 + 稀疏跳过表），否则返回逐日的完整格式。
+    include_skip_periods为False时，周期数据中不包含跳过时间段明细；紧凑格式始终不包含。
+    """
     # 确保日期没有时间部分
     start_date = datetime(start_date.year, start_date.month, start_date.day)
     end_date = datetime(end_date.year, end_date.month, end_date.day, 23, 59, 59)
@@ -127,112 +274,90 @@ def calculate_calendar_data(
             .order_by(models.CycleRecords.id.desc())\
             .first()
 
-    # 获取指定日期范围内的历史周期
+    # 日历网格和范围内的历史周期只随数据修改和日期变化，优先从缓存读取
+    # 先读取版本号再读取数据，保证缓存条目不会比其版本号更旧
+    version = data_version.current(db)
+    include_skip_periods = include_skip_periods and not compact
+    cache_key = (
+        start_date, end_date, compact, include_skip_periods,
+        current_cycle.id if current_cycle else None, datetime.now().date()
+    )
+    cached = grid_cache.calendar_grids.get(cache_key, version)
+    if cached is None:
+        cached = _build_calendar_grid(db, current_cycle, start_date, end_date, compact, include_skip_periods)
+        grid_cache.calendar_grids.put(cache_key, version, cached)
+    grid, historical_cycles = cached
+    
+    # 读取路径不写数据库：根据跳过记账计算实时的有效天数和小时数
+    valid_days_count, valid_hours_count = 0, 0.0
+    current_cycle_data = None
+    if current_cycle:
+        current_cycle_data = cycle_with_live_counters(db, current_cycle, include_skip_periods)
+        valid_days_count = current_cycle_data.valid_days_count
+        valid_hours_count = current_cycle_data.valid_hours_count
+    
+    if compact:
+        # 紧凑格式不包含周期的跳过时间段明细，前端从稀疏表中读取
+        return schemas.CompactCalendarResponse(
+            **grid,
+            current_cycle=current_cycle_data,
+            historical_cycles=historical_cycles,
+            valid_days_count=valid_days_count,
+            valid_hours_count=valid_hours_count
+        )
+    
+    # 创建响应
+    return schemas.CalendarResponse(
+        days=grid,
+        current_cycle=current_cycle_data,
+        historical_cycles=historical_cycles,
+        valid_days_count=valid_days_count,
+        valid_hours_count=valid_hours_count
+    )
+
+def _build_calendar_grid(
+    db: Session,
+    current_cycle: Optional[models.CycleRecords],
+    start_date: datetime,
+    end_date: datetime,
+    compact: bool,
+    include_skip_periods: bool
+) -> Tuple[Any, List[schemas.CycleRecords]]:
+    """计算日历网格（逐日数据或紧凑格式）以及范围内的历史周期"""
+    # 获取指定日期范围内的历史周期，跳过时间段明细通过一次批量查询加载，避免逐个周期延迟加载
+    loader = selectinload if include_skip_periods else noload
     historical_cycles = db.query(models.CycleRecords)\
+        .options(loader(models.CycleRecords.skip_period_records))\
         .filter(models.CycleRecords.is_completed == True)\
         .filter(
-            # 周期开始日期在查询范围内，或者周期结束日期在查询范围内，或者查询范围在周期内
-            (models.CycleRecords.start_date >= start_date) & (models.CycleRecords.start_date <= end_date) |
-            (models.CycleRecords.end_date >= start_date) & (models.CycleRecords.end_date <= end_date) |
-            (models.CycleRecords.start_date <= start_date) & (models.CycleRecords.end_date >= end_date)
+            # 周期与查询范围重叠：开始于范围结束之前，且结束于范围开始之后（没有结束时间的按开始时间判断）
+            # 写成单个范围条件，可以使用 (start_date, end_date) 索引
+            models.CycleRecords.start_date <= end_date,
+            func.coalesce(models.CycleRecords.end_date, models.CycleRecords.start_date) >= start_date
         )\
         .order_by(models.CycleRecords.start_date.desc())\
         .all()
 
     logger.debug(f"找到 {len(historical_cycles)} 个历史周期在日期范围内")
     
-    # 初始化结果
-    days = []
-    
     # 获取跳过时间段
     skip_periods = []
     if current_cycle:
+        # 只查询日期范围内的跳过时间段，代价与范围大小成正比而非周期的记录总数
         skip_periods = db.query(models.SkipPeriod)\
             .filter(models.SkipPeriod.cycle_id == current_cycle.id)\
+            .filter(models.SkipPeriod.date >= start_date)\
+            .filter(models.SkipPeriod.date <= end_date)\
             .all()
         
-        logger.debug(f"获取到的跳过时间段: {skip_periods}")
-        
-        # 自动计算有效天数和有效小时数
-        valid_days, valid_hours = calculate_valid_days_and_hours(current_cycle, skip_periods)
-        
-        # 更新周期记录
-        current_cycle.valid_days_count = valid_days
-        current_cycle.valid_hours_count = valid_hours
-        db.commit()
-    
-    valid_days_count = current_cycle.valid_days_count if current_cycle else 0
-    valid_hours_count = current_cycle.valid_hours_count if current_cycle else 0.0
+        logger.debug(f"获取到 {len(skip_periods)} 个范围内的跳过时间段")
     
-    # 计算日期范围内的每一天
-    current_date = start_date
-    while current_date <= end_date:
-        # 默认为不跳过
-        is_skipped = False
-        is_valid = False
-        
-        # 检查是否在周期时间范围内
-        if current_cycle:
-            cycle_start_date = current_cycle.start_date.date()
-            current_date_only = current_date.date()
-            
-            # 如果周期已完成，检查是否在周期时间范围内
-            if current_cycle.is_completed and current_cycle.end_date:
-                cycle_end_date = current_cycle.end_date.date()
-                is_valid = cycle_start_date <= current_date_only <= cycle_end_date
-            else:
-                # 如果周期未完成，检查是否在开始日期之后且不超过当前日期
-                today = datetime.now().date()
-                is_valid = cycle_start_date <= current_date_only <= today
-        
-        calendar_day = schemas.CalendarDay(
-            date=current_date,
-            is_skipped=is_skipped,
-            is_valid_day=is_valid,
-            is_valid=is_valid  # 添加is_valid字段
-        )
-        
-        # 检查是否是周期开始日
-        if current_cycle and current_date.date() == current_cycle.start_date.date():
-            logger.debug(f"日期 {current_date.date()} 是周期开始日")
-            # 周期开始日不需要特殊处理，在前端会单独标记
-            pass
-        
-        # 检查是否在跳过时间段列表中
-        for skip_period in skip_periods:
-            # 使用只包含日期部分的比较，忽略时间部分
-            skip_date = skip_period.date.date()
-            current_date_only = current_date.date()
-            
-            if current_date_only == skip_date:
-                logger.debug(f"日期 {current_date_only} 匹配跳过日期 {skip_date}")
-                # 该日期有自定义跳过时间段
-                is_skipped = True
-                calendar_day.is_skipped = True
-                calendar_day.is_valid_day = False
-                calendar_day.is_valid = False  # 跳过的日期不是有效日期
-                calendar_day.skip_period = {
-                    "date": skip_period.date.strftime("%Y-%m-%d"),
-                    "start_time": skip_period.start_time,
-                    "end_time": skip_period.end_time
-                }
-                calendar_day.skip_period_id = skip_period.id
-                break
-        
-        days.append(calendar_day)
-        
-        # 移动到下一天
-        current_date += timedelta(days=1)
-    
-    # 创建响应
-    return schemas.CalendarResponse(
-        days=days,
-        current_cycle=current_cycle,
-        historical_cycles=historical_cycles,
-        valid_days_count=valid_days_count,
-        valid_hours_count=valid_hours_count
-    )
+    historical_data = [cycle_schema(cycle, include_skip_periods) for cycle in historical_cycles]
+    if compact:
+        return build_compact_calendar(current_cycle, skip_periods, start_date, end_date), historical_data
+    return build_calendar_days(current_cycle, skip_periods, start_date, end_date), historical_data
 
+@metrics.CALC_DURATION.time("calculate_valid_days_and_hours")
 def calculate_valid_days_and_hours(cycle: models.CycleRecords, skip_periods: List[models.SkipPeriod], end_time: Optional[datetime] = None) -> tuple[int, float]:
     """
     统一计算当前周期的有效天数和有效小时数
@@ -245,126 +370,59 @@ def calculate_valid_days_and_hours(cycle: models.CycleRecords, skip_periods: Lis
     Returns:
         tuple: (有效天数, 有效小时数)
     """
+    trace = calc_trace.current()
     try:
-        print(f"[DEBUG] calculate_valid_days_and_hours 开始计算")
-        print(f"[DEBUG] cycle: {cycle}")
-        print(f"[DEBUG] cycle.start_date: {cycle.start_date if cycle else None}")
-        print(f"[DEBUG] cycle.end_date: {cycle.end_date if cycle else None}")
-        print(f"[DEBUG] 传入的end_time: {end_time}")
-        
         if not cycle or not cycle.start_date:
-            print(f"[DEBUG] 周期或开始时间为空，返回 (0, 0.0)")
+            if trace is not None:
+                trace.event("calculate_valid_days_and_hours.empty_cycle")
             return 0, 0.0
         
         # 确定结束时间的优先级：传入的end_time > 周期的end_date > 当前时间
-        if end_time is None:
-            if cycle.end_date:
-                end_time = cycle.end_date
-                print(f"[DEBUG] 使用周期结束时间: {end_time}")
-            else:
-                end_time = datetime.now()
-                print(f"[DEBUG] 使用当前时间: {end_time}")
+        if end_time is not None:
+            end_source = "argument"
+        elif cycle.end_date:
+            end_time, end_source = cycle.end_date, "cycle_end_date"
         else:
-            print(f"[DEBUG] 使用传入的结束时间: {end_time}")
-        
-        print(f"[DEBUG] 开始时间: {cycle.start_date}")
-        print(f"[DEBUG] 结束时间: {end_time}")
+            end_time, end_source = datetime.now(), "now"
         
         # 检查周期是否已经开始
         if end_time < cycle.start_date:
-            print(f"[DEBUG] 周期尚未开始，返回 (0, 0.0)")
+            if trace is not None:
+                trace.event("calculate_valid_days_and_hours.not_started", cycle_id=cycle.id,
+                            start_time=cycle.start_date, end_time=end_time)
             return 0, 0.0
             
         # 计算总时间差（小时）
         total_hours = (end_time - cycle.start_date).total_seconds() / 3600
-        print(f"[DEBUG] 总小时数: {total_hours:.4f}")
-        
-        # 计算跳过的小时数
-        skipped_hours = 0
-        print(f"[DEBUG] 跳过时间段数量: {len(skip_periods)}")
-        
-        for period in skip_periods:
-            try:
-                # 获取跳过日期
-                skip_date = period.date.date()
-                print(f"[DEBUG] 处理跳过日期: {skip_date}")
-                
-                # 验证跳过日期是否在周期开始时间之后（防御性检查）
-                cycle_start_date = cycle.start_date.date()
-                if skip_date < cycle_start_date:
-                    print(f"[DEBUG] 跳过日期 {skip_date} 在周期开始日期 {cycle_start_date} 之前，忽略此跳过时间段")
-                    continue
-                
-                # 如果周期已完成，验证跳过日期是否在周期结束时间之前
-                if hasattr(cycle, 'is_completed') and cycle.is_completed and hasattr(cycle, 'end_date') and cycle.end_date:
-                    cycle_end_date = cycle.end_date.date()
-                    if skip_date > cycle_end_date:
-                        print(f"[DEBUG] 跳过日期 {skip_date} 在周期结束日期 {cycle_end_date} 之后，忽略此跳过时间段")
-                        continue
-                
-                # 获取跳过时间段
-                start_hour, start_minute = map(int, period.start_time.split(':'))
-                end_hour, end_minute = map(int, period.end_time.split(':'))
-                
-                # 创建跳过开始和结束时间的datetime对象
-                skip_start = datetime.combine(skip_date, datetime.min.time().replace(hour=start_hour, minute=start_minute))
-                skip_end = datetime.combine(skip_date, datetime.min.time().replace(hour=end_hour, minute=end_minute))
-                
-                # 如果结束时间小于开始时间，说明跨天了
-                if end_hour < start_hour or (end_hour == start_hour and end_minute < start_minute):
-                    skip_end = skip_end + timedelta(days=1)
-                
-                print(f"[DEBUG] 跳过时段 - 开始: {skip_start}, 结束: {skip_end}")
-                
-                # 检查跳过时间段是否在周期时间范围内
-                if skip_start > end_time or skip_end < cycle.start_date:
-                    # 跳过时间段不在周期内，忽略
-                    print(f"[DEBUG] 跳过时段不在周期范围内，忽略")
-                    continue
-                    
-                # 调整跳过时间段的开始和结束时间，确保在周期时间范围内
-                adjusted_skip_start = max(skip_start, cycle.start_date)
-                adjusted_skip_end = min(skip_end, end_time)
-                
-                # 计算该时间段跳过的小时数
-                skip_hours = (adjusted_skip_end - adjusted_skip_start).total_seconds() / 3600
-                if skip_hours > 0:
-                    skipped_hours += skip_hours
-                
-                print(f"[DEBUG] 调整后的跳过时段 - 开始: {adjusted_skip_start}, 结束: {adjusted_skip_end}, 跳过小时数: {skip_hours:.4f}")
-            except Exception as e:
-                print(f"[DEBUG] 计算跳过小时数时出错: {e}")
-        
-        # 计算有效小时数和有效天数
-        valid_hours = max(0, total_hours - skipped_hours)
-        import math
-        valid_days = math.ceil(valid_hours / 24) if valid_hours > 0 else 0  # 向上取整
-        
-        print(f"[DEBUG] 计算结果 - 总小时: {total_hours:.4f}, 跳过小时: {skipped_hours:.4f}, 有效小时: {valid_hours:.4f}, 有效天数: {valid_days}")
-        
-        # 确保不超过26天和对应的小时数
-        max_hours = 26 * 24  # 26天的最大小时数
-        if valid_hours > max_hours:
-            print(f"[DEBUG] 有效小时数 {valid_hours:.2f} 超过26天限制，调整为 {max_hours}")
-            valid_hours = max_hours
         
-        valid_days = min(valid_days, 26)
+        # 使用区间引擎计算跳过的小时数，重叠和跨天的时间段只计算一次
+        skip_intervals = SkipIntervalSet.from_skip_periods(skip_periods, cycle)
+        skipped_hours = skip_intervals.skipped_hours_between(cycle.start_date, end_time)
         
-        # 确保有效小时数与有效天数一致（如果有效天数被限制为26，小时数也应该相应调整）
-        if valid_days == 26 and valid_hours > max_hours:
-            valid_hours = max_hours
-            print(f"[DEBUG] 调整有效小时数为26天对应的最大值: {valid_hours}")
+        # 计算有效小时数和有效天数，确保不超过26天和对应的小时数
+        valid_days, valid_hours = valid_counters(total_hours - skipped_hours)
         
-        print(f"[DEBUG] 最终结果 - 有效天数: {valid_days}, 有效小时数: {valid_hours:.4f}")
+        if trace is not None:
+            trace.event(
+                "calculate_valid_days_and_hours",
+                cycle_id=cycle.id,
+                start_time=cycle.start_date,
+                end_time=end_time,
+                end_source=end_source,
+                total_hours=round(total_hours, 4),
+                skip_periods=len(skip_periods),
+                merged_intervals=len(skip_intervals),
+                skipped_hours=round(skipped_hours, 4),
+                valid_hours=round(valid_hours, 4),
+                valid_days=valid_days,
+            )
         
         # 当有效天数达到26天且周期未完成时，记录日志
         if valid_days == 26 and hasattr(cycle, 'is_completed') and not cycle.is_completed:
-            print(f"[DEBUG] 周期 {cycle.cycle_number} 有效天数已达到26天，需要完成当前周期并开始新周期")
+            logger.debug(f"周期 {cycle.cycle_number} 有效天数已达到26天，需要完成当前周期并开始新周期")
         
         return valid_days, valid_hours
     except Exception as e:
-        print(f"[DEBUG] 计算有效天数和小时数 - 发生异常: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"计算有效天数和小时数时发生异常: {e}", exc_info=True)
         # 出错时返回0，避免破坏数据
         return 0, 0.0 
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""周期切换调度器
+
+代替每天由 cron 调用 increment-day 接口的方式：根据跳过时间段直接计算未完成周期累计满
+26 天（26 × 24 小时）有效时间的精确时刻，睡眠到该时刻后完成周期并开启下一个周期。
+
+- 完成时刻由 SkipIntervalSet.advance 反向查询得到，已录入的未来跳过时间段会使其相应推迟
+- 本进程提交任何数据修改（例如编辑跳过时间段）后调度器会被唤醒并重新计算完成时刻；
+  其他进程的修改不会唤醒本进程，因此睡眠时间不超过 CYCLE_SCHEDULER_MAX_SLEEP 秒
+- 完成周期使用带条件的 UPDATE（仅当周期仍未完成时生效），多个 worker 同时运行调度器时只有一个会切换成功
+- 服务停止期间错过的完成时刻会在启动后依次补上，每个周期的结束时间仍为精确的完成时刻
+
+默认不启用，此时由 cron 每天调用 increment-day 接口（scripts/increment_day.sh），该接口同样调用
+roll_over_due_cycles，周期的结束时间仍为精确的完成时刻，只是最多晚一天切换。
+当前周期开始已久的数据库在启用后会一次补齐所有错过的周期，启用前可先检查当前周期的开始时间。
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.services import data_version, skip_accounting
+from app.services.skip_engine import CYCLE_DAYS, SkipIntervalSet, from_minutes, period_bounds, to_minutes
+
+# 获取日志记录器
+logger = logging.getLogger("api.cycle_scheduler")
+
+# 是否在服务进程中运行周期切换调度器
+ENABLED = os.environ.get("ENABLE_CYCLE_SCHEDULER", "0") == "1"
+# 最长睡眠时间（秒）
+MAX_SLEEP_SECONDS = float(os.environ.get("CYCLE_SCHEDULER_MAX_SLEEP", "3600"))
+
+# 一个周期需要累计的有效分钟数
+CYCLE_VALID_MINUTES = CYCLE_DAYS * 24 * 60
+# 完成时刻与分钟坐标互相换算时的舍入误差（分钟），恰好在完成时刻开始的时间段归下一个周期
+BOUNDARY_TOLERANCE_MINUTES = 1e-3
+
+
+def _current_cycle(db: Session) -> Optional[models.CycleRecords]:
+    return db.query(models.CycleRecords)\
+        .filter(models.CycleRecords.is_completed == False)\
+        .order_by(models.CycleRecords.id.desc())\
+        .first()
+
+
+def completion_time(db: Session, cycle: models.CycleRecords) -> datetime:
+    """计算周期累计满26天有效时间的时刻"""
+    skip_periods = db.query(models.SkipPeriod)\
+        .filter(models.SkipPeriod.cycle_id == cycle.id)\
+        .all()
+    intervals = SkipIntervalSet.from_skip_periods(skip_periods, cycle)
+    return from_minutes(intervals.advance(to_minutes(cycle.start_date), CYCLE_VALID_MINUTES))
+
+
+def complete_cycle(db: Session, cycle: models.CycleRecords, end_date: datetime) -> Optional[models.CycleRecords]:
+    """在 end_date 完成周期并开启下一个周期
+
+    在完成时刻之后开始的跳过时间段（包括完成当天的）转移到下一个周期，否则它们会落在已完成周期的
+    窗口之外而不再参与计算。完成时刻由 advance 得到，不会位于跳过区间内部，因此不存在跨越完成时刻、
+    需要拆分的时间段。
+
+    Returns:
+        CycleRecords: 新开启的周期；周期已被其他请求或进程完成时返回 None
+    """
+    result = db.execute(
+        update(models.CycleRecords)
+        .where(models.CycleRecords.id == cycle.id)
+        .where(models.CycleRecords.is_completed == False)
+        .values(is_completed=True, end_date=end_date)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        logger.info(f"周期ID {cycle.id} 已被完成，跳过本次切换")
+        return None
+    db.refresh(cycle)
+
+    next_cycle = models.CycleRecords(
+        cycle_number=cycle.cycle_number + 1,
+        start_date=end_date,
+        valid_days_count=0,
+        valid_hours_count=0.0,
+        valid_minutes=0,
+        is_completed=False
+    )
+    db.add(next_cycle)
+    db.flush()
+
+    moved = 0
+    end_minute = to_minutes(end_date)
+    skip_periods = db.query(models.SkipPeriod)\
+        .filter(models.SkipPeriod.cycle_id == cycle.id)\
+        .all()
+    for period in skip_periods:
+        bounds = period_bounds(period)
+        if bounds is not None:
+            should_move = bounds[0] >= end_minute - BOUNDARY_TOLERANCE_MINUTES
+        else:
+            # 时间格式无效的记录不参与计算，按日期归属
+            should_move = period.date.date() > end_date.date()
+        if should_move:
+            period.cycle_id = next_cycle.id
+            moved += 1
+    db.flush()
+
+    for changed in (cycle, next_cycle):
+        skip_accounting.rebuild_cycle(db, changed)
+        skip_accounting.refresh_cycle_counters(db, changed)
+    data_version.bump(db)
+    db.commit()
+    logger.info(
+        f"周期 #{cycle.cycle_number} 已于 {end_date} 累计满 {CYCLE_DAYS} 天有效时间，"
+        f"开启周期 #{next_cycle.cycle_number}（ID: {next_cycle.id}），转移 {moved} 个跳过时间段"
+    )
+    return next_cycle
+
+
+def roll_over_due_cycles(db: Session, now: Optional[datetime] = None) -> Optional[datetime]:
+    """完成所有已到完成时刻的周期
+
+    Returns:
+        datetime: 当前周期的完成时刻；没有未完成周期时为 None
+    """
+    now = now or datetime.now()
+    while True:
+        cycle = _current_cycle(db)
+        if cycle is None:
+            return None
+        end_date = completion_time(db, cycle)
+        if end_date > now:
+            return end_date
+        complete_cycle(db, cycle, end_date)
+
+
+async def run_scheduler() -> None:
+    """后台任务：睡眠到当前周期的完成时刻后切换周期，数据修改时重新计算"""
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(wake.set)
+
+    data_version.add_commit_listener(notify)
+    try:
+        while True:
+            wake.clear()
+            try:
+                next_time = await asyncio.to_thread(skip_accounting.run_with_session, roll_over_due_cycles)
+            except Exception as e:
+                logger.error(f"周期切换失败: {e}", exc_info=True)
+                next_time = None
+
+            delay = MAX_SLEEP_SECONDS
+            if next_time is not None:
+                delay = min(max((next_time - datetime.now()).total_seconds(), 0.0), MAX_SLEEP_SECONDS)
+                logger.debug(f"当前周期的完成时刻为 {next_time}，{delay:.0f} 秒后检查")
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        data_version.remove_commit_listener(notify)
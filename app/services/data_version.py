@@ -0,0 +1,101 @@
+"""数据版本与ETag支持
+
+data_version表中保存一个全局版本号，日历和周期相关的每次修改都会在同一事务中递增它。
+读取接口根据版本号（以及请求参数等）生成强ETag，请求携带的If-None-Match匹配时直接返回304，
+不必重新计算和序列化数据。版本号保存在数据库中，因此多个uvicorn worker之间也保持一致。
+
+事务提交后，本进程的日历网格缓存会按照 bump 时声明的失效范围进行淘汰，
+并通知通过 add_commit_listener 注册的回调（例如唤醒周期切换调度器）。
+"""
+import hashlib
+from typing import Callable, Dict, List
+
+from fastapi import Request, Response
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.services import grid_cache
+
+_ROW_ID = 1
+
+# 数据版本变化的事务提交后调用的回调，在提交事务的线程中执行，应尽快返回
+_commit_listeners: List[Callable[[], None]] = []
+
+
+def bump(db: Session, invalidate=grid_cache.ALL) -> None:
+    """在当前事务中递增数据版本号，需由调用方提交
+
+    Args:
+        db: 数据库会话
+        invalidate: 本次修改对日历网格缓存的失效范围，默认淘汰全部条目
+    """
+    result = db.execute(
+        update(models.DataVersion)
+        .where(models.DataVersion.id == _ROW_ID)
+        .values(version=models.DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(models.DataVersion).values(id=_ROW_ID, version=1))
+    db.info.setdefault("data_version_changes", []).append((current(db), invalidate))
+
+
+def add_commit_listener(callback: Callable[[], None]) -> None:
+    """注册数据版本变化后的回调"""
+    _commit_listeners.append(callback)
+
+
+def remove_commit_listener(callback: Callable[[], None]) -> None:
+    if callback in _commit_listeners:
+        _commit_listeners.remove(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_cache_invalidation(session: Session) -> None:
+    changes = session.info.pop("data_version_changes", [])
+    for version, invalidate in changes:
+        grid_cache.calendar_grids.advance(version - 1, version, invalidate)
+    if changes:
+        for callback in list(_commit_listeners):
+            callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cache_invalidation(session: Session) -> None:
+    session.info.pop("data_version_changes", None)
+
+
+def current(db: Session) -> int:
+    """读取当前数据版本号"""
+    version = db.execute(
+        select(models.DataVersion.version).where(models.DataVersion.id == _ROW_ID)
+    ).scalar()
+    return version or 0
+
+
+def make_etag(db: Session, *parts) -> str:
+    """根据当前数据版本号和影响响应内容的其他参数生成强ETag"""
+    version = current(db)
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """要求客户端每次使用缓存前都重新验证"""
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """判断请求的If-None-Match是否与当前ETag匹配"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # If-None-Match 使用弱比较，忽略 W/ 前缀
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
@@ -0,0 +1,248 @@
+"""周期逐日台账
+
+cycle_day_ledger 表为每个周期的每一天保存一行：该天与周期窗口的交集中跳过和有效的分钟数。
+已完成周期的台账覆盖开始日期到结束日期；未完成周期覆盖开始日期到今天
+（或最晚的跳过时间段结束的日期），每天的有效分钟数按整天计算，不截止到当前时间。
+
+跳过时间段写入时只重算受影响的一两天，周期窗口变化时整体重建。
+按日期范围的统计、逐日明细和有效小时数合计因此只需对索引范围求和，不必重新计算。
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.services.skip_engine import (
+    MINUTES_PER_DAY,
+    SkipIntervalSet,
+    is_period_in_cycle,
+    skip_period_bounds,
+    to_minutes,
+)
+
+# 获取日志记录器
+logger = logging.getLogger("api.day_ledger")
+
+_EPOCH_DATE = date(1970, 1, 1)
+
+# 台账行: (日期, 跳过分钟数, 有效分钟数)
+LedgerRow = Tuple[date, float, float]
+
+
+def _day_start_minutes(day: date) -> float:
+    return float((day - _EPOCH_DATE).days * MINUTES_PER_DAY)
+
+
+def _date_of_minutes(value: float) -> date:
+    return _EPOCH_DATE + timedelta(days=int(value // MINUTES_PER_DAY))
+
+
+def _compute_rows(cycle: models.CycleRecords, intervals: SkipIntervalSet, days: Iterable[date]) -> List[LedgerRow]:
+    """计算指定日期的台账行，与周期窗口没有交集的日期不产生行"""
+    window_start = to_minutes(cycle.start_date)
+    window_end = to_minutes(cycle.end_date) if cycle.end_date else None
+    rows = []
+    for day in sorted(set(days)):
+        day_start = _day_start_minutes(day)
+        low = max(day_start, window_start)
+        high = day_start + MINUTES_PER_DAY
+        if window_end is not None:
+            high = min(high, window_end)
+        if high <= low:
+            continue
+        skipped = intervals.skipped_minutes(low, high)
+        rows.append((day, skipped, high - low - skipped))
+    return rows
+
+
+def _last_day(cycle: models.CycleRecords, intervals: SkipIntervalSet) -> date:
+    """台账应覆盖到的最后一天"""
+    if cycle.end_date:
+        return cycle.end_date.date()
+    last_day = date.today()
+    if len(intervals):
+        last_day = max(last_day, _date_of_minutes(intervals.intervals[-1][1]))
+    return last_day
+
+
+def _days_between(first: date, last: date) -> List[date]:
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def _write_rows(db: Session, cycle_id: int, days: List[date], rows: List[LedgerRow]) -> None:
+    """用新计算的行替换指定日期的台账行"""
+    db.execute(
+        delete(models.CycleDayLedger)
+        .where(models.CycleDayLedger.cycle_id == cycle_id)
+        .where(models.CycleDayLedger.day.in_(days))
+    )
+    _insert_rows(db, cycle_id, rows)
+
+
+def _insert_rows(db: Session, cycle_id: int, rows: List[LedgerRow]) -> None:
+    if rows:
+        db.execute(insert(models.CycleDayLedger), [
+            {"cycle_id": cycle_id, "day": day, "skipped_minutes": skipped, "valid_minutes": valid}
+            for day, skipped, valid in rows
+        ])
+
+
+def rebuild(db: Session, cycle: models.CycleRecords, skip_periods: Optional[List[models.SkipPeriod]] = None) -> int:
+    """根据周期的全部跳过时间段重建台账
+
+    Returns:
+        int: 写入的行数
+    """
+    if skip_periods is None:
+        skip_periods = db.query(models.SkipPeriod)\
+            .filter(models.SkipPeriod.cycle_id == cycle.id)\
+            .all()
+    intervals = SkipIntervalSet.from_skip_periods(skip_periods, cycle)
+    rows = _compute_rows(cycle, intervals, _days_between(cycle.start_date.date(), _last_day(cycle, intervals)))
+    delete_cycle(db, cycle.id)
+    _insert_rows(db, cycle.id, rows)
+    return len(rows)
+
+
+def _stored_last_day(db: Session, cycle_id: int) -> Optional[date]:
+    return db.execute(
+        select(func.max(models.CycleDayLedger.day)).where(models.CycleDayLedger.cycle_id == cycle_id)
+    ).scalar()
+
+
+def update_days(
+    db: Session,
+    cycle: models.CycleRecords,
+    days: Iterable[date],
+    exclude_id: Optional[int] = None,
+    extra_period: Optional[Tuple[date, str, str]] = None
+) -> None:
+    """重算指定日期的台账行
+
+    只查询这些日期及其前一天的跳过时间段（单个时间段最长不超过24小时）。
+    修改中的时间段尚未写入数据库时，用 exclude_id 排除其旧记录，并通过 extra_period 传入新值。
+    未完成周期的台账会先补齐到这些日期。
+    """
+    last_day = _stored_last_day(db, cycle.id)
+    if last_day is None:
+        # 尚未建立台账，直接整体重建
+        rebuild(db, cycle, _current_periods(db, cycle.id, exclude_id, None, None) + _extra(extra_period))
+        return
+
+    days = set(days)
+    if not cycle.end_date and days and max(days) > last_day:
+        days.update(_days_between(last_day + timedelta(days=1), max(days)))
+    if not days:
+        return
+
+    periods = _current_periods(db, cycle.id, exclude_id, min(days) - timedelta(days=1), max(days))
+    intervals = SkipIntervalSet.from_skip_periods(periods, cycle)
+    if extra_period is not None and is_period_in_cycle(extra_period[0], cycle):
+        try:
+            intervals = SkipIntervalSet(intervals.intervals + [skip_period_bounds(*extra_period)])
+        except ValueError:
+            pass
+    ordered_days = sorted(days)
+    _write_rows(db, cycle.id, ordered_days, _compute_rows(cycle, intervals, ordered_days))
+
+
+class _PendingPeriod:
+    """尚未写入数据库的跳过时间段，用于整体重建时代替ORM对象"""
+
+    __slots__ = ("date", "start_time", "end_time")
+
+    def __init__(self, skip_date: date, start_time: str, end_time: str):
+        self.date = datetime(skip_date.year, skip_date.month, skip_date.day, 12)
+        self.start_time = start_time
+        self.end_time = end_time
+
+
+def _extra(extra_period: Optional[Tuple[date, str, str]]) -> list:
+    return [_PendingPeriod(*extra_period)] if extra_period is not None else []
+
+
+def _current_periods(
+    db: Session,
+    cycle_id: int,
+    exclude_id: Optional[int],
+    first_day: Optional[date],
+    last_day: Optional[date]
+) -> list:
+    query = db.query(models.SkipPeriod).filter(models.SkipPeriod.cycle_id == cycle_id)
+    if first_day is not None:
+        query = query.filter(models.SkipPeriod.date >= datetime.combine(first_day, time.min))
+    if last_day is not None:
+        query = query.filter(models.SkipPeriod.date < datetime.combine(last_day + timedelta(days=1), time.min))
+    if exclude_id is not None:
+        query = query.filter(models.SkipPeriod.id != exclude_id)
+    return query.all()
+
+
+def extend_open_cycles(db: Session) -> int:
+    """将未完成周期的台账补齐到今天，需由调用方提交
+
+    Returns:
+        int: 补齐了台账的周期数量
+    """
+    extended = 0
+    today = date.today()
+    open_cycles = db.query(models.CycleRecords)\
+        .filter(models.CycleRecords.is_completed == False)\
+        .all()
+    for cycle in open_cycles:
+        last_day = _stored_last_day(db, cycle.id)
+        if last_day is not None and last_day >= today:
+            continue
+        update_days(db, cycle, [today])
+        extended += 1
+    return extended
+
+
+def delete_cycle(db: Session, cycle_id: int) -> None:
+    """删除周期的全部台账行"""
+    db.execute(delete(models.CycleDayLedger).where(models.CycleDayLedger.cycle_id == cycle_id))
+
+
+def skipped_totals(db: Session) -> Dict[int, float]:
+    """按周期汇总台账中的跳过分钟数，用于与周期的跳过记账对账"""
+    result = db.execute(
+        select(models.CycleDayLedger.cycle_id, func.sum(models.CycleDayLedger.skipped_minutes))
+        .group_by(models.CycleDayLedger.cycle_id)
+    )
+    return {cycle_id: total for cycle_id, total in result}
+
+
+def cycle_days(
+    db: Session,
+    cycle: models.CycleRecords,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None
+) -> List[LedgerRow]:
+    """读取周期在日期范围内的逐日台账
+
+    未完成周期的台账由后台任务每天补齐，尚未补齐的日期没有跳过时间段
+    （写入跳过时间段时会同步补齐），按整天有效计算，不写数据库。
+    """
+    query = select(
+        models.CycleDayLedger.day,
+        models.CycleDayLedger.skipped_minutes,
+        models.CycleDayLedger.valid_minutes
+    ).where(models.CycleDayLedger.cycle_id == cycle.id)
+    if start_day is not None:
+        query = query.where(models.CycleDayLedger.day >= start_day)
+    if end_day is not None:
+        query = query.where(models.CycleDayLedger.day <= end_day)
+    rows = [tuple(row) for row in db.execute(query.order_by(models.CycleDayLedger.day))]
+
+    if not cycle.end_date:
+        stored_last = _stored_last_day(db, cycle.id)
+        first_missing = stored_last + timedelta(days=1) if stored_last else cycle.start_date.date()
+        if start_day is not None:
+            first_missing = max(first_missing, start_day)
+        last_missing = min(date.today(), end_day) if end_day is not None else date.today()
+        if first_missing <= last_missing:
+            rows.extend(_compute_rows(cycle, SkipIntervalSet([]), _days_between(first_missing, last_missing)))
+    return rows
@@ -0,0 +1,92 @@
+"""日历网格缓存
+
+按 (日期范围, 格式, 当前周期ID, 当天日期) 缓存计算好的日历网格和范围内的历史周期，
+每个条目同时记录生成时的数据版本号，只有版本号与数据库当前版本一致时才会命中。
+
+本进程内的修改提交后，会根据修改影响的日期范围精确地淘汰受影响的条目，
+其余条目直接升级到新版本号继续使用；其他worker的修改只会让本进程的条目失效，不会返回过期数据。
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Hashable, Optional, Tuple
+
+# 失效范围：ALL 表示淘汰全部条目，NONE 表示不影响任何条目，
+# 否则为 (起始日期, 结束日期) 元组，结束日期为 None 表示不设上限
+ALL = "all"
+NONE = "none"
+
+
+class GridCache:
+    """带版本号的线程安全LRU缓存"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, version: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def advance(self, old_version: int, new_version: int, scope=ALL) -> None:
+        """数据版本从 old_version 变为 new_version 后，淘汰受影响的条目，其余条目升级版本号"""
+        with self._lock:
+            if scope == ALL:
+                self._entries.clear()
+                return
+            for key in list(self._entries):
+                version, value = self._entries[key]
+                if version != old_version or (scope != NONE and _overlaps(key, scope)):
+                    del self._entries[key]
+                else:
+                    self._entries[key] = (new_version, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _overlaps(key: Hashable, scope: Tuple[date, Optional[date]]) -> bool:
+    """判断缓存条目的日期范围是否与失效范围重叠，缓存键的前两项为范围的起止时间"""
+    range_start, range_end = key[0], key[1]
+    first_day, last_day = scope
+    if last_day is not None and range_start.date() > last_day:
+        return False
+    return range_end.date() >= first_day
+
+
+def cycle_scope(cycle, skip_date: date):
+    """某个周期中的跳过时间段发生变化时的失效范围
+
+    未完成周期只影响包含该日期的网格；已完成周期作为历史周期出现在与其时间段重叠的所有范围中。
+    """
+    if cycle.is_completed:
+        return cycle.start_date.date(), cycle.end_date.date() if cycle.end_date else None
+    return skip_date, skip_date
+
+
+calendar_grids = GridCache(int(os.environ.get("GRID_CACHE_SIZE", "64")))
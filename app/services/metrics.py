@@ -0,0 +1,205 @@
+"""进程内指标注册表
+
+以 Prometheus 文本格式（text exposition format 0.0.4）输出，由 /metrics 接口提供。
+只实现本项目需要的计数器、直方图和采集时计算的仪表值，不依赖第三方库。
+
+多worker部署时每个进程各自统计，由 Prometheus 按实例分别采集。
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认耗时分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items]
+
+
+class Histogram:
+    """按固定分桶统计分布的直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # 每组标签: [各分桶计数（非累计）, 总和, 次数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(entry[0]), entry[1], entry[2])) for labels, entry in self._values.items())
+        lines = []
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+    def time(self, *labels: str):
+        """装饰器：记录函数的执行耗时"""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, *labels)
+            return wrapper
+        return decorator
+
+
+class CallbackMetric:
+    """采集时才读取数值的指标，例如缓存的命中次数和命中率"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]], kind: str = "gauge"):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._collect()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP请求数", ("method", "route", "status")
+))
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP请求处理耗时", ("method", "route")
+))
+DB_QUERIES = registry.register(Counter(
+    "db_queries_total", "数据库语句执行次数", ("operation",)
+))
+DB_QUERY_DURATION = registry.register(Histogram(
+    "db_query_duration_seconds", "数据库语句执行耗时", ("operation",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+))
+CALC_DURATION = registry.register(Histogram(
+    "calc_duration_seconds", "计算函数执行耗时", ("function",)
+))
+
+
+def _cache_stats():
+    """各缓存的 (名称, 命中次数, 未命中次数, 当前条目数)"""
+    from app.services import grid_cache
+    from app.services.skip_engine import parse_hhmm
+
+    hhmm = parse_hhmm.cache_info()
+    return [
+        ("calendar_grid", grid_cache.calendar_grids.hits, grid_cache.calendar_grids.misses, len(grid_cache.calendar_grids)),
+        ("parse_hhmm", hhmm.hits, hhmm.misses, hhmm.currsize),
+    ]
+
+
+def _cache_hit_ratio():
+    for name, hits, misses, _ in _cache_stats():
+        total = hits + misses
+        yield (name,), (hits / total) if total else 0.0
+
+
+registry.register(CallbackMetric(
+    "cache_hits_total", "缓存命中次数", ("cache",),
+    lambda: [((name,), hits) for name, hits, _, _ in _cache_stats()], kind="counter"
+))
+registry.register(CallbackMetric(
+    "cache_misses_total", "缓存未命中次数", ("cache",),
+    lambda: [((name,), misses) for name, _, misses, _ in _cache_stats()], kind="counter"
+))
+registry.register(CallbackMetric(
+    "cache_hit_ratio", "缓存命中率", ("cache",), _cache_hit_ratio
+))
+registry.register(CallbackMetric(
+    "cache_entries", "缓存当前条目数", ("cache",),
+    lambda: [((name,), entries) for name, _, _, entries in _cache_stats()]
+))
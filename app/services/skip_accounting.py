@@ -0,0 +1,351 @@
+"""跳过时间增量记账
+
+每个周期持久化两项数据：
+- skipped_minutes: 周期窗口（开始时间到结束时间，未结束则不设上限）内已跳过的分钟数
+- skip_horizon: 已知最晚的跳过结束时间
+
+新增、修改或删除单个跳过时间段时，只需查询相邻日期的时间段并计算增量，
+而不必重新加载整个周期的所有跳过记录。周期的开始/结束时间变化时会整体重建一次。
+逐日台账（day_ledger）随记账一起维护。定期校验任务会将增量结果与完整重算进行对账并修正偏差。
+"""
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models import models
+from app.services import calc_trace, data_version, day_ledger, grid_cache, metrics, skip_sql
+from app.services.skip_engine import (
+    SkipIntervalSet,
+    from_minutes,
+    is_period_in_cycle,
+    minute_counters,
+    skip_period_bounds,
+    to_minutes,
+    valid_counters,
+)
+
+# 获取日志记录器
+logger = logging.getLogger("api.skip_accounting")
+
+# 校验时允许的误差（分钟）
+DRIFT_TOLERANCE_MINUTES = 1e-6
+# 逐日台账是多行浮点数求和，允许稍大的误差
+LEDGER_TOLERANCE_MINUTES = 1e-3
+
+# 跳过时间段快照: (日期, 开始时间, 结束时间)
+PeriodSnapshot = Tuple[date, str, str]
+
+
+def snapshot(period: models.SkipPeriod) -> PeriodSnapshot:
+    """记录跳过时间段修改前的状态"""
+    return period.date.date(), period.start_time, period.end_time
+
+
+def _window(cycle: models.CycleRecords) -> Tuple[float, Optional[float]]:
+    """返回周期的记账窗口（分钟坐标），没有结束时间时上限为 None"""
+    start = to_minutes(cycle.start_date)
+    end = to_minutes(cycle.end_date) if cycle.end_date else None
+    return start, end
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def _neighbour_periods(db: Session, cycle_id: int, skip_date: date, exclude_id: Optional[int]) -> List[models.SkipPeriod]:
+    """查询可能与指定日期的时间段重叠的记录（前一天到后一天）
+
+    单个时间段最长不超过24小时，因此只有相邻日期的时间段可能与之重叠。
+    """
+    query = db.query(models.SkipPeriod)\
+        .filter(models.SkipPeriod.cycle_id == cycle_id)\
+        .filter(models.SkipPeriod.date >= _day_start(skip_date - timedelta(days=1)))\
+        .filter(models.SkipPeriod.date < _day_start(skip_date + timedelta(days=2)))
+    if exclude_id is not None:
+        query = query.filter(models.SkipPeriod.id != exclude_id)
+    return query.all()
+
+
+def _marginal_minutes(cycle: models.CycleRecords, period: Optional[PeriodSnapshot], neighbours: List[models.SkipPeriod]) -> float:
+    """计算一个时间段在已有相邻时间段基础上额外贡献的跳过分钟数"""
+    if period is None:
+        return 0.0
+    skip_date, start_time, end_time = period
+    if not is_period_in_cycle(skip_date, cycle):
+        return 0.0
+    try:
+        bounds = skip_period_bounds(skip_date, start_time, end_time)
+    except ValueError:
+        return 0.0
+    others = SkipIntervalSet.from_skip_periods(neighbours, cycle)
+    combined = SkipIntervalSet(others.intervals + [bounds])
+    start, end = _window(cycle)
+    return combined.skipped_minutes(start, end) - others.skipped_minutes(start, end)
+
+
+def apply_period_change(
+    db: Session,
+    cycle: models.CycleRecords,
+    period_id: Optional[int],
+    before: Optional[PeriodSnapshot] = None,
+    after: Optional[PeriodSnapshot] = None
+) -> float:
+    """将单个跳过时间段的变化增量应用到周期记账上
+
+    Args:
+        db: 数据库会话
+        cycle: 跳过时间段所属周期
+        period_id: 发生变化的跳过时间段ID（查询相邻记录时排除自身）
+        before: 修改前的快照，新增时为 None
+        after: 修改后的快照，删除时为 None
+
+    Returns:
+        float: 跳过分钟数的变化量
+    """
+    if cycle.skipped_minutes is None:
+        # 尚未建立记账数据，直接整体重建
+        rebuild_cycle(db, cycle)
+        return 0.0
+
+    neighbours_cache: Dict[date, List[models.SkipPeriod]] = {}
+
+    def neighbours(period: Optional[PeriodSnapshot]) -> List[models.SkipPeriod]:
+        if period is None:
+            return []
+        if period[0] not in neighbours_cache:
+            neighbours_cache[period[0]] = _neighbour_periods(db, cycle.id, period[0], period_id)
+        return neighbours_cache[period[0]]
+
+    delta = _marginal_minutes(cycle, after, neighbours(after)) - _marginal_minutes(cycle, before, neighbours(before))
+    cycle.skipped_minutes = max(0.0, cycle.skipped_minutes + delta)
+
+    # 跨午夜的时间段会影响次日，重算修改前后涉及的日期的台账行
+    affected_days = set()
+    for period in (before, after):
+        if period is not None:
+            affected_days.update((period[0], period[0] + timedelta(days=1)))
+    day_ledger.update_days(db, cycle, affected_days, period_id, after)
+
+    # 删除时保留原有上限即可，它只需要不早于实际的最晚跳过时间
+    if after is not None:
+        try:
+            _, period_end = skip_period_bounds(*after)
+            period_end_time = from_minutes(period_end)
+            if cycle.skip_horizon is None or period_end_time > cycle.skip_horizon:
+                cycle.skip_horizon = period_end_time
+        except ValueError:
+            pass
+
+    logger.debug(f"周期ID {cycle.id} 跳过分钟数变化: {delta:.2f}, 当前: {cycle.skipped_minutes:.2f}")
+    return delta
+
+
+def _expected_state(cycle: models.CycleRecords, skip_periods: List[models.SkipPeriod]) -> Tuple[float, Optional[datetime]]:
+    """完整重算周期的 (跳过分钟数, 最晚跳过结束时间)"""
+    intervals = SkipIntervalSet.from_skip_periods(skip_periods, cycle)
+    start, end = _window(cycle)
+    horizon = from_minutes(intervals.intervals[-1][1]) if len(intervals) else None
+    return intervals.skipped_minutes(start, end), horizon
+
+
+def rebuild_cycle(db: Session, cycle: models.CycleRecords) -> None:
+    """根据所有跳过时间段重建周期的记账数据，用于周期时间窗口发生变化时"""
+    skip_periods = db.query(models.SkipPeriod)\
+        .filter(models.SkipPeriod.cycle_id == cycle.id)\
+        .all()
+    cycle.skipped_minutes, cycle.skip_horizon = _expected_state(cycle, skip_periods)
+    day_ledger.rebuild(db, cycle, skip_periods)
+    logger.debug(f"重建周期ID {cycle.id} 的跳过记账: {cycle.skipped_minutes:.2f} 分钟")
+
+
+@metrics.CALC_DURATION.time("current_counters")
+def current_counters(db: Session, cycle: models.CycleRecords, end_time: Optional[datetime] = None) -> Tuple[int, float]:
+    """根据记账数据计算周期的 (有效天数, 有效小时数)，不修改任何数据
+
+    截止时间之后没有跳过时间段时为 O(1)，否则只需查询截止日期附近的时间段。
+    """
+    if not cycle or not cycle.start_date:
+        return 0, 0.0
+    if end_time is None:
+        end_time = cycle.end_date if cycle.end_date else datetime.now()
+
+    start = to_minutes(cycle.start_date)
+    end = to_minutes(end_time)
+    if end < start:
+        return 0, 0.0
+
+    trace = calc_trace.current()
+    _, window_end = _window(cycle)
+    if cycle.skipped_minutes is None or (window_end is not None and end > window_end):
+        # 没有记账数据或超出记账窗口，回退到完整计算
+        skip_periods = db.query(models.SkipPeriod)\
+            .filter(models.SkipPeriod.cycle_id == cycle.id)\
+            .all()
+        skipped = SkipIntervalSet.from_skip_periods(skip_periods, cycle).skipped_minutes(start, end)
+        mode = "full"
+    else:
+        skipped = cycle.skipped_minutes
+        mode = "ledger"
+        if cycle.skip_horizon is not None and to_minutes(cycle.skip_horizon) > end:
+            # 截止时间之后仍有跳过时间，扣除截止时间之后的部分
+            # 日期早于截止日期前一天的时间段不可能延伸到截止时间之后
+            tail_periods = db.query(models.SkipPeriod)\
+                .filter(models.SkipPeriod.cycle_id == cycle.id)\
+                .filter(models.SkipPeriod.date >= _day_start(end_time.date() - timedelta(days=1)))\
+                .all()
+            skipped -= SkipIntervalSet.from_skip_periods(tail_periods, cycle).skipped_minutes(end, window_end)
+            mode = "ledger_with_tail"
+
+    valid_days, valid_hours = valid_counters((end - start - skipped) / 60)
+    if trace is not None:
+        trace.event(
+            "current_counters",
+            cycle_id=cycle.id,
+            mode=mode,
+            end_time=end_time,
+            skipped_minutes=round(skipped, 2),
+            valid_hours=round(valid_hours, 4),
+            valid_days=valid_days,
+        )
+    return valid_days, valid_hours
+
+
+def store_counters(cycle: models.CycleRecords, valid_hours: float) -> bool:
+    """将有效时间写入周期记录
+
+    有效时间以整数分钟（valid_minutes）保存，有效小时数和有效天数都由它换算，
+    不会因浮点数累加而产生偏差。
+
+    Returns:
+        bool: 记录是否发生变化
+    """
+    valid_minutes, valid_days, valid_hours = minute_counters(valid_hours)
+    if cycle.valid_minutes == valid_minutes and cycle.valid_days_count == valid_days \
+            and cycle.valid_hours_count == valid_hours:
+        return False
+    cycle.valid_minutes = valid_minutes
+    cycle.valid_days_count = valid_days
+    cycle.valid_hours_count = valid_hours
+    return True
+
+
+def refresh_cycle_counters(db: Session, cycle: models.CycleRecords, end_time: Optional[datetime] = None) -> Tuple[int, float]:
+    """根据记账数据更新周期的有效天数和有效小时数"""
+    store_counters(cycle, current_counters(db, cycle, end_time)[1])
+    return cycle.valid_days_count, cycle.valid_hours_count
+
+
+def verify_skip_accounting(db: Session, fix: bool = True) -> List[Dict]:
+    """将所有周期的增量记账结果与完整重算对账
+
+    SQLite 上由 skip_sql 用一条聚合语句完成全部周期的重算，不加载跳过时间段；
+    其他数据库加载全部跳过时间段后用区间引擎重算。
+
+    Args:
+        db: 数据库会话
+        fix: 是否修正发现的偏差
+
+    Returns:
+        List[Dict]: 存在偏差的周期列表
+    """
+    sql_totals = None
+    periods_by_cycle: Dict[int, List[models.SkipPeriod]] = {}
+    if skip_sql.supported(db):
+        sql_totals = skip_sql.skip_totals(db)
+    else:
+        for period in db.query(models.SkipPeriod).all():
+            periods_by_cycle.setdefault(period.cycle_id, []).append(period)
+
+    ledger_totals = day_ledger.skipped_totals(db)
+
+    drifts = []
+    changed = False
+    for cycle in db.query(models.CycleRecords).all():
+        if sql_totals is not None:
+            cycle_periods = None
+            expected_minutes, expected_horizon = sql_totals.get(cycle.id, (0.0, None))
+        else:
+            cycle_periods = periods_by_cycle.get(cycle.id, [])
+            expected_minutes, expected_horizon = _expected_state(cycle, cycle_periods)
+        stored_minutes = cycle.skipped_minutes
+
+        horizon_unsafe = expected_horizon is not None and (
+            cycle.skip_horizon is None or cycle.skip_horizon < expected_horizon
+        )
+        minutes_drifted = stored_minutes is None or abs(stored_minutes - expected_minutes) > DRIFT_TOLERANCE_MINUTES
+
+        if minutes_drifted or horizon_unsafe:
+            drifts.append({
+                "cycle_id": cycle.id,
+                "cycle_number": cycle.cycle_number,
+                "stored_minutes": stored_minutes,
+                "expected_minutes": expected_minutes,
+            })
+            logger.warning(f"周期ID {cycle.id} 跳过记账存在偏差: 记录值 {stored_minutes}, 重算值 {expected_minutes:.2f}")
+
+        if fix and (minutes_drifted or cycle.skip_horizon != expected_horizon):
+            cycle.skipped_minutes = expected_minutes
+            cycle.skip_horizon = expected_horizon
+            changed = True
+
+        # 逐日台账的跳过分钟数之和应与记账一致，缺失或不一致时重建
+        ledger_minutes = ledger_totals.get(cycle.id)
+        if ledger_minutes is None or abs(ledger_minutes - expected_minutes) > LEDGER_TOLERANCE_MINUTES:
+            if ledger_minutes is not None:
+                logger.warning(f"周期ID {cycle.id} 逐日台账存在偏差: 合计 {ledger_minutes:.2f}, 重算值 {expected_minutes:.2f}")
+            if fix:
+                day_ledger.rebuild(db, cycle, cycle_periods)
+                changed = True
+
+    if changed:
+        data_version.bump(db, invalidate=grid_cache.NONE)
+        db.commit()
+    logger.info(f"跳过记账对账完成，发现 {len(drifts)} 个周期存在偏差")
+    return drifts
+
+
+def refresh_open_cycles(db: Session) -> int:
+    """将未完成周期的实时有效天数和小时数写回数据库
+
+    读取接口不再写数据库，列表接口中未完成周期的计数由此后台任务定期刷新。
+
+    Returns:
+        int: 计数发生变化的周期数量
+    """
+    changed = 0
+    open_cycles = db.query(models.CycleRecords)\
+        .filter(models.CycleRecords.is_completed == False)\
+        .all()
+    for cycle in open_cycles:
+        if store_counters(cycle, current_counters(db, cycle)[1]):
+            changed += 1
+    # 进入新的一天时为未完成周期补齐台账行，补齐的行与读取时推算的结果相同，不改变版本号
+    extended = day_ledger.extend_open_cycles(db)
+    if changed:
+        data_version.bump(db, invalidate=grid_cache.NONE)
+    if changed or extended:
+        db.commit()
+    return changed
+
+
+def run_with_session(job: Callable[[Session], object]) -> object:
+    """使用独立的数据库会话执行后台任务"""
+    db = SessionLocal()
+    try:
+        return job(db)
+    finally:
+        db.close()
+
+
+async def run_periodic(interval_seconds: float, job: Callable[[Session], object]) -> None:
+    """后台定期任务，在线程中执行以免阻塞事件循环"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(run_with_session, job)
+        except Exception as e:
+            logger.error(f"后台任务 {job.__name__} 执行失败: {e}", exc_info=True)
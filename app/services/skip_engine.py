@@ -0,0 +1,260 @@
+"""跳过时间段区间引擎
+
+将一个周期的跳过时间段整理为有序、合并后的区间集合，并维护累计前缀和，
+从而可以在 O(log n) 时间内回答“A 到 B 之间跳过/有效了多少时间”。
+重叠或跨午夜的时间段在合并后只会被计算一次。
+
+内部统一使用“自 1970-01-01 起的分钟数”作为时间坐标。
+"""
+import logging
+import math
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# 获取日志记录器
+logger = logging.getLogger("api.skip_engine")
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DATE = _EPOCH.date()
+MINUTES_PER_DAY = 24 * 60
+
+# 一个周期的有效天数上限
+CYCLE_DAYS = 26
+
+
+@lru_cache(maxsize=2048)
+def parse_hhmm(value: str) -> Tuple[int, int]:
+    """解析HH:MM格式的时间字符串，结果会被缓存"""
+    hour, minute = map(int, value.split(':'))
+    return hour, minute
+
+
+def hhmm_minutes(value) -> Optional[int]:
+    """将HH:MM转换为当天的分钟数，格式无效时返回 None
+
+    注册为SQLite函数 hhmm_minutes，SQL中的解析规则与 parse_hhmm 完全一致。
+    """
+    try:
+        hour, minute = parse_hhmm(value)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return hour * 60 + minute
+
+
+def from_minutes(value: float) -> datetime:
+    """将分钟坐标转换回datetime"""
+    return _EPOCH + timedelta(minutes=value)
+
+
+def to_minutes(dt: datetime) -> float:
+    """将datetime转换为分钟坐标（带时区的时间按其本地墙上时间处理）"""
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None)
+    return (dt - _EPOCH).total_seconds() / 60
+
+
+def skip_period_bounds(skip_date: date, start_time: str, end_time: str) -> Tuple[float, float]:
+    """计算跳过时间段的 [开始, 结束) 分钟坐标
+
+    结束时间早于开始时间时视为跨天，结束时间顺延到次日。
+    """
+    start_hour, start_minute = parse_hhmm(start_time)
+    end_hour, end_minute = parse_hhmm(end_time)
+    day_offset = (skip_date - _EPOCH_DATE).days * MINUTES_PER_DAY
+    start = day_offset + start_hour * 60 + start_minute
+    end = day_offset + end_hour * 60 + end_minute
+    if end < start:
+        end += MINUTES_PER_DAY
+    return start, end
+
+
+def period_minutes(skip_date, start_time, end_time) -> Tuple[Optional[date], Optional[int], Optional[int]]:
+    """将跳过时间段换算为整数分钟存储格式: (日期, 当天开始分钟数, 持续分钟数)
+
+    结束时间早于开始时间时顺延到次日，与 skip_period_bounds 的规则一致；时间格式无效时对应字段为 None。
+    """
+    if isinstance(skip_date, datetime):
+        skip_date = skip_date.date()
+    start = hhmm_minutes(start_time)
+    end = hhmm_minutes(end_time)
+    if start is None or end is None:
+        return skip_date, start, None
+    if end < start:
+        end += MINUTES_PER_DAY
+    return skip_date, start, end - start
+
+
+def stored_period_bounds(period) -> Optional[Tuple[int, int]]:
+    """根据整数分钟字段计算跳过时间段的 [开始, 结束) 分钟坐标，字段缺失时返回 None"""
+    day = getattr(period, "day", None)
+    start = getattr(period, "start_minute_of_day", None)
+    duration = getattr(period, "duration_minutes", None)
+    if day is None or start is None or duration is None:
+        return None
+    start += (day - _EPOCH_DATE).days * MINUTES_PER_DAY
+    return start, start + duration
+
+
+def period_bounds(period) -> Optional[Tuple[float, float]]:
+    """跳过时间段的 [开始, 结束) 分钟坐标，优先使用整数分钟字段，时间格式无效时返回 None"""
+    bounds = stored_period_bounds(period)
+    if bounds is not None:
+        return bounds
+    try:
+        return skip_period_bounds(period.date.date(), period.start_time, period.end_time)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def valid_counters(valid_hours: float) -> Tuple[int, float]:
+    """根据有效小时数计算 (有效天数, 有效小时数)，结果不超过26天"""
+    valid_hours = max(0.0, valid_hours)
+    max_hours = CYCLE_DAYS * 24
+    if valid_hours > max_hours:
+        valid_hours = max_hours
+    valid_days = math.ceil(valid_hours / 24) if valid_hours > 0 else 0  # 向上取整
+    return min(valid_days, CYCLE_DAYS), valid_hours
+
+
+def minute_counters(valid_hours: float) -> Tuple[int, int, float]:
+    """将有效小时数取整到分钟后换算为 (有效分钟数, 有效天数, 有效小时数)，与周期记录中保存的格式一致"""
+    valid_minutes = int(round(valid_hours * 60))
+    valid_days, valid_hours = valid_counters(valid_minutes / 60)
+    return valid_minutes, valid_days, valid_hours
+
+
+def is_period_in_cycle(skip_date: date, cycle) -> bool:
+    """判断跳过日期是否落在周期的日期范围内
+
+    跳过日期早于周期开始日期的时间段被忽略；已完成周期中晚于结束日期的时间段也被忽略。
+    """
+    if skip_date < cycle.start_date.date():
+        return False
+    if getattr(cycle, 'is_completed', False) and getattr(cycle, 'end_date', None):
+        if skip_date > cycle.end_date.date():
+            return False
+    return True
+
+
+class SkipIntervalSet:
+    """有序且已合并的跳过区间集合
+
+    构建代价为 O(n log n)，之后任意时间窗口的跳过时长查询为 O(log n)。
+    """
+
+    __slots__ = ("_starts", "_ends", "_prefix")
+
+    def __init__(self, intervals: Iterable[Tuple[float, float]]):
+        merged: List[List[float]] = []
+        for start, end in sorted(intervals):
+            if end <= start:
+                continue
+            if merged and start <= merged[-1][1]:
+                # 与上一个区间重叠或相接，合并
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+
+        self._starts: List[float] = [interval[0] for interval in merged]
+        self._ends: List[float] = [interval[1] for interval in merged]
+
+        # _prefix[i] 为前 i 个区间的总时长
+        prefix = [0.0]
+        for start, end in merged:
+            prefix.append(prefix[-1] + (end - start))
+        self._prefix: List[float] = prefix
+
+    @classmethod
+    def from_skip_periods(cls, skip_periods: Sequence, cycle=None) -> "SkipIntervalSet":
+        """从SkipPeriod记录构建区间集合
+
+        如果提供了周期，则只保留日期在周期范围内的跳过时间段。
+        """
+        intervals = []
+        for period in skip_periods:
+            # 优先使用数据库生成的整数分钟字段，不必解析字符串；字段为空（尚未写入数据库或不是HH:MM格式）时按原始字段计算
+            bounds = stored_period_bounds(period)
+            skip_date = getattr(period, "day", None) or period.date.date()
+            if cycle is not None and not is_period_in_cycle(skip_date, cycle):
+                continue
+            if bounds is not None:
+                intervals.append(bounds)
+                continue
+            try:
+                intervals.append(skip_period_bounds(skip_date, period.start_time, period.end_time))
+            except ValueError as e:
+                # 时间格式错误的记录不参与计算，避免影响整个周期
+                logger.warning(f"跳过时间段时间格式无效，已忽略: {period.start_time}-{period.end_time}, 错误: {e}")
+        return cls(intervals)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    @property
+    def intervals(self) -> List[Tuple[float, float]]:
+        """合并后的区间列表（分钟坐标）"""
+        return list(zip(self._starts, self._ends))
+
+    @property
+    def total_minutes(self) -> float:
+        """所有区间的总时长（分钟）"""
+        return self._prefix[-1]
+
+    def covered_before(self, point: float) -> float:
+        """返回坐标 point 之前被跳过的总分钟数"""
+        index = bisect_right(self._starts, point) - 1
+        if index < 0:
+            return 0.0
+        return self._prefix[index] + (min(point, self._ends[index]) - self._starts[index])
+
+    def skipped_minutes(self, start: float, end: Optional[float] = None) -> float:
+        """返回 [start, end) 窗口内被跳过的分钟数，end 为 None 时表示不设上限"""
+        if end is None:
+            return self.total_minutes - self.covered_before(start)
+        if end <= start:
+            return 0.0
+        return self.covered_before(end) - self.covered_before(start)
+
+    def advance(self, start: float, valid_minutes: float) -> float:
+        """返回从 start 起累计 valid_minutes 分钟有效时间的最早坐标（有效时间的反向查询）
+
+        从 start 到某个区间开始坐标之间的有效时间随区间序号单调递增，二分查找第一个
+        有效时间达到目标的区间，答案位于它与前一个区间之间的空隙中，复杂度 O(log n)。
+        valid_minutes 不大于0时返回 start（即使 start 位于跳过区间内）。
+        """
+        if valid_minutes <= 0:
+            return start
+        skipped_before_start = self.covered_before(start)
+
+        def valid_until_start_of(index: int) -> float:
+            return (self._starts[index] - start) - (self._prefix[index] - skipped_before_start)
+
+        low, high = bisect_right(self._starts, start), len(self._starts)
+        while low < high:
+            middle = (low + high) // 2
+            if valid_until_start_of(middle) >= valid_minutes:
+                high = middle
+            else:
+                low = middle + 1
+
+        # 前一个区间结束处（或 start）之后直到区间 low 开始之前都是有效时间
+        base = start
+        if low > 0 and self._ends[low - 1] > start:
+            base = self._ends[low - 1]
+        valid_at_base = (base - start) - (self.covered_before(base) - skipped_before_start)
+        return base + (valid_minutes - valid_at_base)
+
+    def skipped_hours_between(self, start: datetime, end: datetime) -> float:
+        """返回两个时间点之间被跳过的小时数"""
+        return self.skipped_minutes(to_minutes(start), to_minutes(end)) / 60
+
+    def valid_hours_between(self, start: datetime, end: datetime) -> float:
+        """返回两个时间点之间的有效（未被跳过的）小时数"""
+        start_minutes, end_minutes = to_minutes(start), to_minutes(end)
+        if end_minutes <= start_minutes:
+            return 0.0
+        total = end_minutes - start_minutes
+        return max(0.0, total - self.skipped_minutes(start_minutes, end_minutes)) / 60
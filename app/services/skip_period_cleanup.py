@@ -0,0 +1,160 @@
+"""清理超出周期日期范围的跳过时间段
+
+与 is_period_in_cycle 的规则一致，以下跳过时间段不参与任何计算，视为无效：
+1. 跳过日期在周期开始日期之前
+2. 跳过日期在已完成周期的结束日期之后
+
+查找和删除都是一条与周期表关联的SQL语句，不逐条查询所属周期。
+删除后只重建受影响周期的跳过记账、逐日台账和有效计数。
+
+同一周期同一天的重复跳过时间段会使唯一索引 uq_skip_periods_cycle_day 无法创建（迁移失败），
+find_duplicates/delete_duplicates 只用SQL读写 skip_periods 表，数据库未升级到最新版本时也可以执行。
+"""
+import logging
+from itertools import groupby
+from typing import Dict, Iterable, List
+
+from sqlalchemy import and_, bindparam, case, delete, func, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.services import data_version, skip_accounting
+
+# 获取日志记录器
+logger = logging.getLogger("api.skip_period_cleanup")
+
+BEFORE_START = "跳过日期在周期开始之前"
+AFTER_END = "跳过日期在周期结束之后"
+
+# 跳过日期（day 由数据库生成，迁移过程中可能为空，此时取 date 列的日期部分）
+_period_day = func.coalesce(models.SkipPeriod.day, func.date(models.SkipPeriod.date))
+_before_start = _period_day < func.date(models.CycleRecords.start_date)
+_after_end = and_(
+    models.CycleRecords.is_completed == True,
+    models.CycleRecords.end_date.isnot(None),
+    _period_day > func.date(models.CycleRecords.end_date),
+)
+
+
+def _out_of_range():
+    """超出周期日期范围的跳过时间段（与周期表关联）"""
+    return select(
+        models.SkipPeriod.id,
+        models.SkipPeriod.cycle_id,
+        _period_day.label("day"),
+        models.CycleRecords.cycle_number,
+        func.date(models.CycleRecords.start_date).label("cycle_start"),
+        func.date(models.CycleRecords.end_date).label("cycle_end"),
+        case((_before_start, BEFORE_START), else_=AFTER_END).label("reason"),
+    )\
+        .join(models.CycleRecords, models.CycleRecords.id == models.SkipPeriod.cycle_id)\
+        .where(or_(_before_start, _after_end))
+
+
+def find_out_of_range(db: Session) -> List[Dict]:
+    """列出超出周期日期范围的跳过时间段，不修改数据"""
+    rows = db.execute(_out_of_range().order_by(models.SkipPeriod.cycle_id, _period_day))
+    return [
+        {
+            "period_id": row.id,
+            "period_date": row.day,
+            "cycle_id": row.cycle_id,
+            "cycle_number": row.cycle_number,
+            "cycle_start": row.cycle_start,
+            "cycle_end": row.cycle_end,
+            "reason": row.reason,
+        }
+        for row in rows
+    ]
+
+
+def delete_out_of_range(db: Session) -> Dict:
+    """删除超出周期日期范围的跳过时间段，并重算受影响的周期
+
+    Returns:
+        dict: 删除的跳过时间段ID和受影响的周期ID
+    """
+    statement = delete(models.SkipPeriod)\
+        .where(models.SkipPeriod.id.in_(_out_of_range().with_only_columns(models.SkipPeriod.id)))
+    if db.get_bind().dialect.delete_returning:
+        deleted = db.execute(statement.returning(models.SkipPeriod.id, models.SkipPeriod.cycle_id)).all()
+    else:
+        deleted = db.execute(_out_of_range().with_only_columns(models.SkipPeriod.id, models.SkipPeriod.cycle_id)).all()
+        if deleted:
+            db.execute(delete(models.SkipPeriod).where(models.SkipPeriod.id.in_([row[0] for row in deleted])))
+
+    cycle_ids = sorted({cycle_id for _, cycle_id in deleted})
+    rebuild_cycles(db, cycle_ids)
+
+    logger.info(f"已删除 {len(deleted)} 个超出周期日期范围的跳过时间段，重算了 {len(cycle_ids)} 个周期")
+    return {
+        "deleted_period_ids": sorted(period_id for period_id, _ in deleted),
+        "cycle_ids": cycle_ids,
+    }
+
+
+def rebuild_cycles(db: Session, cycle_ids: Iterable[int]) -> None:
+    """删除跳过时间段之后重建周期的跳过记账、逐日台账和有效计数，并提交"""
+    cycle_ids = list(cycle_ids)
+    if cycle_ids:
+        # 批量删除不会同步会话中已加载的对象，重算前从数据库重新读取
+        db.expire_all()
+        affected = db.query(models.CycleRecords)\
+            .filter(models.CycleRecords.id.in_(cycle_ids))\
+            .all()
+        for cycle in affected:
+            skip_accounting.rebuild_cycle(db, cycle)
+            skip_accounting.refresh_cycle_counters(db, cycle)
+        data_version.bump(db)
+    db.commit()
+
+
+# 每组按最近修改排序，第一条保留（updated_at 为空的排在最后，相同时取ID最大的一条）
+_DUPLICATES_SQL = text(
+    "SELECT id, cycle_id, date(date) AS day, start_time, end_time FROM skip_periods "
+    "WHERE cycle_id IS NOT NULL AND (cycle_id, date(date)) IN ("
+    "SELECT cycle_id, date(date) FROM skip_periods WHERE cycle_id IS NOT NULL "
+    "GROUP BY cycle_id, date(date) HAVING COUNT(*) > 1) "
+    "ORDER BY cycle_id, day, updated_at DESC, id DESC"
+)
+
+
+def find_duplicates(bind: Engine) -> List[Dict]:
+    """列出同一周期同一天的重复跳过时间段，每组保留最近修改的一条，不修改数据"""
+    with bind.connect() as connection:
+        rows = connection.execute(_DUPLICATES_SQL).fetchall()
+    groups = []
+    for (cycle_id, day), members in groupby(rows, key=lambda row: (row.cycle_id, row.day)):
+        kept, *duplicates = members
+        groups.append({
+            "cycle_id": cycle_id,
+            "period_date": day,
+            "kept_period_id": kept.id,
+            "kept_time": f"{kept.start_time}-{kept.end_time}",
+            "duplicate_period_ids": sorted(row.id for row in duplicates),
+        })
+    return groups
+
+
+def delete_duplicates(bind: Engine) -> Dict:
+    """删除同一周期同一天的重复跳过时间段，每组只保留最近修改的一条
+
+    不重算周期（数据库可能还未升级到最新版本），删除并完成迁移后需要对返回的周期调用 rebuild_cycles。
+
+    Returns:
+        dict: 删除的跳过时间段ID和受影响的周期ID
+    """
+    groups = find_duplicates(bind)
+    period_ids = sorted(period_id for group in groups for period_id in group["duplicate_period_ids"])
+    if period_ids:
+        with bind.begin() as connection:
+            connection.execute(
+                text("DELETE FROM skip_periods WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": period_ids},
+            )
+        logger.info(f"已删除 {len(period_ids)} 个重复的跳过时间段（{len(groups)} 组）")
+    return {
+        "deleted_period_ids": period_ids,
+        "cycle_ids": sorted({group["cycle_id"] for group in groups}),
+    }
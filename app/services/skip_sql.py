@@ -0,0 +1,145 @@
+"""在SQLite中计算跳过时间
+
+与 skip_engine 的结果一致，但不把跳过时间段加载为ORM对象：
+一条聚合SQL语句即可得到所有（或指定）周期在其窗口内的跳过分钟数和最晚跳过结束时间。
+
+计算方法：
+1. 每个跳过时间段由整数分钟字段（day、start_minute_of_day、duration_minutes）换算为分钟坐标区间，
+   按 is_period_in_cycle 的规则过滤。整数字段为空（不是严格的HH:MM格式）的记录用注册的 hhmm_minutes 函数解析，
+   结束时间早于开始时间时顺延到次日。
+   周期的开始/结束时间带有微秒，julianday 只精确到毫秒，因此单独加上秒的小数部分
+2. 区间裁剪到周期窗口 [开始时间, 结束时间)，未结束的周期不设上限
+3. 按开始坐标排序，用窗口函数求之前所有区间的最大结束坐标，
+   每个区间只计算超出该坐标的部分，求和即为合并后的总时长（重叠部分只计算一次）
+
+需要 SQLite 3.35 及以上版本（窗口函数和 MATERIALIZED 公用表表达式）。
+换算后的时间段先物化一次，避免 SQLite 在展开公用表表达式时对每次引用重复计算。
+"""
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from app.services.skip_engine import from_minutes
+
+# 获取日志记录器
+logger = logging.getLogger("api.skip_sql")
+
+
+def _minutes(column: str) -> str:
+    """SQL表达式：将 'YYYY-MM-DD HH:MM:SS.ffffff' 格式的时间转换为 skip_engine 的分钟坐标"""
+    return f"((CAST(strftime('%s', {column}) AS REAL) + COALESCE(CAST(substr({column}, 20) AS REAL), 0)) / 60)"
+
+
+_SKIP_TOTALS_SQL = f"""
+WITH cycles AS MATERIALIZED (
+    SELECT
+        id,
+        date(start_date) AS first_day,
+        CASE WHEN is_completed AND end_date IS NOT NULL THEN date(end_date) END AS last_day,
+        {_minutes("start_date")} AS window_start,
+        CASE WHEN end_date IS NOT NULL THEN {_minutes("end_date")} END AS window_end
+    FROM cycle_records
+    WHERE 1 = 1 {{cycle_filter}}
+),
+parsed AS MATERIALIZED (
+    SELECT
+        cycle_id,
+        day,
+        CAST(strftime('%s', day) AS INTEGER) / 60 AS day_minute,
+        start_of_day,
+        duration
+    FROM (
+        -- 整数分钟字段为空（不是严格的HH:MM格式）时才解析原始字段，COALESCE 不会对非空值调用解析函数
+        SELECT
+            cycle_id,
+            COALESCE(day, date(date)) AS day,
+            COALESCE(start_minute_of_day, hhmm_minutes(start_time)) AS start_of_day,
+            COALESCE(duration_minutes, CASE
+                WHEN hhmm_minutes(end_time) < hhmm_minutes(start_time)
+                THEN hhmm_minutes(end_time) + 1440 - hhmm_minutes(start_time)
+                ELSE hhmm_minutes(end_time) - hhmm_minutes(start_time)
+            END) AS duration
+        FROM skip_periods
+        WHERE cycle_id IN (SELECT id FROM cycles)
+    )
+),
+clipped AS (
+    SELECT
+        p.cycle_id AS cycle_id,
+        p.day_minute + p.start_of_day AS start_minute,
+        p.day_minute + p.start_of_day + p.duration AS end_minute,
+        c.window_start AS window_start,
+        c.window_end AS window_end
+    FROM parsed AS p
+    JOIN cycles AS c ON c.id = p.cycle_id
+    WHERE p.start_of_day IS NOT NULL
+      AND p.duration IS NOT NULL
+      AND p.day >= c.first_day
+      AND (c.last_day IS NULL OR p.day <= c.last_day)
+),
+ordered AS (
+    SELECT
+        cycle_id,
+        start_minute,
+        end_minute,
+        MAX(start_minute, window_start) AS clipped_start,
+        MIN(end_minute, COALESCE(window_end, end_minute)) AS clipped_end
+    FROM clipped
+),
+merged AS (
+    SELECT
+        cycle_id,
+        start_minute,
+        end_minute,
+        clipped_start,
+        clipped_end,
+        MAX(clipped_end) OVER (
+            PARTITION BY cycle_id ORDER BY clipped_start, clipped_end
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) AS covered_until
+    FROM ordered
+)
+SELECT
+    cycle_id,
+    -- 窗口外的区间裁剪后结束不晚于开始，贡献为0，也不会影响窗口内区间的 covered_until
+    SUM(MAX(0, clipped_end - MAX(clipped_start, COALESCE(covered_until, clipped_start)))) AS skipped_minutes,
+    MAX(CASE WHEN end_minute > start_minute THEN end_minute END) AS horizon_minute
+FROM merged
+GROUP BY cycle_id
+"""
+
+
+def supported(db: Session) -> bool:
+    """当前数据库是否支持在SQL中计算（SQLite 3.35+）"""
+    return db.get_bind().dialect.name == "sqlite" and sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def skip_totals(db: Session, cycle_ids: Optional[Iterable[int]] = None) -> Dict[int, Tuple[float, Optional[datetime]]]:
+    """用一条SQL语句计算周期窗口内的 (跳过分钟数, 最晚跳过结束时间)
+
+    Args:
+        db: 数据库会话
+        cycle_ids: 只计算这些周期，为 None 时计算所有周期
+
+    Returns:
+        dict: 周期ID -> (跳过分钟数, 最晚跳过结束时间)，没有有效跳过时间段的周期不在结果中
+    """
+    if cycle_ids is None:
+        statement = text(_SKIP_TOTALS_SQL.format(cycle_filter=""))
+        params = {}
+    else:
+        cycle_ids = list(cycle_ids)
+        if not cycle_ids:
+            return {}
+        statement = text(_SKIP_TOTALS_SQL.format(cycle_filter="AND id IN :cycle_ids"))\
+            .bindparams(bindparam("cycle_ids", expanding=True))
+        params = {"cycle_ids": cycle_ids}
+
+    return {
+        cycle_id: (skipped or 0.0, from_minutes(horizon) if horizon is not None else None)
+        for cycle_id, skipped, horizon in db.execute(statement, params)
+    }
@@ -34,18 +34,18 @@ fi
 # 添加新的cron任务 - 每分钟检查一次服务状态
 echo "*/1 * * * * cd ${ROOT_DIR} && ${SCRIPT_DIR}/monitor.sh >> ${ROOT_DIR}/logs/cron.log 2>&1" >> "$TEMP_CRON"
 
-# 检查是否已经有自动增加有效天数的任务
+# 移除旧的周期切换任务，未启用服务进程内的周期切换调度器时重新添加
 if grep -q "increment_day.sh" "$TEMP_CRON"; then
-  echo -e "${YELLOW}[WARNING]${NC} 自动增加有效天数任务已存在，将被更新"
-  # 移除旧的任务
   sed -i '/increment_day.sh/d' "$TEMP_CRON"
 fi
-
-# 确保increment_day.sh有执行权限
-chmod +x "${SCRIPT_DIR}/increment_day.sh"
-
-# 添加自动增加有效天数的定时任务 - 每天0点执行
-echo "0 0 * * * cd ${ROOT_DIR} && ${SCRIPT_DIR}/increment_day.sh >> ${ROOT_DIR}/logs/increment_day.log 2>&1" >> "$TEMP_CRON"
+if [ "${ENABLE_CYCLE_SCHEDULER:-0}" = "1" ]; then
+  echo -e "${GREEN}[INFO]${NC} 已启用周期切换调度器（ENABLE_CYCLE_SCHEDULER=1），不添加每日周期切换任务"
+else
+  # 确保increment_day.sh有执行权限
+  chmod +x "${SCRIPT_DIR}/increment_day.sh"
+  # 每天0点完成已到完成时刻的周期
+  echo "0 0 * * * cd ${ROOT_DIR} && ${SCRIPT_DIR}/increment_day.sh >> ${ROOT_DIR}/logs/increment_day.log 2>&1" >> "$TEMP_CRON"
+fi
 
 # 安装新的crontab
 crontab "$TEMP_CRON"
@@ -56,5 +56,4 @@ echo -e "${GREEN}[INFO]${NC} 您可以通过以下命令查看当前的cron任
 echo -e "  crontab -l"
 echo -e "${GREEN}[INFO]${NC} 您可以通过以下命令查看监控日志："
 echo -e "  tail -f ${ROOT_DIR}/logs/monitor.log"
-echo -e "  tail -f ${ROOT_DIR}/logs/cron.log"
-echo -e "  tail -f ${ROOT_DIR}/logs/increment_day.log"
\ No newline at end of file
+echo -e "  tail -f ${ROOT_DIR}/logs/cron.log"
\ No newline at end of file
@@ -4,8 +4,8 @@
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 ROOT_DIR="$(dirname "$SCRIPT_DIR")"
 
-# 调用increment-valid-day接口
-curl -X POST http://localhost:8000/calendar/increment-day
+# 完成已累计满26天有效时间的周期（未启用 ENABLE_CYCLE_SCHEDULER 时由cron每天调用）
+curl -X POST http://localhost:8000/api/calendar/increment-day
 
 # 记录日志
-echo "[$(date '+%Y-%m-%d %H:%M:%S')] 已调用increment-valid-day接口" >> "${ROOT_DIR}/logs/increment_day.log"
\ No newline at end of file
+echo "[$(date '+%Y-%m-%d %H:%M:%S')] 已调用increment-day接口" >> "${ROOT_DIR}/logs/increment_day.log"
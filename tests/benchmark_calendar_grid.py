@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+日历网格构建性能对比
+
+在一个包含大量跳过时间段的周期上，对比旧的逐日扫描实现（每天遍历全部跳过时间段）
+与按日期索引的实现，分别测试月视图和年视图。
+
+用法: python tests/benchmark_calendar_grid.py [跳过时间段数量]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import models, schemas
+from app.services import calendar_service, skip_accounting
+
+
+def legacy_calendar_days(cycle, skip_periods, start_date, end_date):
+    """旧实现：每天遍历全部跳过时间段，并为每天完整校验一个CalendarDay对象"""
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        cycle_start_date = cycle.start_date.date()
+        is_valid = cycle_start_date <= current_date.date() <= datetime.now().date()
+        calendar_day = schemas.CalendarDay(
+            date=current_date,
+            is_skipped=False,
+            is_valid_day=is_valid,
+            is_valid=is_valid
+        )
+        for skip_period in skip_periods:
+            if current_date.date() == skip_period.date.date():
+                calendar_day.is_skipped = True
+                calendar_day.is_valid_day = False
+                calendar_day.is_valid = False
+                calendar_day.skip_period = {
+                    "date": skip_period.date.strftime("%Y-%m-%d"),
+                    "start_time": skip_period.start_time,
+                    "end_time": skip_period.end_time
+                }
+                calendar_day.skip_period_id = skip_period.id
+                break
+        days.append(calendar_day)
+        current_date += timedelta(days=1)
+    return days
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(period_count=10000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+
+        cycle_start = datetime.now() - timedelta(days=period_count + 30)
+        settings = models.CalendarSettings(start_date=cycle_start, skip_hours=12)
+        cycle = models.CycleRecords(cycle_number=1, start_date=cycle_start, is_completed=False)
+        db.add_all([settings, cycle])
+        db.flush()
+        db.bulk_save_objects([
+            models.SkipPeriod(
+                cycle_id=cycle.id,
+                date=datetime(cycle_start.year, cycle_start.month, cycle_start.day, 12) + timedelta(days=offset + 1),
+                start_time="22:00",
+                end_time="06:00"
+            )
+            for offset in range(period_count)
+        ])
+        db.flush()
+        skip_accounting.rebuild_cycle(db, cycle)
+        db.commit()
+
+        all_periods = db.query(models.SkipPeriod).all()
+        view_end = datetime.now()
+        print(f"跳过时间段数量: {period_count}")
+        for label, days in (("月视图", 31), ("年视图", 366)):
+            view_start = view_end - timedelta(days=days - 1)
+            view_start = datetime(view_start.year, view_start.month, view_start.day)
+            legacy = timed(lambda: legacy_calendar_days(cycle, all_periods, view_start, view_end))
+            indexed = timed(lambda: calendar_service.calculate_calendar_data(db, settings, view_start, view_end, cycle))
+            print(f"{label}: 旧实现 {legacy * 1000:.1f} ms, 索引实现 {indexed * 1000:.1f} ms, 加速 {legacy / indexed:.1f}x")
+
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
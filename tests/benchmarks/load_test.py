@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+HTTP负载测试
+
+用多个并发虚拟用户向本地实例重放接近真实使用情况的请求组合：
+- calendar: 在日历上切换月份（/api/calendar/data，带上次返回的ETag）
+- edit:     在当前周期中新增/修改跳过时间段，每隔一次删除刚编辑的记录
+- history:  浏览周期历史（/api/cycles/ 首页，部分请求继续翻下一页）
+
+默认在临时端口启动一个 uvicorn 实例，数据库为临时文件并预先生成合成数据；
+也可以用 --url 指向已经运行的实例（edit 操作会写入该实例的数据库）。
+只使用标准库，测试结束后输出吞吐量、各操作的 p50/p95/p99 延迟和错误率。
+
+用法:
+    python tests/benchmarks/load_test.py                                   # 默认: 10并发, 30秒, 1k规模数据
+    python tests/benchmarks/load_test.py --concurrency 50 --duration 60 --workers 2
+    python tests/benchmarks/load_test.py --mix calendar=60,edit=10,history=30 --json result.json
+    python tests/benchmarks/load_test.py --url http://127.0.0.1:8000
+
+压测端与服务端运行在同一台机器上，结果反映的是整机容量；并发较高时压测端自身的
+CPU占用会影响结果，可以适当增加 uvicorn worker 数后对比。
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+# 添加项目根目录到Python路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_MIX = "calendar=70,edit=10,history=20"
+# 统计延迟分位数时每个操作最多保留的样本数
+MAX_SAMPLES = 200_000
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法分位数"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values), math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+class Stats:
+    """按操作汇总请求数、错误数和延迟样本，由所有虚拟用户线程共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = []
+
+    def record(self, action, elapsed, error=None):
+        with self._lock:
+            samples = self.latencies.setdefault(action, [])
+            if len(samples) < MAX_SAMPLES:
+                samples.append(elapsed)
+            if error is not None:
+                self.errors[action] = self.errors.get(action, 0) + 1
+                if len(self.error_samples) < 20:
+                    self.error_samples.append(f"{action}: {error}")
+
+    def summary(self, elapsed_seconds):
+        actions = {}
+        total_requests = 0
+        total_errors = 0
+        for action, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            errors = self.errors.get(action, 0)
+            total_requests += len(samples)
+            total_errors += errors
+            actions[action] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+                "rps": round(len(samples) / elapsed_seconds, 2),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return {
+            "duration_s": round(elapsed_seconds, 2),
+            "requests": total_requests,
+            "errors": total_errors,
+            "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+            "throughput_rps": round(total_requests / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+            "actions": actions,
+            "error_samples": list(self.error_samples),
+        }
+
+
+class VirtualUser(threading.Thread):
+    """一个虚拟用户：独占一条保持连接的HTTP连接，按请求组合权重随机选择操作"""
+
+    def __init__(self, index, base_url, mix, context, stats, stop_at, record_from, seed):
+        super().__init__(name=f"vu-{index}", daemon=True)
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.index = index
+        self.actions = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.context = context
+        self.stats = stats
+        self.stop_at = stop_at
+        self.record_from = record_from
+        self.rng = random.Random(seed)
+        self.connection = None
+        self.etags = {}
+        self.edited_period_id = None
+
+    def request(self, method, path, params=None, body=None, headers=None):
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                return response.status, response.getheader("ETag"), response.getheader("X-Next-Cursor"), data
+            except (http.client.HTTPException, OSError):
+                # 服务端关闭了保持的连接时重连一次
+                self.connection.close()
+                self.connection = None
+                if attempt == 1:
+                    raise
+
+    def timed(self, action, method, path, params=None, body=None, headers=None, ok=(200,)):
+        started = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = self.request(method, path, params, body, headers)
+            if result[0] not in ok:
+                error = f"HTTP {result[0]} {result[3][:200].decode('utf-8', 'replace')}"
+        except Exception as e:
+            error = repr(e)
+        finished = time.perf_counter()
+        if finished >= self.record_from:
+            self.stats.record(action, finished - started, error)
+        return result if error is None else None
+
+    def calendar(self):
+        # 在最近两年内随机切换月份，带上之前返回的ETag
+        months_back = self.rng.randint(0, 23)
+        today = datetime.now()
+        year, month = today.year, today.month - months_back
+        while month <= 0:
+            year, month = year - 1, month + 12
+        start = datetime(year, month, 1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        key = start.strftime("%Y-%m")
+        headers = {"If-None-Match": self.etags[key]} if key in self.etags else None
+        result = self.timed("calendar", "GET", "/api/calendar/data", {
+            "start_date": start.strftime("%Y-%m-%d"), "end_date": end.strftime("%Y-%m-%d")
+        }, headers=headers, ok=(200, 304))
+        if result is not None and result[1]:
+            self.etags[key] = result[1]
+
+    def edit(self):
+        # 每个虚拟用户固定编辑当前周期中的某一天，避免并发用户互相覆盖
+        if self.edited_period_id is not None:
+            # 并发用户数多于可编辑的天数时，同一天的记录可能已被其他用户删除
+            self.timed("edit", "DELETE", f"/api/calendar/skip-periods/{self.edited_period_id}", ok=(200, 404))
+            self.edited_period_id = None
+            return
+        start_hour = self.rng.randint(0, 22)
+        result = self.timed("edit", "POST", "/api/calendar/skip-period-validated", body={
+            "cycle_id": self.context["cycle_id"],
+            "date": self.context["edit_days"][self.index % len(self.context["edit_days"])],
+            "start_time": f"{start_hour:02d}:00",
+            "end_time": f"{start_hour + 1:02d}:30",
+        })
+        if result is not None:
+            self.edited_period_id = json.loads(result[3])["id"]
+
+    def history(self):
+        result = self.timed("history", "GET", "/api/cycles/", {"limit": 20})
+        # 约三分之一的浏览会继续翻页
+        while result is not None and result[2] and self.rng.random() < 0.33:
+            result = self.timed("history", "GET", "/api/cycles/", {"limit": 20, "cursor": result[2]})
+
+    def run(self):
+        while time.perf_counter() < self.stop_at:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            getattr(self, action)()
+        # 清理最后一次编辑留下的记录
+        if self.edited_period_id is not None:
+            try:
+                self.request("DELETE", f"/api/calendar/skip-periods/{self.edited_period_id}")
+            except Exception:
+                pass
+        if self.connection is not None:
+            self.connection.close()
+
+
+def parse_mix(value):
+    mix = []
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ("calendar", "edit", "history"):
+            raise argparse.ArgumentTypeError(f"未知的操作: {name}")
+        mix.append((name, float(weight or 1)))
+    if not any(weight > 0 for _, weight in mix):
+        raise argparse.ArgumentTypeError("请求组合的权重之和必须大于0")
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(path, scale):
+    """创建临时数据库并生成合成数据"""
+    from sqlalchemy.orm import Session
+
+    from app.database.database import create_db_engine
+    from app.database.migrations import run_migrations
+    from tests.benchmarks import synthetic
+
+    engine = create_db_engine(f"sqlite:///{path}")
+    run_migrations(bind=engine)
+    with Session(bind=engine) as db:
+        summary = synthetic.generate(db, synthetic.SCALES[scale])
+    engine.dispose()
+    return summary
+
+
+def start_server(database_path, port, workers, log_dir):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "LOG_LEVEL": "WARNING",
+        "LOG_DIR": log_dir,
+    })
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--no-access-log", "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=ROOT_DIR, env=env)
+
+
+def wait_until_ready(base_url, timeout=60):
+    parts = urlsplit(base_url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=2)
+            connection.request("GET", "/api/health-check")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务在 {timeout} 秒内未就绪: {base_url}")
+
+
+def load_context(base_url):
+    """读取当前周期，确定 edit 操作可以使用的日期（当前周期开始至今，不含今天）"""
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    connection.request("GET", "/api/cycles/current")
+    response = connection.getresponse()
+    if response.status != 200:
+        raise RuntimeError(f"无法获取当前周期: HTTP {response.status}")
+    cycle = json.loads(response.read())
+    start = datetime.fromisoformat(cycle["start_date"]).date()
+    today = datetime.now().date()
+    days = [(start + timedelta(days=i)).isoformat() for i in range((today - start).days)]
+    return {"cycle_id": cycle["id"], "edit_days": days or [today.isoformat()]}
+
+
+def run_load(base_url, mix, concurrency, duration, warmup, seed):
+    context = load_context(base_url)
+    stats = Stats()
+    started = time.perf_counter()
+    record_from = started + warmup
+    stop_at = record_from + duration
+    users = [
+        VirtualUser(index, base_url, mix, context, stats, stop_at, record_from, seed + index)
+        for index in range(concurrency)
+    ]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    return stats.summary(duration)
+
+
+def print_report(result):
+    print(f"\n持续时间 {result['duration_s']} s, 请求 {result['requests']} 次, "
+          f"吞吐量 {result['throughput_rps']} req/s, 错误率 {result['error_rate']:.2%}")
+    print(f"{'操作':<10}{'请求数':>8}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}{'错误率':>9}")
+    for action, row in result["actions"].items():
+        print(f"{action:<10}{row['requests']:>10}{row['rps']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['p99_ms']:>10}{row['max_ms']:>10}{row['error_rate']:>10.2%}")
+    for sample in result["error_samples"]:
+        print(f"  错误示例 {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日历服务HTTP负载测试")
+    parser.add_argument("--url", help="已运行实例的地址；不指定时在临时端口启动一个本地实例")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发虚拟用户数")
+    parser.add_argument("--duration", type=float, default=30, help="统计时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒），期间的请求不计入统计")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"请求组合权重，默认 {DEFAULT_MIX}")
+    parser.add_argument("--scale", default="1k", help="本地实例的合成数据规模: 10, 1k, 100k")
+    parser.add_argument("--workers", type=int, default=1, help="本地实例的 uvicorn worker 数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", help="将结果保存为JSON文件")
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_url = args.url
+        try:
+            if base_url is None:
+                database_path = os.path.join(tmp_dir, "load.db")
+                summary = prepare_database(database_path, args.scale)
+                print(f"已生成 {summary['cycles']} 个周期, {summary['skip_periods']} 个跳过时间段")
+                port = free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                server = start_server(database_path, port, args.workers, tmp_dir)
+            wait_until_ready(base_url)
+            mix_text = ", ".join(f"{name}={weight:g}" for name, weight in args.mix)
+            print(f"压测 {base_url}: 并发 {args.concurrency}, 时长 {args.duration} s, 请求组合 {mix_text}")
+            result = run_load(base_url, args.mix, args.concurrency, args.duration, args.warmup, args.seed)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+    result.update({
+        "url": args.url or "local",
+        "concurrency": args.concurrency,
+        "workers": args.workers if args.url is None else None,
+        "scale": args.scale if args.url is None else None,
+        "mix": dict(args.mix),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    })
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.json}")
+    sys.exit(1 if result["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
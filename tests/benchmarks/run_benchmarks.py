@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+日历计算引擎基准测试
+
+对每个数据规模生成一份合成数据库，分别测量：
+- calculate_valid_days_and_hours：单个周期包含全部跳过时间段时的计算耗时
+- calculate_calendar_data：月视图和年视图（清空网格缓存后计算，以及缓存命中）
+- 全部周期的跳过分钟数重算：加载全部跳过时间段用区间引擎计算，以及 skip_sql 的单条聚合语句
+- 主要接口：通过进程内 TestClient 请求日历数据、周期列表（首页和深分页）、当前周期，
+  以及新增并删除一个跳过时间段
+
+用法:
+    python tests/benchmarks/run_benchmarks.py                          # 全部规模 (10, 1k, 100k)
+    python tests/benchmarks/run_benchmarks.py --scales 10 1k --save baseline.json
+    python tests/benchmarks/run_benchmarks.py --compare baseline.json --threshold 0.25
+
+比较模式下，任一基准的中位数耗时比基线慢超过阈值时以退出码 1 结束。
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+# 基准测试时只输出警告以上的日志，避免日志输出影响耗时
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.database.database import create_db_engine, get_db
+from app.models import models
+from app.services import calendar_service, grid_cache, skip_accounting, skip_sql
+from tests.benchmarks import synthetic
+
+# 每个基准的最少重复次数和最长测量时间（秒）
+MIN_ROUNDS = 5
+MAX_SECONDS = 2.0
+
+
+def measure(func, min_rounds=MIN_ROUNDS, max_seconds=MAX_SECONDS):
+    """重复执行并返回耗时统计（毫秒），先执行一次预热"""
+    func()
+    timings = []
+    deadline = time.perf_counter() + max_seconds
+    while len(timings) < min_rounds or (time.perf_counter() < deadline and len(timings) < 200):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+        if len(timings) >= min_rounds and time.perf_counter() >= deadline:
+            break
+    return {
+        "rounds": len(timings),
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+    }
+
+
+def make_client(session_factory):
+    """使用基准数据库的进程内客户端，不触发应用启动事件（不会访问默认数据库）"""
+    from app.main import app
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def run_scale(scale_name, skip_period_count):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = session_factory()
+        started = time.perf_counter()
+        summary = synthetic.generate(db, skip_period_count)
+        print(f"[{scale_name}] 生成 {summary['cycles']} 个周期, {summary['skip_periods']} 个跳过时间段, "
+              f"耗时 {time.perf_counter() - started:.1f} s")
+
+        settings = db.query(models.CalendarSettings).first()
+        current_cycle = db.get(models.CycleRecords, summary["current_cycle_id"])
+        all_periods = db.query(models.SkipPeriod).all()
+        # 覆盖全部跳过时间段的周期，用于测量计算函数随跳过时间段数量的耗时
+        spanning_cycle = models.CycleRecords(
+            id=0, cycle_number=0, start_date=summary["first_start"], is_completed=False
+        )
+
+        now = datetime.now()
+        month_start = datetime(now.year, now.month, 1)
+        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
+        year_start = month_end - timedelta(days=365)
+
+        results["calculate_valid_days_and_hours"] = measure(
+            lambda: calendar_service.calculate_valid_days_and_hours(spanning_cycle, all_periods, now)
+        )
+
+        all_cycles = db.query(models.CycleRecords).all()
+
+        def recompute_all_python():
+            periods_by_cycle = {}
+            for period in db.query(models.SkipPeriod).all():
+                periods_by_cycle.setdefault(period.cycle_id, []).append(period)
+            for cycle in all_cycles:
+                skip_accounting._expected_state(cycle, periods_by_cycle.get(cycle.id, []))
+
+        results["recompute_all.python"] = measure(recompute_all_python)
+        results["recompute_all.sql"] = measure(lambda: skip_sql.skip_totals(db))
+
+        def calendar_data(start, end, cached):
+            if not cached:
+                grid_cache.calendar_grids.clear()
+            calendar_service.calculate_calendar_data(db, settings, start, end, current_cycle)
+
+        results["calculate_calendar_data.month"] = measure(lambda: calendar_data(month_start, month_end, False))
+        results["calculate_calendar_data.month_cached"] = measure(lambda: calendar_data(month_start, month_end, True))
+        results["calculate_calendar_data.year"] = measure(lambda: calendar_data(year_start, month_end, False))
+        db.close()
+
+        client = make_client(session_factory)
+        month_params = {"start_date": month_start.strftime("%Y-%m-%d"), "end_date": month_end.strftime("%Y-%m-%d")}
+
+        def get(path, params=None):
+            def request():
+                response = client.get(path, params=params)
+                assert response.status_code == 200, response.text
+            return request
+
+        def uncached_calendar_month():
+            grid_cache.calendar_grids.clear()
+            get("/api/calendar/data", month_params)()
+
+        deep_cursor = f"{max(2, summary['cycles'] // 10)}:{max(2, summary['cycles'] // 10)}"
+        results["GET /api/calendar/data"] = measure(uncached_calendar_month)
+        results["GET /api/cycles/ (first page)"] = measure(get("/api/cycles/", {"limit": 20}))
+        results["GET /api/cycles/ (deep page)"] = measure(get("/api/cycles/", {"limit": 20, "cursor": deep_cursor}))
+        results["GET /api/cycles/current"] = measure(get("/api/cycles/current"))
+
+        edit_day = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+
+        def edit_skip_period():
+            response = client.post("/api/calendar/skip-period-validated", json={
+                "cycle_id": summary["current_cycle_id"], "date": edit_day, "start_time": "13:00", "end_time": "13:30"
+            })
+            assert response.status_code == 200, response.text
+            response = client.delete(f"/api/calendar/skip-periods/{response.json()['id']}")
+            assert response.status_code == 200, response.text
+
+        # 编辑的日期上可能已有生成的跳过时间段，先删除以便每轮都是新增+删除
+        cleanup = session_factory()
+        cleanup.query(models.SkipPeriod)\
+            .filter(models.SkipPeriod.cycle_id == summary["current_cycle_id"])\
+            .filter(models.SkipPeriod.date >= datetime.strptime(edit_day, "%Y-%m-%d"))\
+            .delete()
+        cleanup.commit()
+        cleanup.close()
+        results["POST+DELETE skip period"] = measure(edit_skip_period)
+
+        client.app.dependency_overrides.clear()
+        engine.dispose()
+
+    for name, result in results.items():
+        print(f"[{scale_name}] {name:<40} 中位数 {result['median_ms']:>10.3f} ms  (最小 {result['min_ms']:.3f} ms, {result['rounds']} 轮)")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基线比较中位数耗时，返回变慢超过阈值的基准列表"""
+    regressions = []
+    for scale_name, benchmarks in results["scales"].items():
+        for name, result in benchmarks.items():
+            base = baseline.get("scales", {}).get(scale_name, {}).get(name)
+            if not base:
+                continue
+            ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+            status = "变慢" if ratio > 1 + threshold else ("变快" if ratio < 1 - threshold else "持平")
+            print(f"[{scale_name}] {name:<40} {base['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms  ({ratio:.2f}x, {status})")
+            if ratio > 1 + threshold:
+                regressions.append((scale_name, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日历计算引擎基准测试")
+    parser.add_argument("--scales", nargs="+", default=list(synthetic.SCALES), choices=list(synthetic.SCALES),
+                        help="数据规模（跳过时间段数量）")
+    parser.add_argument("--save", help="将结果保存为JSON基线文件")
+    parser.add_argument("--compare", help="与指定的JSON基线文件比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="比较时判定为变慢的比例，默认0.2（20%%）")
+    args = parser.parse_args()
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scales": {},
+    }
+    for scale_name in args.scales:
+        results["scales"][scale_name] = run_scale(scale_name, synthetic.SCALES[scale_name])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能退化（阈值 {args.threshold:.0%}）")
+            sys.exit(1)
+        print("未发现性能退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+基准测试用的合成数据生成器
+
+按跳过时间段数量生成一串首尾相接的26天周期：最后一个周期为进行中周期，结束于当前时间附近，
+之前的周期均已完成。每个周期最多 PERIODS_PER_CYCLE 个跳过时间段，每天最多一个，
+其中一部分跨越午夜。相同的随机种子生成完全相同的数据。
+"""
+
+import logging
+import math
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.models import models
+from app.services import skip_accounting
+
+# 预设规模: 名称 -> 跳过时间段数量
+SCALES = {
+    "10": 10,
+    "1k": 1_000,
+    "100k": 100_000,
+}
+
+CYCLE_DAYS = 26
+PERIODS_PER_CYCLE = 20
+
+# 跳过时间段模板: (开始时间, 结束时间)，包含跨午夜的时间段
+_PERIOD_TEMPLATES = [
+    ("22:00", "06:00"),
+    ("23:30", "07:30"),
+    ("20:00", "08:00"),
+    ("12:00", "14:00"),
+    ("09:00", "17:00"),
+    ("00:00", "12:00"),
+]
+
+
+def generate(db, skip_period_count, seed=0, now=None):
+    """在空数据库中生成日历设置、周期和跳过时间段，并建立跳过记账
+
+    Returns:
+        dict: 生成的数据概况，包括进行中周期ID
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    cycle_count = max(1, math.ceil(skip_period_count / PERIODS_PER_CYCLE))
+
+    # 从当前周期向前倒推第一个周期的开始时间
+    current_start = datetime(now.year, now.month, now.day, 9, 0) - timedelta(days=CYCLE_DAYS // 2)
+    first_start = current_start - timedelta(days=CYCLE_DAYS * (cycle_count - 1))
+
+    db.add(models.CalendarSettings(start_date=first_start, skip_hours=12))
+
+    cycles = []
+    for index in range(cycle_count):
+        start = first_start + timedelta(days=CYCLE_DAYS * index)
+        is_current = index == cycle_count - 1
+        cycles.append({
+            "id": index + 1,
+            "cycle_number": index + 1,
+            "start_date": start,
+            "end_date": None if is_current else start + timedelta(days=CYCLE_DAYS),
+            "is_completed": not is_current,
+            "valid_days_count": 0 if is_current else CYCLE_DAYS,
+            "valid_hours_count": 0.0,
+            "remark": "",
+        })
+    db.execute(insert(models.CycleRecords), cycles)
+
+    periods = []
+    remaining = skip_period_count
+    for cycle in cycles:
+        count = min(PERIODS_PER_CYCLE, remaining)
+        remaining -= count
+        # 进行中周期只在已经过去的日期上生成跳过时间段
+        available_days = CYCLE_DAYS if cycle["is_completed"] else max(1, (now - cycle["start_date"]).days)
+        for day in sorted(rng.sample(range(available_days), min(count, available_days))):
+            start_time, end_time = rng.choice(_PERIOD_TEMPLATES)
+            skip_date = cycle["start_date"] + timedelta(days=day)
+            periods.append({
+                "cycle_id": cycle["id"],
+                "date": datetime(skip_date.year, skip_date.month, skip_date.day, 12),
+                "start_time": start_time,
+                "end_time": end_time,
+            })
+    for offset in range(0, len(periods), 10_000):
+        db.execute(insert(models.SkipPeriod), periods[offset:offset + 10_000])
+    db.commit()
+
+    # 建立增量记账数据，并刷新进行中周期的计数。新插入的周期尚无记账数据，
+    # 对账时每个周期都会被报告为偏差，这里暂时屏蔽这些预期内的警告
+    accounting_logger = logging.getLogger("api.skip_accounting")
+    previous_level = accounting_logger.level
+    accounting_logger.setLevel(logging.ERROR)
+    try:
+        skip_accounting.verify_skip_accounting(db, fix=True)
+    finally:
+        accounting_logger.setLevel(previous_level)
+    for cycle in db.query(models.CycleRecords).filter(models.CycleRecords.is_completed == True).all():
+        skip_accounting.refresh_cycle_counters(db, cycle)
+    skip_accounting.refresh_open_cycles(db)
+    db.commit()
+
+    return {
+        "cycles": cycle_count,
+        "skip_periods": len(periods),
+        "current_cycle_id": cycles[-1]["id"],
+        "first_start": first_start,
+    }
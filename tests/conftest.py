@@ -0,0 +1,34 @@
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture(autouse=True)
+def clear_grid_cache():
+    """每个测试使用独立的数据库，版本号会从0重新开始，需要清空进程内的网格缓存"""
+    from app.services import grid_cache
+
+    grid_cache.calendar_grids.clear()
+    yield
+    grid_cache.calendar_grids.clear()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """基于临时SQLite文件的数据库会话，使用与生产环境相同的连接配置"""
+    from app.database.database import create_db_engine
+    from app.models import models
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,136 @@
+"""
+测试批量重算：分块、进程池计算、批量写回和检查点续跑
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import models
+from app.routers import admin
+from app.services import bulk_recompute, skip_accounting
+from app.services.calendar_service import calculate_valid_days_and_hours
+
+
+@pytest.fixture
+def cycles(db):
+    start = datetime(2024, 1, 1, 9, 30)
+    cycles = []
+    for number in range(1, 8):
+        cycle_start = start + timedelta(days=30 * (number - 1))
+        completed = number < 7
+        cycle = models.CycleRecords(
+            cycle_number=number,
+            start_date=cycle_start,
+            end_date=cycle_start + timedelta(days=27, hours=number) if completed else None,
+            is_completed=completed,
+            # 保存的计数与跳过时间段不一致，需要重算
+            valid_days_count=number,
+            valid_hours_count=number * 24.0,
+        )
+        db.add(cycle)
+        db.flush()
+        for day in range(0, 27, 3):
+            db.add(models.SkipPeriod(
+                cycle_id=cycle.id,
+                date=datetime(cycle_start.year, cycle_start.month, cycle_start.day, 12) + timedelta(days=day),
+                start_time="22:00",
+                end_time="08:00" if number % 2 else "23:30",
+            ))
+        cycles.append(cycle)
+    db.commit()
+    return cycles
+
+
+def expected_counters(db, cycle, as_of):
+    periods = db.query(models.SkipPeriod).filter(models.SkipPeriod.cycle_id == cycle.id).all()
+    valid_days, valid_hours = calculate_valid_days_and_hours(cycle, periods, None if cycle.end_date else as_of)
+    return valid_days, valid_hours
+
+
+def assert_counters_recomputed(db, cycles, as_of):
+    db.expire_all()
+    for cycle in cycles:
+        valid_days, valid_hours = expected_counters(db, cycle, as_of)
+        assert cycle.valid_days_count == valid_days
+        assert cycle.valid_hours_count == pytest.approx(valid_hours, abs=1 / 60)
+        # 未完成周期在任务结束时按当前时间刷新，可能比 as_of 晚一分钟
+        assert cycle.valid_minutes == pytest.approx(round(valid_hours * 60), abs=0 if cycle.end_date else 1)
+
+
+def test_recompute_all_writes_changed_counters(db, cycles):
+    run = bulk_recompute.recompute_all(db, workers=1, chunk_size=3)
+
+    assert run.status == bulk_recompute.COMPLETED
+    assert (run.total, run.processed, run.updated, run.last_cycle_id) == (7, 7, 7, cycles[-1].id)
+    assert_counters_recomputed(db, cycles, run.as_of)
+
+    # 再次执行时计数没有变化，不写回任何周期
+    assert bulk_recompute.recompute_all(db, workers=1, chunk_size=3).updated == 0
+
+
+def test_recompute_all_repairs_skip_accounting_and_ledger(db, cycles):
+    # 记账和台账与跳过时间段不一致：记账值过期，台账缺失
+    for cycle in cycles:
+        cycle.skipped_minutes = 0.0
+        cycle.skip_horizon = None
+    db.commit()
+
+    bulk_recompute.recompute_all(db, workers=1, chunk_size=3)
+
+    assert skip_accounting.verify_skip_accounting(db, fix=False) == []
+    assert db.query(models.CycleDayLedger).filter(models.CycleDayLedger.cycle_id == cycles[0].id).count() > 0
+
+
+def test_interrupted_run_resumes_from_checkpoint(db, cycles):
+    def interrupt(run):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        bulk_recompute.recompute_all(db, workers=1, chunk_size=3, progress=interrupt)
+    interrupted = bulk_recompute.latest_run(db)
+    assert (interrupted.status, interrupted.processed, interrupted.last_cycle_id) == (bulk_recompute.FAILED, 3, cycles[2].id)
+
+    # 中断之后过了几天才续跑，未完成周期不能按中断前的时间计算
+    interrupted.as_of -= timedelta(days=3)
+    db.commit()
+    stale_as_of = interrupted.as_of
+
+    processed = []
+    run = bulk_recompute.start_run(db)
+    assert run.id == interrupted.id
+    assert run.as_of > stale_as_of + timedelta(days=2)
+    bulk_recompute.recompute_all(db, run, workers=1, chunk_size=3, progress=lambda run: processed.append(run.processed))
+    assert processed == [6, 7]
+    assert run.status == bulk_recompute.COMPLETED
+    assert_counters_recomputed(db, cycles, run.as_of)
+
+    # 已完成的任务不会续跑，之后总是新建任务
+    assert bulk_recompute.start_run(db).id != run.id
+
+
+def test_process_pool_matches_in_process(db, cycles):
+    run = bulk_recompute.recompute_all(db, workers=2, chunk_size=2)
+    assert run.processed == 7
+    assert_counters_recomputed(db, cycles, run.as_of)
+
+
+def test_recompute_endpoint_requires_admin_token(monkeypatch):
+    started = []
+    monkeypatch.setattr(bulk_recompute, "start_in_background", lambda *args: started.append(args) or {"id": 1})
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/api/admin")
+    client = TestClient(app)
+
+    # 未设置 ADMIN_TOKEN 时不能启动批量重算
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/api/admin/recompute").status_code == 404
+    assert client.get("/api/admin/recompute").status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.post("/api/admin/recompute", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert started == []
+    assert client.post("/api/admin/recompute", headers={"X-Admin-Token": "secret"}).status_code == 202
+    assert len(started) == 1
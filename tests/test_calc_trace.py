@@ -0,0 +1,66 @@
+"""
+测试计算追踪
+"""
+
+from collections import deque
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import models
+from app.routers import admin
+from app.services import calc_trace, calendar_service
+
+
+def make_cycle():
+    return models.CycleRecords(id=1, cycle_number=1, start_date=datetime(2024, 1, 1, 9, 0), is_completed=False)
+
+
+def make_period(day, start_time, end_time):
+    return models.SkipPeriod(cycle_id=1, date=datetime(2024, 1, day), start_time=start_time, end_time=end_time)
+
+
+def test_calculation_is_not_traced_by_default(capsys):
+    assert calc_trace.current() is None
+    result = calendar_service.calculate_valid_days_and_hours(
+        make_cycle(), [make_period(2, "20:00", "08:00")], datetime(2024, 1, 5, 9, 0)
+    )
+    assert result == (4, 84.0)
+    assert capsys.readouterr().out == ""
+
+
+def test_traced_calculation_is_buffered(monkeypatch):
+    monkeypatch.setattr(calc_trace, "_buffer", deque(maxlen=2))
+    for _ in range(3):
+        token = calc_trace.start("GET /test")
+        calendar_service.calculate_valid_days_and_hours(
+            make_cycle(), [make_period(2, "20:00", "08:00")], datetime(2024, 1, 5, 9, 0)
+        )
+        trace = calc_trace.finish(token)
+
+    assert calc_trace.current() is None
+    traces = calc_trace.recent()
+    assert [t["id"] for t in traces] == [trace.id, trace.id - 1]
+    event = traces[0]["events"][0]
+    assert event["event"] == "calculate_valid_days_and_hours"
+    assert event["skipped_hours"] == 12.0
+    assert event["end_source"] == "argument"
+
+
+def test_admin_traces_endpoint_requires_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/api/admin")
+    client = TestClient(app)
+
+    # 未设置 ADMIN_TOKEN 时管理接口不启用
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/api/admin/traces").status_code == 404
+    assert client.delete("/api/admin/traces").status_code == 404
+    assert client.get("/api/admin/traces", headers={"X-Admin-Token": ""}).status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    for method in (client.get, client.delete):
+        assert method("/api/admin/traces").status_code == 403
+        assert method("/api/admin/traces", headers={"X-Admin-Token": "secre"}).status_code == 403
+        assert method("/api/admin/traces", headers={"X-Admin-Token": "secret"}).status_code == 200
@@ -0,0 +1,95 @@
+"""
+测试日历数据计算服务
+"""
+
+import base64
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.models import models
+from app.services import calendar_service, skip_accounting
+
+
+@pytest.fixture
+def settings(db):
+    settings = models.CalendarSettings(start_date=datetime(2024, 1, 1, 9, 0), skip_hours=12)
+    db.add(settings)
+    db.commit()
+    return settings
+
+
+@pytest.fixture
+def cycle(db):
+    cycle = models.CycleRecords(cycle_number=1, start_date=datetime(2024, 1, 1, 9, 0), is_completed=False)
+    db.add(cycle)
+    db.flush()
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 3, 12), start_time="20:00", end_time="08:00"))
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    db.commit()
+    return cycle
+
+
+def test_calendar_data_read_path_does_not_write(db, settings, cycle):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    data = calendar_service.calculate_calendar_data(
+        db, settings, datetime(2024, 1, 1), datetime(2024, 1, 31), cycle
+    )
+
+    assert not db.dirty
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+    assert data.valid_hours_count == data.current_cycle.valid_hours_count
+    assert data.valid_days_count == 26
+    assert [day.date.day for day in data.days if day.is_skipped] == [3]
+
+
+def test_compact_calendar_matches_full_days(db, settings, cycle):
+    full = calendar_service.calculate_calendar_data(db, settings, datetime(2024, 1, 1), datetime(2024, 1, 31), cycle)
+    compact = calendar_service.calculate_calendar_data(
+        db, settings, datetime(2024, 1, 1), datetime(2024, 1, 31), cycle, compact=True
+    )
+
+    valid_bitmap = base64.b64decode(compact.valid_bitmap)
+    skipped_bitmap = base64.b64decode(compact.skipped_bitmap)
+    assert compact.day_count == len(full.days)
+    for offset, day in enumerate(full.days):
+        assert bool(valid_bitmap[offset // 8] >> (offset % 8) & 1) == day.is_valid
+        assert bool(skipped_bitmap[offset // 8] >> (offset % 8) & 1) == day.is_skipped
+    assert compact.skip_periods == [[2, "20:00", "08:00", full.days[2].skip_period_id]]
+    assert compact.current_cycle.skip_period_records is None
+
+
+def test_historical_cycles_load_skip_periods_in_constant_queries(db, settings, cycle):
+    start = datetime(2023, 1, 1, 9, 0)
+    for number in range(30):
+        historical = models.CycleRecords(
+            cycle_number=100 + number,
+            start_date=start.replace(day=1 + number % 28, month=1 + number // 28),
+            end_date=start.replace(day=1 + number % 28, month=1 + number // 28, hour=21),
+            is_completed=True
+        )
+        db.add(historical)
+        db.flush()
+        db.add(models.SkipPeriod(cycle_id=historical.id, date=historical.start_date, start_time="10:00", end_time="11:00"))
+    db.commit()
+
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    data = calendar_service.calculate_calendar_data(db, settings, datetime(2023, 1, 1), datetime(2023, 3, 1), cycle)
+    full_queries = len(statements)
+
+    assert len(data.historical_cycles) == 30
+    assert all(len(c.skip_period_records) == 1 for c in data.historical_cycles)
+    assert full_queries < 10
+
+    statements.clear()
+    calendar_service.grid_cache.calendar_grids.clear()
+    data = calendar_service.calculate_calendar_data(
+        db, settings, datetime(2023, 1, 1), datetime(2023, 3, 1), cycle, include_skip_periods=False
+    )
+    assert all(c.skip_period_records is None for c in data.historical_cycles)
+    assert len(statements) <= full_queries
@@ -0,0 +1,141 @@
+"""
+测试周期切换调度器：精确完成时刻、切换周期和并发保护
+"""
+
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database.database import get_db
+from app.models import models
+from app.routers import calendar
+from app.services import cycle_scheduler, data_version, skip_accounting
+
+
+def add_cycle(db, start_date, **fields):
+    cycle = models.CycleRecords(cycle_number=fields.pop("cycle_number", 1), start_date=start_date, is_completed=False, **fields)
+    db.add(cycle)
+    db.flush()
+    return cycle
+
+
+def add_period(db, cycle, day, start_time, end_time):
+    db.add(models.SkipPeriod(
+        cycle_id=cycle.id, date=datetime(day.year, day.month, day.day, 12), start_time=start_time, end_time=end_time
+    ))
+
+
+def test_completion_time_accounts_for_skips(db):
+    cycle = add_cycle(db, datetime(2024, 1, 1, 9, 30))
+    assert cycle_scheduler.completion_time(db, cycle) == datetime(2024, 1, 27, 9, 30)
+
+    # 两段共16小时的跳过时间（开始之前的时间段被忽略），完成时刻推迟到1月28日01:30
+    add_period(db, cycle, datetime(2023, 12, 31), "08:00", "20:00")
+    add_period(db, cycle, datetime(2024, 1, 5), "22:00", "06:00")
+    add_period(db, cycle, datetime(2024, 1, 20), "10:00", "18:00")
+    db.flush()
+    assert cycle_scheduler.completion_time(db, cycle) == datetime(2024, 1, 28, 1, 30)
+
+    # 已录入的未来跳过时间段覆盖了原完成时刻，剩余的1.5小时在其结束后累计
+    add_period(db, cycle, datetime(2024, 1, 28), "00:00", "12:00")
+    db.flush()
+    assert cycle_scheduler.completion_time(db, cycle) == datetime(2024, 1, 28, 13, 30)
+
+
+def test_due_cycles_roll_over_at_exact_instant(db):
+    start = datetime.now().replace(microsecond=0) - timedelta(days=60)
+    cycle = add_cycle(db, start, remark="")
+    add_period(db, cycle, start.date() + timedelta(days=2), "00:00", "12:00")
+    add_period(db, cycle, start.date() + timedelta(days=40), "00:00", "06:00")
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    db.commit()
+
+    next_time = cycle_scheduler.roll_over_due_cycles(db)
+
+    cycles = db.query(models.CycleRecords).order_by(models.CycleRecords.id).all()
+    assert [c.cycle_number for c in cycles] == [1, 2, 3]
+    first, second, third = cycles
+    assert first.is_completed and first.end_date == start + timedelta(days=26, hours=12)
+    assert (first.valid_days_count, first.valid_minutes) == (26, cycle_scheduler.CYCLE_VALID_MINUTES)
+    # 第二个周期从第一个周期结束的时刻开始，完成日期之后的跳过时间段转移到了第二个周期
+    assert second.start_date == first.end_date and second.is_completed
+    assert second.end_date == second.start_date + timedelta(days=26, hours=6)
+    assert {period.cycle_id for period in db.query(models.SkipPeriod)} == {first.id, second.id}
+    assert not third.is_completed and third.start_date == second.end_date
+    assert next_time == third.start_date + timedelta(days=26)
+    assert skip_accounting.verify_skip_accounting(db, fix=False) == []
+
+
+def test_completed_cycle_is_not_rolled_over_twice(db):
+    cycle = add_cycle(db, datetime(2024, 1, 1, 9, 30))
+    db.commit()
+    db.query(models.CycleRecords).update({"is_completed": True, "end_date": datetime(2024, 1, 20)})
+    db.commit()
+
+    assert cycle_scheduler.complete_cycle(db, cycle, datetime(2024, 1, 27, 9, 30)) is None
+    assert db.query(models.CycleRecords).count() == 1
+    assert cycle.end_date == datetime(2024, 1, 20)
+
+
+def test_commit_listeners_run_after_version_changes(db):
+    calls = []
+    listener = lambda: calls.append(1)
+    data_version.add_commit_listener(listener)
+    try:
+        db.commit()
+        assert calls == []
+        data_version.bump(db)
+        db.commit()
+        assert calls == [1]
+    finally:
+        data_version.remove_commit_listener(listener)
+
+
+def test_skip_on_completion_day_after_instant_moves_to_next_cycle(db):
+    cycle = add_cycle(db, datetime(2024, 1, 1, 9, 30))
+    add_period(db, cycle, datetime(2024, 1, 27), "14:00", "18:00")
+    # 恰好在完成时刻开始的时间段也归下一个周期
+    add_period(db, cycle, datetime(2024, 1, 28), "09:30", "10:00")
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    db.commit()
+
+    next_time = cycle_scheduler.roll_over_due_cycles(db, now=datetime(2024, 1, 27, 12, 0))
+
+    first, second = db.query(models.CycleRecords).order_by(models.CycleRecords.id).all()
+    assert first.end_date == datetime(2024, 1, 27, 9, 30) and first.skipped_minutes == 0
+    assert second.start_date == first.end_date
+    assert {period.cycle_id for period in db.query(models.SkipPeriod)} == {second.id}
+    assert second.skipped_minutes == 4 * 60 + 30
+    ledger = {
+        row.day: row.skipped_minutes
+        for row in db.query(models.CycleDayLedger).filter(models.CycleDayLedger.cycle_id == second.id)
+    }
+    assert ledger[datetime(2024, 1, 27).date()] == 4 * 60
+    assert next_time == second.start_date + timedelta(days=26, hours=4, minutes=30)
+    assert skip_accounting.verify_skip_accounting(db, fix=False) == []
+
+
+def test_increment_day_endpoint_rolls_over_due_cycles(db):
+    start = datetime.now() - timedelta(days=60)
+    add_cycle(db, start, cycle_number=7)
+    db.commit()
+    app = FastAPI()
+    app.include_router(calendar.router, prefix="/api/calendar")
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+
+    body = client.post("/api/calendar/increment-day").json()
+    assert body["completed_cycles"] == 2
+    cycles = db.query(models.CycleRecords).order_by(models.CycleRecords.id).all()
+    assert [cycle.cycle_number for cycle in cycles] == [7, 8, 9]
+    # 结束时间为精确的完成时刻，而不是调用接口的时间
+    assert cycles[0].end_date == start + timedelta(days=26)
+    assert cycles[1].end_date == start + timedelta(days=52)
+
+    # 重复调用不会再次切换
+    body = client.post("/api/calendar/increment-day").json()
+    assert body["completed_cycles"] == 0
+    assert db.query(models.CycleRecords).count() == 3
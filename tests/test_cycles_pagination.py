@@ -0,0 +1,83 @@
+"""
+测试周期列表的游标分页与过滤
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.database.database import get_db
+from app.models import models
+from app.routers import cycles
+
+
+@pytest.fixture
+def client(db):
+    start = datetime(2023, 1, 1, 9, 0)
+    for number in range(1, 26):
+        db.add(models.CycleRecords(
+            cycle_number=number,
+            start_date=start + timedelta(days=26 * (number - 1)),
+            end_date=start + timedelta(days=26 * number) if number < 25 else None,
+            is_completed=number < 25
+        ))
+    db.commit()
+
+    app = FastAPI()
+    app.include_router(cycles.router, prefix="/api/cycles")
+    app.dependency_overrides[get_db] = lambda: db
+    return TestClient(app)
+
+
+def test_cursor_pages_cover_all_cycles_once(client):
+    numbers = []
+    params = {"limit": 10, "include_skip_periods": False}
+    while True:
+        response = client.get("/api/cycles/", params=params)
+        assert response.status_code == 200
+        numbers.extend(cycle["cycle_number"] for cycle in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+
+    assert numbers == list(range(25, 0, -1))
+
+
+def test_without_limit_or_cursor_returns_all_cycles(client, monkeypatch):
+    monkeypatch.setattr(cycles, "DEFAULT_PAGE_SIZE", 10)
+
+    response = client.get("/api/cycles/")
+    assert [cycle["cycle_number"] for cycle in response.json()] == list(range(25, 0, -1))
+    assert "X-Next-Cursor" not in response.headers
+
+    # 只提供游标时按默认每页数量分页
+    response = client.get("/api/cycles/", params={"cursor": "21:21"})
+    assert [cycle["cycle_number"] for cycle in response.json()] == list(range(20, 10, -1))
+    assert response.headers["X-Next-Cursor"] == "11:11"
+
+
+def test_filters(client):
+    response = client.get("/api/cycles/", params={"is_completed": False})
+    assert [cycle["cycle_number"] for cycle in response.json()] == [25]
+
+    response = client.get("/api/cycles/", params={
+        "start_from": "2023-02-01T00:00:00", "start_to": "2023-04-01T00:00:00", "is_completed": True
+    })
+    assert [cycle["cycle_number"] for cycle in response.json()] == [4, 3]
+    assert "X-Next-Cursor" not in response.headers
+
+    assert client.get("/api/cycles/", params={"cursor": "bad"}).status_code == 400
+
+
+def test_keyset_query_uses_index(db):
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM cycle_records WHERE is_completed = 1 "
+        "AND (cycle_number, id) < (10, 10) ORDER BY cycle_number DESC, id DESC LIMIT 10"
+    )).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_cycle_records_completed_number" in details
+    assert "TEMP B-TREE" not in details
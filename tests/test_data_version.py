@@ -0,0 +1,34 @@
+"""
+测试数据版本号与ETag匹配
+"""
+
+from starlette.requests import Request
+
+from app.services import data_version
+
+
+def make_request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_bump_changes_etag(db):
+    assert data_version.current(db) == 0
+    etag = data_version.make_etag(db, "cycles", 0, 100)
+    assert etag == data_version.make_etag(db, "cycles", 0, 100)
+
+    data_version.bump(db)
+    data_version.bump(db)
+    db.commit()
+
+    assert data_version.current(db) == 2
+    assert data_version.make_etag(db, "cycles", 0, 100) != etag
+
+
+def test_if_none_match_comparison(db):
+    etag = data_version.make_etag(db, "cycle", 1)
+    assert data_version.is_not_modified(make_request(etag), etag)
+    assert data_version.is_not_modified(make_request(f'"other", W/{etag}'), etag)
+    assert data_version.is_not_modified(make_request("*"), etag)
+    assert not data_version.is_not_modified(make_request('"other"'), etag)
+    assert not data_version.is_not_modified(make_request(), etag)
@@ -0,0 +1,50 @@
+"""
+测试SQLite连接配置
+"""
+
+import threading
+
+from sqlalchemy import text
+
+from app.config import database_config
+from app.database.database import create_db_engine
+
+
+def test_pragmas_applied_on_every_connection(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    try:
+        with engine.connect() as first, engine.connect() as second:
+            for connection in (first, second):
+                assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+                assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+                assert connection.execute(text("PRAGMA busy_timeout")).scalar() == database_config.SQLITE_BUSY_TIMEOUT_MS
+                assert connection.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        assert engine.pool.size() == database_config.DB_POOL_SIZE
+    finally:
+        engine.dispose()
+
+
+def test_reader_not_blocked_by_open_write_transaction(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+            connection.execute(text("INSERT INTO items (id) VALUES (1)"))
+
+        with engine.connect() as writer:
+            writer.execute(text("BEGIN IMMEDIATE"))
+            writer.execute(text("INSERT INTO items (id) VALUES (2)"))
+
+            result = {}
+
+            def read():
+                with engine.connect() as reader:
+                    result["count"] = reader.execute(text("SELECT COUNT(*) FROM items")).scalar()
+
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join(timeout=2)
+            assert result == {"count": 1}
+            writer.execute(text("ROLLBACK"))
+    finally:
+        engine.dispose()
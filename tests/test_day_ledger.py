@@ -0,0 +1,148 @@
+"""
+测试周期逐日台账的增量维护与读取
+"""
+
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.database.database import get_db
+from app.models import models
+from app.routers import cycles
+from app.services import day_ledger, skip_accounting
+from app.services.skip_engine import SkipIntervalSet
+
+
+def stored_rows(db, cycle_id):
+    ledger = models.CycleDayLedger
+    result = db.execute(
+        select(ledger.day, ledger.skipped_minutes, ledger.valid_minutes)
+        .where(ledger.cycle_id == cycle_id)
+        .order_by(ledger.day)
+    )
+    return [tuple(row) for row in result]
+
+
+def expected_rows(db, cycle):
+    periods = db.query(models.SkipPeriod).filter(models.SkipPeriod.cycle_id == cycle.id).all()
+    intervals = SkipIntervalSet.from_skip_periods(periods, cycle)
+    days = day_ledger._days_between(cycle.start_date.date(), day_ledger._last_day(cycle, intervals))
+    return day_ledger._compute_rows(cycle, intervals, days)
+
+
+def assert_rows_equal(actual, expected):
+    assert [row[0] for row in actual] == [row[0] for row in expected]
+    for (_, skipped, valid), (_, expected_skipped, expected_valid) in zip(actual, expected):
+        assert skipped == pytest.approx(expected_skipped)
+        assert valid == pytest.approx(expected_valid)
+
+
+@pytest.fixture
+def cycle(db):
+    cycle = models.CycleRecords(cycle_number=1, start_date=datetime(2024, 1, 1, 9, 30), is_completed=False)
+    db.add(cycle)
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    db.commit()
+    return cycle
+
+
+def test_incremental_updates_match_rebuild(db, cycle):
+    rng = random.Random(20)
+    periods = {}
+    for _ in range(150):
+        day = rng.randint(0, 24)
+        start_time = f"{rng.randint(0, 23):02d}:{rng.choice([0, 30]):02d}"
+        end_time = f"{rng.randint(0, 23):02d}:{rng.choice([0, 15]):02d}"
+        period = periods.get(day)
+        if period is None:
+            period = models.SkipPeriod(
+                cycle_id=cycle.id,
+                date=datetime(2024, 1, 1, 12) + timedelta(days=day),
+                start_time=start_time,
+                end_time=end_time,
+            )
+            db.add(period)
+            db.flush()
+            skip_accounting.apply_period_change(db, cycle, period.id, None, skip_accounting.snapshot(period))
+            periods[day] = period
+        elif rng.random() < 0.5:
+            before = skip_accounting.snapshot(period)
+            db.delete(period)
+            db.flush()
+            skip_accounting.apply_period_change(db, cycle, period.id, before, None)
+            del periods[day]
+        else:
+            before = skip_accounting.snapshot(period)
+            period.start_time, period.end_time = start_time, end_time
+            skip_accounting.apply_period_change(db, cycle, period.id, before, skip_accounting.snapshot(period))
+        db.commit()
+
+        assert_rows_equal(stored_rows(db, cycle.id), expected_rows(db, cycle))
+
+    # 未完成周期的台账跳过分钟数之和等于跳过记账
+    assert sum(row[1] for row in stored_rows(db, cycle.id)) == pytest.approx(cycle.skipped_minutes)
+
+
+def test_completed_cycle_ledger_is_clipped_to_window(db, cycle):
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 1, 12), start_time="08:00", end_time="12:00"))
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 5, 12), start_time="22:00", end_time="06:00"))
+    cycle.end_date = datetime(2024, 1, 6, 3, 0)
+    cycle.is_completed = True
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    db.commit()
+
+    rows = stored_rows(db, cycle.id)
+    assert [row[0] for row in rows] == [date(2024, 1, day) for day in range(1, 7)]
+    # 开始日从09:30算起，与08:00-12:00重叠2.5小时
+    assert rows[0][1:] == pytest.approx((150, 14.5 * 60 - 150))
+    # 结束日只算到03:00，前一天的跨午夜时间段覆盖全部3小时
+    assert rows[-1][1:] == pytest.approx((180, 0))
+    total_minutes = (cycle.end_date - cycle.start_date).total_seconds() / 60
+    assert sum(row[2] for row in rows) == pytest.approx(total_minutes - cycle.skipped_minutes)
+
+
+def test_verifier_rebuilds_missing_ledger(db, cycle):
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 2, 12), start_time="08:00", end_time="20:00"))
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    day_ledger.delete_cycle(db, cycle.id)
+    db.commit()
+
+    skip_accounting.verify_skip_accounting(db)
+    assert_rows_equal(stored_rows(db, cycle.id), expected_rows(db, cycle))
+
+
+def test_days_endpoint_returns_breakdown_and_totals(db, cycle):
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 2, 12), start_time="20:00", end_time="08:00"))
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    # 模拟后台任务尚未补齐最近几天的台账
+    last_stored = date.today() - timedelta(days=3)
+    db.query(models.CycleDayLedger).filter(models.CycleDayLedger.day > last_stored).delete()
+    db.commit()
+
+    app = FastAPI()
+    app.include_router(cycles.router, prefix="/api/cycles")
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+
+    response = client.get(f"/api/cycles/{cycle.id}/days", params={"start_date": "2024-01-02", "end_date": "2024-01-03"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [row["day"] for row in body["days"]] == ["2024-01-02", "2024-01-03"]
+    assert [row["skipped_minutes"] for row in body["days"]] == [240, 480]
+    assert body["skipped_minutes"] == 720
+    assert body["valid_hours"] == pytest.approx(48 - 12)
+
+    response = client.get(f"/api/cycles/{cycle.id}/days")
+    days = response.json()["days"]
+    assert days[-1]["day"] == date.today().isoformat()
+    assert len(days) == (date.today() - date(2024, 1, 1)).days + 1
+
+    assert client.get(f"/api/cycles/{cycle.id}/days", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
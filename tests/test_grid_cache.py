@@ -0,0 +1,55 @@
+"""
+测试日历网格缓存的版本校验与精确失效
+"""
+
+from datetime import date, datetime
+
+from app.services import data_version, grid_cache
+
+
+def key(start_day, end_day):
+    return (datetime(2024, 1, start_day), datetime(2024, 1, end_day, 23, 59, 59), False, 1, date(2024, 1, 31))
+
+
+def test_entries_only_hit_for_their_version():
+    cache = grid_cache.GridCache(max_entries=8)
+    cache.put(key(1, 31), 3, "grid")
+    assert cache.get(key(1, 31), 3) == "grid"
+    assert cache.get(key(1, 31), 4) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction_is_bounded():
+    cache = grid_cache.GridCache(max_entries=2)
+    for day in (1, 2, 3):
+        cache.put(key(day, day), 0, day)
+    assert len(cache) == 2
+    assert cache.get(key(1, 1), 0) is None
+
+
+def test_advance_drops_only_overlapping_ranges():
+    cache = grid_cache.GridCache(max_entries=8)
+    cache.put(key(1, 10), 5, "early")
+    cache.put(key(11, 20), 5, "late")
+    cache.put(key(1, 31), 4, "stale")
+
+    cache.advance(5, 6, (date(2024, 1, 15), date(2024, 1, 15)))
+
+    assert cache.get(key(1, 10), 6) == "early"
+    assert cache.get(key(11, 20), 6) is None
+    assert cache.get(key(1, 31), 6) is None
+
+
+def test_commit_applies_declared_scope(db):
+    grid_cache.calendar_grids.put(key(1, 10), 0, "early")
+    grid_cache.calendar_grids.put(key(11, 20), 0, "late")
+
+    data_version.bump(db, invalidate=(date(2024, 1, 12), None))
+    db.commit()
+
+    assert grid_cache.calendar_grids.get(key(1, 10), 1) == "early"
+    assert grid_cache.calendar_grids.get(key(11, 20), 1) is None
+
+    data_version.bump(db)
+    db.rollback()
+    assert grid_cache.calendar_grids.get(key(1, 10), 1) == "early"
@@ -0,0 +1,120 @@
+"""
+测试热点查询使用的索引（EXPLAIN QUERY PLAN）
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app.database.migrations import sync_indexes
+from app.models import models
+
+
+def query_plan(db, query):
+    statement = query.statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {statement}")).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.fixture
+def history(db):
+    start = datetime(2020, 1, 1, 9, 0)
+    for number in range(1, 201):
+        cycle = models.CycleRecords(
+            cycle_number=number,
+            start_date=start + timedelta(days=26 * (number - 1)),
+            end_date=start + timedelta(days=26 * number) if number < 200 else None,
+            is_completed=number < 200
+        )
+        db.add(cycle)
+        db.flush()
+        for day in range(0, 26, 5):
+            db.add(models.SkipPeriod(
+                cycle_id=cycle.id, date=cycle.start_date + timedelta(days=day), start_time="22:00", end_time="06:00"
+            ))
+    db.commit()
+    db.execute(text("ANALYZE"))
+    return db
+
+
+def test_current_cycle_uses_partial_index(history):
+    query = history.query(models.CycleRecords)\
+        .filter(models.CycleRecords.is_completed == False)\
+        .order_by(models.CycleRecords.id.desc())\
+        .limit(1)
+    plan = query_plan(history, query)
+    assert "ix_cycle_records_open" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_historical_range_uses_start_end_index(history):
+    range_start, range_end = datetime(2021, 1, 1), datetime(2021, 1, 31)
+    query = history.query(models.CycleRecords)\
+        .filter(models.CycleRecords.is_completed == True)\
+        .filter(
+            models.CycleRecords.start_date <= range_end,
+            func.coalesce(models.CycleRecords.end_date, models.CycleRecords.start_date) >= range_start
+        )\
+        .order_by(models.CycleRecords.start_date.desc())
+    assert "ix_cycle_records_start_end" in query_plan(history, query)
+
+
+def test_skip_periods_by_cycle_and_date_use_composite_index(history):
+    query = history.query(models.SkipPeriod)\
+        .filter(models.SkipPeriod.cycle_id == 5)\
+        .filter(models.SkipPeriod.date >= datetime(2020, 4, 1))\
+        .filter(models.SkipPeriod.date < datetime(2020, 4, 2))
+    assert "ix_skip_periods_cycle_date (cycle_id=? AND date>? AND date<?)" in query_plan(history, query)
+
+
+def test_skip_period_date_is_unique_per_cycle(db):
+    cycle = models.CycleRecords(cycle_number=1, start_date=datetime(2024, 1, 1), is_completed=False)
+    db.add(cycle)
+    db.flush()
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 2), start_time="22:00", end_time="06:00"))
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 2), start_time="10:00", end_time="12:00"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+
+
+def test_skip_period_day_is_unique_regardless_of_time_of_day(db):
+    cycle = models.CycleRecords(cycle_number=1, start_date=datetime(2024, 1, 1), is_completed=False)
+    db.add(cycle)
+    db.flush()
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 2), start_time="22:00", end_time="06:00"))
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 2, 15, 30), start_time="10:00", end_time="12:00"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+
+
+def test_sync_indexes_creates_missing_and_drops_stale(db):
+    bind = db.get_bind()
+    with bind.begin() as connection:
+        connection.execute(text("DROP INDEX ix_cycle_records_open"))
+        connection.execute(text("CREATE INDEX ix_cycle_records_stale ON cycle_records (remark)"))
+
+    sync_indexes(bind)
+
+    names = {row[0] for row in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert "ix_cycle_records_open" in names
+    assert "ix_cycle_records_stale" not in names
+
+
+def test_sync_indexes_fails_on_duplicate_rows(db):
+    bind = db.get_bind()
+    with bind.begin() as connection:
+        connection.execute(text("DROP INDEX uq_skip_periods_cycle_day"))
+        for date, start_time in (("2024-01-02 00:00:00.000000", "08:00"), ("2024-01-02 12:00:00.000000", "09:00")):
+            connection.execute(text(
+                "INSERT INTO skip_periods (cycle_id, date, start_time, end_time) "
+                "VALUES (3, :date, :start_time, '10:00')"
+            ), {"date": date, "start_time": start_time})
+
+    with pytest.raises(RuntimeError, match="uq_skip_periods_cycle_day.*cycle_id=3, day=2024-01-02.*共 2 条"):
+        sync_indexes(bind)
+
+    names = {row[0] for row in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert "uq_skip_periods_cycle_day" not in names
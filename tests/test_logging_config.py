@@ -0,0 +1,85 @@
+"""
+测试队列化日志配置
+"""
+
+import json
+import logging
+from datetime import date, datetime
+
+import pytest
+
+from app.config import logging_config
+
+
+@pytest.fixture
+def configure(tmp_path, monkeypatch):
+    root_logger = logging.getLogger()
+    saved_handlers, saved_level = root_logger.handlers[:], root_logger.level
+    monkeypatch.setattr(logging_config, "LOG_DIR", str(tmp_path))
+
+    def configure(log_format):
+        monkeypatch.setattr(logging_config, "LOG_FORMAT", log_format)
+        return logging_config.setup_logging()
+
+    yield configure
+
+    logging_config.stop_logging()
+    root_logger.handlers[:] = saved_handlers
+    root_logger.setLevel(saved_level)
+
+
+def test_records_go_through_queue(configure, tmp_path):
+    root_logger = configure("text")
+    assert [type(handler) for handler in root_logger.handlers] == [logging.handlers.QueueHandler]
+
+    logging.getLogger("api.calendar").info("api record")
+    logging.getLogger("other").error("error record")
+    logging_config.stop_logging()
+
+    today = date.today().isoformat()
+    api_log = (tmp_path / f"api_{today}.log").read_text(encoding="utf-8")
+    assert "api record" in api_log and "error record" not in api_log
+    assert "error record" in (tmp_path / f"error_{today}.log").read_text(encoding="utf-8")
+    assert "api record" in (tmp_path / f"app_{today}.log").read_text(encoding="utf-8")
+
+
+def test_json_output(configure, tmp_path):
+    configure("json")
+    logging.getLogger("api.cycles").warning("周期 %s", 3)
+    logging_config.stop_logging()
+
+    lines = (tmp_path / f"api_{date.today().isoformat()}.log").read_text(encoding="utf-8").splitlines()
+    entry = json.loads(lines[-1])
+    assert entry["logger"] == "api.cycles"
+    assert entry["level"] == "WARNING"
+    assert entry["message"] == "周期 3"
+
+
+def test_daily_file_switches_without_renaming(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_config, "LOG_DIR", str(tmp_path))
+    (tmp_path / "app_2024-01-01.log").write_text("expired\n", encoding="utf-8")
+    (tmp_path / "api_2024-01-01.log").write_text("other prefix\n", encoding="utf-8")
+    handler = logging_config.DailyFileHandler("app", backup_count=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    # 另一个进程的处理程序写同一个文件
+    other = logging_config.DailyFileHandler("app", backup_count=2)
+    other.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(target, message, day):
+        record = logging.LogRecord("api", logging.INFO, __file__, 0, message, None, None)
+        record.created = datetime.combine(day, datetime.min.time()).timestamp() + 60
+        target.handle(record)
+
+    first, second = date(2024, 1, 4), date(2024, 1, 5)
+    emit(handler, "day one", first)
+    emit(other, "day one other", first)
+    emit(handler, "day two", second)
+    emit(other, "day two other", second)
+    handler.close()
+    other.close()
+
+    assert (tmp_path / "app_2024-01-04.log").read_text(encoding="utf-8") == "day one\nday one other\n"
+    assert (tmp_path / "app_2024-01-05.log").read_text(encoding="utf-8") == "day two\nday two other\n"
+    # 超过保留天数的旧文件被删除，其他名称的文件不受影响
+    assert not (tmp_path / "app_2024-01-01.log").exists()
+    assert (tmp_path / "api_2024-01-01.log").exists()
@@ -0,0 +1,47 @@
+"""
+测试进程内指标注册表
+"""
+
+from sqlalchemy import text
+
+from app.services import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = registry.register(metrics.Histogram("test_seconds", "测试", ("route",), buckets=(0.1, 1.0)))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5.0, "/a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/a"} 3' in lines
+
+
+def test_label_values_are_escaped():
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter("test_total", "测试", ("path",)))
+    counter.inc('a"b')
+    assert 'test_total{path="a\\"b"} 1' in registry.render()
+
+
+def test_database_statements_are_counted(db):
+    before = metrics.DB_QUERIES.value("SELECT")
+    db.execute(text("SELECT 1"))
+    db.execute(text("SELECT 2"))
+    assert metrics.DB_QUERIES.value("SELECT") == before + 2
+
+
+def test_calculation_timings_recorded():
+    from datetime import datetime
+    from app.models import models
+    from app.services import calendar_service
+
+    before = metrics.CALC_DURATION.count("calculate_valid_days_and_hours")
+    cycle = models.CycleRecords(id=1, cycle_number=1, start_date=datetime(2024, 1, 1), is_completed=False)
+    calendar_service.calculate_valid_days_and_hours(cycle, [], datetime(2024, 1, 2))
+    assert metrics.CALC_DURATION.count("calculate_valid_days_and_hours") == before + 1
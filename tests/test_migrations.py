@@ -0,0 +1,110 @@
+"""
+测试版本化数据库迁移
+"""
+
+import pytest
+from sqlalchemy import event, inspect, text
+
+from app.database import migrations
+from app.database.database import create_db_engine
+
+# 迁移框架引入之前的表结构（没有有效小时数和跳过记账字段，也没有数据版本表）
+LEGACY_SCHEMA = [
+    "CREATE TABLE calendar_settings (id INTEGER PRIMARY KEY, start_date DATETIME NOT NULL, skip_hours INTEGER, "
+    "created_at DATETIME, updated_at DATETIME)",
+    "CREATE TABLE cycle_records (id INTEGER PRIMARY KEY, cycle_number INTEGER NOT NULL, start_date DATETIME NOT NULL, "
+    "end_date DATETIME, skip_periods JSON, valid_days_count INTEGER, is_completed BOOLEAN, "
+    "created_at DATETIME, updated_at DATETIME, remark VARCHAR(255))",
+    "CREATE TABLE skip_periods (id INTEGER PRIMARY KEY, cycle_id INTEGER REFERENCES cycle_records (id), "
+    "date DATETIME NOT NULL, start_time VARCHAR NOT NULL, end_time VARCHAR NOT NULL, "
+    "created_at DATETIME, updated_at DATETIME)",
+    "INSERT INTO cycle_records (id, cycle_number, start_date, end_date, valid_days_count, is_completed) "
+    "VALUES (1, 1, '2024-01-01 09:00:00.000000', '2024-01-27 09:00:00.000000', 26, 1)",
+    "INSERT INTO skip_periods (cycle_id, date, start_time, end_time) "
+    "VALUES (1, '2024-01-03 00:00:00.000000', '20:00', '08:00')",
+]
+
+
+def test_fresh_database_is_created_at_latest_version(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    try:
+        assert migrations.run_migrations(engine) == []
+        assert migrations.current_version(engine) == migrations.LATEST_VERSION
+        assert inspect(engine).has_table("data_version")
+    finally:
+        engine.dispose()
+
+
+def test_up_to_date_database_only_reads_version(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    try:
+        migrations.run_migrations(engine)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+        assert migrations.run_migrations(engine) == []
+        assert len(statements) == 2  # CREATE TABLE IF NOT EXISTS + SELECT MAX(version)
+    finally:
+        engine.dispose()
+
+
+def test_legacy_database_is_upgraded_in_order(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    try:
+        with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+
+        applied = migrations.run_migrations(engine)
+
+        assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+        with engine.connect() as connection:
+            row = connection.execute(text("SELECT valid_hours_count, skipped_minutes FROM cycle_records")).one()
+        assert row.skipped_minutes == 12 * 60
+        with engine.connect() as connection:
+            period = connection.execute(text("SELECT day, start_minute_of_day, duration_minutes FROM skip_periods")).one()
+            valid_minutes = connection.execute(text("SELECT valid_minutes FROM cycle_records")).scalar()
+        assert tuple(period) == ("2024-01-03", 20 * 60, 12 * 60)
+        assert valid_minutes == round(row.valid_hours_count * 60)
+        index_names = {index["name"] for index in inspect(engine).get_indexes("skip_periods")}
+        assert {"ix_skip_periods_cycle_date", "uq_skip_periods_cycle_day"} <= index_names
+        assert migrations.run_migrations(engine) == []
+    finally:
+        engine.dispose()
+
+
+def test_plain_minute_columns_become_generated(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    try:
+        with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+        # 先升级到版本7，此时整数分钟字段还是普通字段，可以写入与字符串字段不一致的值
+        monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:7])
+        monkeypatch.setattr(migrations, "LATEST_VERSION", 7)
+        monkeypatch.setattr(migrations, "SCHEMA_PREREQUISITES", [(6, migrations.create_minute_columns)])
+        migrations.run_migrations(engine)
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE skip_periods SET start_time = '21:00'"))
+        monkeypatch.undo()
+
+        assert migrations.run_migrations(engine) == [8, 9]
+
+        with engine.begin() as connection:
+            hidden = {row[1]: row[6] for row in connection.execute(text("PRAGMA table_xinfo(skip_periods)"))}
+            period = connection.execute(text("SELECT day, start_minute_of_day, duration_minutes FROM skip_periods")).one()
+        assert {hidden[name] for name in ("day", "start_minute_of_day", "duration_minutes")} == {2}
+        assert tuple(period) == ("2024-01-03", 21 * 60, 11 * 60)
+    finally:
+        engine.dispose()
+
+
+def test_old_sqlite_fails_before_touching_database(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    try:
+        monkeypatch.setattr(migrations.sqlite3, "sqlite_version_info", (3, 31, 1))
+        with pytest.raises(RuntimeError, match="需要 SQLite 3.35.0 及以上版本.*3.31.1"):
+            migrations.run_migrations(engine)
+        assert not inspect(engine).has_table(migrations.SCHEMA_MIGRATIONS_TABLE)
+    finally:
+        engine.dispose()
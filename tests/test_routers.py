@@ -0,0 +1,19 @@
+"""
+测试路由的执行方式
+"""
+
+import asyncio
+
+import pytest
+
+from app.routers import calendar, cycles
+
+
+@pytest.mark.parametrize("router", [calendar.router, cycles.router])
+def test_database_endpoints_run_in_threadpool(router):
+    # async def 接口会在事件循环上直接执行阻塞的数据库调用，所有接口都应声明为同步函数
+    coroutine_endpoints = [
+        route.path for route in router.routes if asyncio.iscoroutinefunction(route.endpoint)
+    ]
+    assert coroutine_endpoints == []
+
@@ -0,0 +1,77 @@
+"""
+测试跳过时间增量记账与完整重算结果一致
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import models
+from app.services import skip_accounting
+from app.services.calendar_service import calculate_valid_days_and_hours
+
+
+def full_recompute(db, cycle, end_time):
+    skip_periods = db.query(models.SkipPeriod).filter(models.SkipPeriod.cycle_id == cycle.id).all()
+    return calculate_valid_days_and_hours(cycle, skip_periods, end_time)
+
+
+@pytest.fixture
+def cycle(db):
+    cycle = models.CycleRecords(cycle_number=1, start_date=datetime(2024, 1, 1, 9, 30), is_completed=False)
+    db.add(cycle)
+    db.flush()
+    skip_accounting.rebuild_cycle(db, cycle)
+    db.commit()
+    return cycle
+
+
+def test_random_mutations_match_full_recompute(db, cycle):
+    rng = random.Random(26)
+    periods = {}
+    for _ in range(200):
+        day = rng.randint(0, 24)
+        start_time = f"{rng.randint(0, 23):02d}:{rng.choice([0, 30]):02d}"
+        end_time = f"{rng.randint(0, 23):02d}:{rng.choice([0, 15]):02d}"
+        period = periods.get(day)
+        if period is None:
+            period = models.SkipPeriod(
+                cycle_id=cycle.id,
+                date=datetime(2024, 1, 1, 12) + timedelta(days=day),
+                start_time=start_time,
+                end_time=end_time,
+            )
+            db.add(period)
+            db.flush()
+            skip_accounting.apply_period_change(db, cycle, period.id, None, skip_accounting.snapshot(period))
+            periods[day] = period
+        elif rng.random() < 0.5:
+            before = skip_accounting.snapshot(period)
+            db.delete(period)
+            db.flush()
+            skip_accounting.apply_period_change(db, cycle, period.id, before, None)
+            del periods[day]
+        else:
+            before = skip_accounting.snapshot(period)
+            period.start_time, period.end_time = start_time, end_time
+            skip_accounting.apply_period_change(db, cycle, period.id, before, skip_accounting.snapshot(period))
+        db.commit()
+
+        for end_time in (datetime(2024, 1, 10, 7, 45), datetime(2024, 1, 27, 23, 0)):
+            expected = full_recompute(db, cycle, end_time)
+            actual = skip_accounting.current_counters(db, cycle, end_time)
+            assert actual[0] == expected[0]
+            assert actual[1] == pytest.approx(expected[1])
+
+    assert skip_accounting.verify_skip_accounting(db) == []
+
+
+def test_verifier_reports_and_fixes_drift(db, cycle):
+    db.add(models.SkipPeriod(cycle_id=cycle.id, date=datetime(2024, 1, 2, 12), start_time="08:00", end_time="20:00"))
+    db.commit()
+
+    drifts = skip_accounting.verify_skip_accounting(db)
+    assert [drift["cycle_id"] for drift in drifts] == [cycle.id]
+    assert cycle.skipped_minutes == pytest.approx(12 * 60)
+    assert skip_accounting.verify_skip_accounting(db) == []
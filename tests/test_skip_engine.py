@@ -0,0 +1,138 @@
+"""
+测试跳过时间段区间引擎以及基于它的有效天数/小时数计算
+"""
+
+import random
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.calendar_service import calculate_valid_days_and_hours
+from app.services.skip_engine import SkipIntervalSet, skip_period_bounds, to_minutes
+
+
+def make_period(day, start_time, end_time):
+    return SimpleNamespace(date=datetime(2024, 1, day, 12, 0, 0), start_time=start_time, end_time=end_time)
+
+
+def make_cycle(start, end=None, is_completed=False):
+    return SimpleNamespace(start_date=start, end_date=end, is_completed=is_completed, cycle_number=1)
+
+
+def test_cross_midnight_period_extends_to_next_day():
+    start, end = skip_period_bounds(datetime(2024, 1, 1).date(), "22:00", "06:00")
+    assert end - start == 8 * 60
+
+
+def test_overlapping_periods_are_merged():
+    periods = [make_period(1, "20:00", "08:00"), make_period(2, "06:00", "10:00")]
+    intervals = SkipIntervalSet.from_skip_periods(periods)
+    assert len(intervals) == 1
+    # 1日20:00 到 2日10:00，共14小时，重叠部分只计算一次
+    assert intervals.total_minutes == 14 * 60
+
+
+def test_window_query_clips_intervals():
+    periods = [make_period(1, "08:00", "12:00"), make_period(2, "08:00", "12:00")]
+    intervals = SkipIntervalSet.from_skip_periods(periods)
+    skipped = intervals.skipped_hours_between(datetime(2024, 1, 1, 10), datetime(2024, 1, 2, 9))
+    assert skipped == pytest.approx(3.0)
+    assert intervals.skipped_minutes(to_minutes(datetime(2024, 1, 2, 11))) == pytest.approx(60)
+
+
+def test_valid_hours_ignores_periods_outside_cycle_dates():
+    cycle = make_cycle(datetime(2024, 1, 2, 8), datetime(2024, 1, 4, 8), is_completed=True)
+    periods = [
+        make_period(1, "20:00", "23:00"),  # 周期开始之前，忽略
+        make_period(2, "20:00", "08:00"),
+        make_period(3, "06:00", "10:00"),  # 与上一个时间段重叠
+        make_period(5, "08:00", "12:00"),  # 周期结束之后，忽略
+    ]
+    valid_days, valid_hours = calculate_valid_days_and_hours(cycle, periods)
+    # 总时长48小时，跳过 2日20:00 到 3日10:00 共14小时
+    assert valid_hours == pytest.approx(34.0)
+    assert valid_days == 2
+
+
+def test_valid_hours_are_capped_at_26_days():
+    cycle = make_cycle(datetime(2024, 1, 1), datetime(2024, 3, 1), is_completed=True)
+    valid_days, valid_hours = calculate_valid_days_and_hours(cycle, [])
+    assert (valid_days, valid_hours) == (26, 26 * 24)
+
+
+def test_integer_minute_columns_are_generated_from_string_fields(db):
+    from sqlalchemy import insert, select, update
+
+    from app.models import models
+
+    period = models.SkipPeriod(cycle_id=1, date=datetime(2024, 1, 2, 12), start_time="22:00", end_time="06:00")
+    db.add(period)
+    db.commit()
+    assert (period.day, period.start_minute_of_day, period.duration_minutes) == (datetime(2024, 1, 2).date(), 22 * 60, 8 * 60)
+
+    period.end_time = "23:30"
+    db.commit()
+    assert period.duration_minutes == 90
+
+    # 批量 UPDATE 和Core INSERT 不经过ORM，生成列同样与字符串字段一致
+    db.execute(update(models.SkipPeriod).where(models.SkipPeriod.id == period.id).values(start_time="9:05"))
+    db.execute(insert(models.SkipPeriod), [
+        {"cycle_id": 1, "date": datetime(2024, 1, 3, 12), "start_time": "20:00", "end_time": "08:00"},
+        {"cycle_id": 1, "date": datetime(2024, 1, 4, 12), "start_time": "bad", "end_time": "08:00"},
+    ])
+    db.commit()
+    rows = db.execute(
+        select(models.SkipPeriod.day, models.SkipPeriod.start_minute_of_day, models.SkipPeriod.duration_minutes)
+        .order_by(models.SkipPeriod.id)
+    ).all()
+    assert [tuple(row) for row in rows] == [
+        (datetime(2024, 1, 2).date(), 9 * 60 + 5, 23 * 60 + 30 - (9 * 60 + 5)),
+        (datetime(2024, 1, 3).date(), 20 * 60, 12 * 60),
+        (datetime(2024, 1, 4).date(), None, None),
+    ]
+
+    # 整数字段与字符串字段计算出的区间一致，格式无效的记录仍被忽略
+    stored = db.query(models.SkipPeriod).order_by(models.SkipPeriod.id).all()
+    parsed = [make_period(day, record.start_time, record.end_time) for day, record in zip((2, 3, 4), stored)]
+    assert SkipIntervalSet.from_skip_periods(stored).intervals == SkipIntervalSet.from_skip_periods(parsed).intervals
+
+
+def test_advance_is_inverse_of_valid_time():
+    intervals = SkipIntervalSet([(100, 200), (250, 300), (400, 500)])
+    # 不需要累计有效时间时返回起点本身；起点在跳过区间内时从区间结束处开始累计
+    assert intervals.advance(150, 0) == 150
+    assert intervals.advance(150, 1) == 201
+    assert intervals.advance(0, 100) == 100
+    assert intervals.advance(0, 101) == 201
+    assert intervals.advance(0, 200) == 350
+    assert intervals.advance(0, 1000) == 1250
+    for start, valid in [(0, 37), (120, 90), (260, 500)]:
+        end = intervals.advance(start, valid)
+        assert (end - start) - intervals.skipped_minutes(start, end) == pytest.approx(valid)
+
+
+def brute_force_advance(intervals, start, valid):
+    """逐分钟推进，直到累计 valid 分钟有效时间"""
+    point, accumulated = start, 0
+    while accumulated < valid:
+        if not any(interval_start <= point < interval_end for interval_start, interval_end in intervals):
+            accumulated += 1
+        point += 1
+    return point
+
+
+def test_advance_matches_brute_force():
+    rng = random.Random(25)
+    for _ in range(500):
+        raw = []
+        for _ in range(rng.randint(0, 8)):
+            interval_start = rng.randint(0, 300)
+            raw.append((interval_start, interval_start + rng.randint(0, 60)))
+        intervals = SkipIntervalSet(raw)
+        starts = [rng.randint(-20, 380)]
+        # 包括位于区间内部和恰好在区间端点上的起点
+        starts += [rng.randint(start, end) for start, end in intervals.intervals]
+        for start in starts:
+            valid = rng.randint(0, 200)
+            assert intervals.advance(start, valid) == brute_force_advance(intervals.intervals, start, valid)
@@ -0,0 +1,129 @@
+"""
+测试清理超出周期日期范围的跳过时间段
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+from app import maintenance
+from app.database.migrations import sync_indexes
+from app.models import models
+from app.services import skip_accounting, skip_period_cleanup
+
+
+@pytest.fixture
+def cycles(db):
+    completed = models.CycleRecords(
+        cycle_number=1, start_date=datetime(2024, 1, 1, 9, 0), end_date=datetime(2024, 1, 27, 9, 0), is_completed=True
+    )
+    current = models.CycleRecords(cycle_number=2, start_date=datetime(2024, 1, 27, 9, 0), is_completed=False)
+    untouched = models.CycleRecords(
+        cycle_number=3, start_date=datetime(2023, 12, 1, 9, 0), end_date=datetime(2023, 12, 27, 9, 0), is_completed=True
+    )
+    db.add_all([completed, current, untouched])
+    db.flush()
+    for cycle, day in [
+        (completed, date(2023, 12, 31)),  # 开始之前
+        (completed, date(2024, 1, 1)),
+        (completed, date(2024, 1, 27)),  # 结束当天仍然有效
+        (completed, date(2024, 1, 28)),  # 结束之后
+        (current, date(2024, 1, 26)),  # 开始之前
+        (current, date(2024, 3, 1)),  # 未完成周期没有结束日期限制
+        (untouched, date(2023, 12, 2)),
+    ]:
+        db.add(models.SkipPeriod(
+            cycle_id=cycle.id, date=datetime(day.year, day.month, day.day, 12), start_time="20:00", end_time="08:00"
+        ))
+    db.flush()
+    for cycle in (completed, current, untouched):
+        skip_accounting.rebuild_cycle(db, cycle)
+        skip_accounting.refresh_cycle_counters(db, cycle)
+    db.commit()
+    return completed, current, untouched
+
+
+def test_dry_run_reports_without_deleting(db, cycles):
+    completed, current, _ = cycles
+    report = skip_period_cleanup.find_out_of_range(db)
+
+    assert [(row["cycle_id"], str(row["period_date"]), row["reason"]) for row in report] == [
+        (completed.id, "2023-12-31", skip_period_cleanup.BEFORE_START),
+        (completed.id, "2024-01-28", skip_period_cleanup.AFTER_END),
+        (current.id, "2024-01-26", skip_period_cleanup.BEFORE_START),
+    ]
+    assert db.query(models.SkipPeriod).count() == 7
+
+
+def test_delete_uses_one_statement_and_recomputes_affected_cycles(db, cycles):
+    completed, current, untouched = cycles
+    expected_ids = sorted(row["period_id"] for row in skip_period_cleanup.find_out_of_range(db))
+    untouched_updated_at = untouched.updated_at
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        result = skip_period_cleanup.delete_out_of_range(db)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+    assert result == {"deleted_period_ids": expected_ids, "cycle_ids": sorted([completed.id, current.id])}
+    assert len([statement for statement in statements if statement.lstrip().upper().startswith("DELETE FROM SKIP_PERIODS")]) == 1
+    assert db.query(models.SkipPeriod).count() == 4
+    assert skip_period_cleanup.find_out_of_range(db) == []
+    # 只重算受影响的周期，重算结果与完整对账一致
+    db.refresh(untouched)
+    assert untouched.updated_at == untouched_updated_at
+    assert skip_accounting.verify_skip_accounting(db, fix=False) == []
+
+
+def test_duplicates_are_reported_and_deleted_before_unique_index_is_created(db, cycles):
+    completed, _, _ = cycles
+    bind = db.get_bind()
+    with bind.begin() as connection:
+        connection.execute(text("DROP INDEX uq_skip_periods_cycle_day"))
+    # 同一天的另一条记录，时间不同；最近修改的一条保留
+    original = db.query(models.SkipPeriod).filter_by(cycle_id=completed.id, day=date(2024, 1, 1)).one()
+    newer = models.SkipPeriod(
+        cycle_id=completed.id, date=datetime(2024, 1, 1, 18), start_time="21:00", end_time="07:00",
+        updated_at=original.updated_at + timedelta(minutes=1),
+    )
+    db.add(newer)
+    db.commit()
+    original_id, newer_id = original.id, newer.id
+
+    with pytest.raises(RuntimeError, match=f"cycle_id={completed.id}, day=2024-01-01.*dedupe-skip-periods"):
+        sync_indexes(bind)
+    assert skip_period_cleanup.find_duplicates(bind) == [{
+        "cycle_id": completed.id,
+        "period_date": "2024-01-01",
+        "kept_period_id": newer_id,
+        "kept_time": "21:00-07:00",
+        "duplicate_period_ids": [original_id],
+    }]
+
+    result = skip_period_cleanup.delete_duplicates(bind)
+    skip_period_cleanup.rebuild_cycles(db, result["cycle_ids"])
+
+    assert result == {"deleted_period_ids": [original_id], "cycle_ids": [completed.id]}
+    assert skip_period_cleanup.find_duplicates(bind) == []
+    assert skip_accounting.verify_skip_accounting(db, fix=False) == []
+    sync_indexes(bind)
+
+
+def test_cleanup_command_deletes_only_when_confirmed(db, cycles, monkeypatch):
+    monkeypatch.setattr(maintenance, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind()))
+
+    def run(*argv):
+        args = maintenance.build_parser().parse_args(["cleanup-skip-periods", *argv])
+        return args.handler(args)
+
+    # pytest 中标准输入不是终端，没有 --yes 时不删除
+    assert run() == 1
+    assert db.query(models.SkipPeriod).count() == 7
+
+    assert run("--yes") == 0
+    assert db.query(models.SkipPeriod).count() == 4
@@ -0,0 +1,84 @@
+"""
+测试在SQLite中计算的跳过时间与区间引擎的结果一致
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.models import models
+from app.services import skip_accounting, skip_sql
+
+
+@pytest.fixture
+def cycles(db):
+    rng = random.Random(21)
+    start = datetime(2024, 1, 1, 9, 30, 15, 123456)
+    cycles = []
+    for number in range(1, 9):
+        cycle_start = start + timedelta(days=26 * (number - 1), minutes=rng.randint(0, 600), microseconds=rng.randint(0, 999999))
+        completed = number < 8
+        cycle = models.CycleRecords(
+            cycle_number=number,
+            start_date=cycle_start,
+            end_date=cycle_start + timedelta(days=20, minutes=rng.randint(0, 1440), microseconds=rng.randint(0, 999999)) if completed else None,
+            is_completed=completed,
+        )
+        db.add(cycle)
+        db.flush()
+        # 包括开始日期之前、结束日期之后、跨午夜、首尾相同以及格式无效的时间段
+        for day in rng.sample(range(-2, 25), 15):
+            start_time = rng.choice(["08:00", "22:30", "00:00", "9:05", "13:15"])
+            end_time = rng.choice(["06:00", "12:00", "23:59", "08:00", "13:15", "bad"])
+            db.add(models.SkipPeriod(
+                cycle_id=cycle.id,
+                date=datetime(cycle_start.year, cycle_start.month, cycle_start.day, 12) + timedelta(days=day),
+                start_time=start_time,
+                end_time=end_time,
+            ))
+        cycles.append(cycle)
+    db.commit()
+    return cycles
+
+
+def test_matches_interval_engine(db, cycles):
+    assert skip_sql.supported(db)
+    totals = skip_sql.skip_totals(db)
+    for cycle in cycles:
+        periods = db.query(models.SkipPeriod).filter(models.SkipPeriod.cycle_id == cycle.id).all()
+        expected_minutes, expected_horizon = skip_accounting._expected_state(cycle, periods)
+        minutes, horizon = totals.get(cycle.id, (0.0, None))
+        assert minutes == pytest.approx(expected_minutes, abs=1e-6)
+        assert horizon == expected_horizon
+
+
+def test_filters_by_cycle_ids(db, cycles):
+    wanted = [cycles[0].id, cycles[-1].id]
+    assert set(skip_sql.skip_totals(db, wanted)) <= set(wanted)
+    assert skip_sql.skip_totals(db, []) == {}
+
+
+def test_verifier_uses_single_statement(db, cycles):
+    skip_accounting.verify_skip_accounting(db)
+    statements = []
+    engine = db.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert skip_accounting.verify_skip_accounting(db) == []
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert not any("FROM skip_periods" in statement and "WITH" not in statement for statement in statements)
+
+
+def test_rows_without_minute_columns_are_parsed(db, cycles):
+    expected = skip_sql.skip_totals(db)
+    # 带前导空格的时间不是严格的HH:MM格式，生成列为空，由 hhmm_minutes 按 parse_hhmm 的规则解析
+    db.query(models.SkipPeriod).update(
+        {"start_time": " " + models.SkipPeriod.start_time}, synchronize_session=False
+    )
+    db.commit()
+    assert db.query(models.SkipPeriod).filter(models.SkipPeriod.start_minute_of_day.isnot(None)).count() == 0
+    assert skip_sql.skip_totals(db) == expected
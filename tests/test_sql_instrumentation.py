@@ -0,0 +1,42 @@
+"""
+测试按请求的数据库语句统计和慢查询日志
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from app.config import database_config
+from app.database import instrumentation
+from app.models import models
+
+
+def test_request_stats_count_statements(db):
+    db.execute(text("SELECT 1"))
+    token = instrumentation.begin_request()
+    db.query(models.CycleRecords).all()
+    db.query(models.SkipPeriod).all()
+    stats = instrumentation.end_request(token)
+
+    assert stats.count == 2
+    assert stats.duration > 0
+    header = stats.server_timing(0.01)
+    assert header.startswith('db;desc="2 queries";dur=')
+    assert header.endswith("total;dur=10.00")
+
+
+def test_slow_query_logged_with_plan(db, monkeypatch, caplog):
+    monkeypatch.setattr(database_config, "SLOW_QUERY_MS", 1e-6)
+    with caplog.at_level(logging.WARNING, logger="api.sql"):
+        db.query(models.SkipPeriod).filter(models.SkipPeriod.cycle_id == 1).all()
+
+    messages = [record.getMessage() for record in caplog.records if record.name == "api.sql"]
+    # 两个以 cycle_id 开头的索引都可用，不限定查询优化器选择哪一个
+    assert any("查询计划: SEARCH skip_periods USING INDEX" in message and "(cycle_id=?)" in message for message in messages)
+
+
+def test_fast_queries_not_logged(db, monkeypatch, caplog):
+    monkeypatch.setattr(database_config, "SLOW_QUERY_MS", 60000)
+    with caplog.at_level(logging.WARNING, logger="api.sql"):
+        db.query(models.SkipPeriod).all()
+    assert not [record for record in caplog.records if record.name == "api.sql"]